@@ -0,0 +1,80 @@
+import argparse
+import re
+import time
+from typing import List
+
+import fitz  # PyMuPDF
+
+from rag_service.chunker import chunk_pages, get_tokenizer
+from rag_service.config import EMBEDDING_MAX_TOKENS
+
+# The word-count chunker pdf_ingest.py used before chunker.py, kept as the
+# baseline: one page at a time, 180 words per chunk, 40 words of overlap
+def _normalize_ws(t: str) -> str:
+    t = t.replace("\xa0", " ")
+    t = re.sub(r"[ \t]+", " ", t)
+    t = re.sub(r"\s+\n", "\n", t)
+    return t.strip()
+
+def _split_into_paragraphs(text: str) -> List[str]:
+    text = _normalize_ws(text)
+    paras = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
+    return paras if paras else ([text] if text else [])
+
+def _sliding_chunks(paragraphs: List[str], target_tokens=180, overlap_tokens=40) -> List[str]:
+    words = []
+    for p in paragraphs:
+        words.extend(p.split())
+        words.append("<PBRK>")
+    chunks, i, n = [], 0, len(words)
+    while i < n:
+        j = min(n, i + target_tokens)
+        k = j
+        while k > i and k < n and words[k - 1] != "<PBRK>":
+            k -= 1
+        if k <= i + target_tokens * 0.5:
+            k = j
+        seg = [w for w in words[i:k] if w != "<PBRK>"]
+        txt = " ".join(seg).strip()
+        if txt:
+            chunks.append(txt)
+        if k >= n:
+            break
+        i = max(k - overlap_tokens, 0)
+        if i == k:
+            i += 1
+    return chunks
+
+def _report(name: str, seconds: float, texts: List[str], tokenizer) -> None:
+    tokens = [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=True)]
+    over = sum(t > EMBEDDING_MAX_TOKENS for t in tokens)
+    print(f"{name:<9} {seconds:7.3f}s  {len(texts):6d} chunks  "
+          f"max {max(tokens, default=0)} tokens  {over} over {EMBEDDING_MAX_TOKENS} (truncated)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Time the PDF chunker against the previous word-count chunker")
+    ap.add_argument("--pdf", required=True, help="Path to a PDF file")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs of each chunker; the fastest is reported")
+    args = ap.parse_args()
+
+    with fitz.open(args.pdf) as doc:
+        pages = [(i + 1, page.get_text("text") or "") for i, page in enumerate(doc)]
+    tokenizer = get_tokenizer()
+    print(f"{len(pages)} pages, {sum(len(t) for _, t in pages)} characters")
+
+    def baseline():
+        return [c for _, text in pages for c in _sliding_chunks(_split_into_paragraphs(text))]
+
+    def current():
+        return [c.text for c in chunk_pages(pages, tokenizer)]
+
+    for name, fn in (("previous", baseline), ("chunker", current)):
+        best = float("inf")
+        for _ in range(max(args.repeat, 1)):
+            t0 = time.perf_counter()
+            texts = fn()
+            best = min(best, time.perf_counter() - t0)
+        _report(name, best, texts, tokenizer)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,49 @@
 import argparse
-from rag_service.pdf_ingest import ingest_pdf
+from rag_service.config import INGEST_WORKERS
+from rag_service.ingest_manifest import IngestManifest
+from rag_service.ingest_pipeline import IngestStats
+from rag_service.pdf_ingest import ingest_pdf, ingest_pdf_dir
 from rag_service.pst_ingest import ingest_pst
 
 def main():
     ap = argparse.ArgumentParser(description="Ingest PDFs and PST emails into Chroma")
     ap.add_argument("--pdf", help="Path to a PDF file to ingest")
+    ap.add_argument("--pdf-dir", help="Folder to ingest every PDF from, recursively")
     ap.add_argument("--pst", help="Path to a PST file to ingest")
+    ap.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                    help="Worker processes parsing --pdf-dir files (default: one per CPU)")
+    ap.add_argument("--force", action="store_true",
+                    help="Re-read sources even if unchanged since their last ingest")
     args = ap.parse_args()
 
-    if not args.pdf and not args.pst:
-        ap.error("Provide at least --pdf or --pst")
+    if not args.pdf and not args.pdf_dir and not args.pst:
+        ap.error("Provide at least --pdf, --pdf-dir or --pst")
 
+    stats = IngestStats()
+    # Skips files unchanged since their last complete ingest and resumes
+    # interrupted ones (see ingest_manifest.py)
+    manifest = IngestManifest(skip_unchanged=not args.force)
     if args.pdf:
-        count = ingest_pdf(args.pdf)
+        count = ingest_pdf(args.pdf, stats=stats, manifest=manifest)
         print(f"Ingested {count} PDF chunks from {args.pdf}")
 
+    if args.pdf_dir:
+        def report(path, error):
+            print(f"Skipped {path}: {error}")
+
+        files, count = ingest_pdf_dir(
+            args.pdf_dir, workers=args.workers, stats=stats, on_error=report, manifest=manifest
+        )
+        print(f"Ingested {count} PDF chunks from {files} PDFs under {args.pdf_dir}")
+
     if args.pst:
-        count = ingest_pst(args.pst)
+        def progress(messages, rate):
+            print(f"  {messages} messages read ({rate:.0f} messages/sec)", flush=True)
+
+        count = ingest_pst(args.pst, stats=stats, progress=progress, manifest=manifest)
         print(f"Ingested {count} email chunks from {args.pst}")
 
+    print(stats.summary())
+
 if __name__ == "__main__":
     main()
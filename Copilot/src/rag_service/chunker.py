@@ -0,0 +1,242 @@
+"""Token-aware chunking of PDF text on character offsets.
+
+The pages of a document are split into paragraphs (blank lines; a page
+end also counts as one) and whitespace-normalized into one document
+string. Chunks are packed from whole sentences up to CHUNK_TARGET_TOKENS,
+preferring to end on a paragraph once at least half full, and repeat about
+CHUNK_OVERLAP_TOKENS of trailing sentences at the start of the next chunk.
+Packing continues across paragraphs and pages, so a chunk can span pages.
+A chunk is a slice of the document string, located by character offsets.
+
+Tokens are counted with the embedding model's own fast tokenizer. Its
+pre-tokenizer splits on whitespace (WordPiece for the MiniLM / MPNet
+sentence-transformers), so the count of a text is the sum of the counts of
+its words: every distinct word is tokenized once, in one batch, and the
+counts are cached across documents. Sentence and chunk counts are then
+prefix sums, which is what makes this faster than re-tokenizing text.
+
+No chunk exceeds EMBEDDING_MAX_TOKENS including the model's special
+tokens, so nothing is truncated at embedding time: sentences longer than
+that are cut between words (a single over-long word between its tokens),
+and chunks fuller than the target are re-counted exactly and split again
+should a tokenizer not add up word by word.
+"""
+import bisect
+import re
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .config import CHUNK_OVERLAP_TOKENS, CHUNK_TARGET_TOKENS, EMBEDDING_MAX_TOKENS, EMBEDDING_MODEL_NAME
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\xa0]*\n")
+# Sentence end: terminal punctuation, then optional closing quotes / brackets
+_SENTENCE_END = re.compile(r"[.!?][\"')\]”’]*$")
+# Distinct-word token counts are kept across documents for one tokenizer,
+# up to this many words
+WORD_CACHE_MAX = 500_000
+
+_tokenizer = None
+_word_ids: Dict[str, int] = {}     # word -> row in the two lists below
+_word_tokens: List[int] = []
+_sentence_ends: List[bool] = []
+_cache_owner = None
+
+class TextChunk(NamedTuple):
+    text: str
+    start: int        # character offsets in the normalized document
+    end: int
+    page: int         # page the chunk starts on
+    page_end: int     # page it ends on
+    tokens: int       # model tokens, special tokens included
+
+def get_tokenizer():
+    """
+    The embedding model's fast tokenizer (a `tokenizers.Tokenizer`), with
+    truncation and padding off so counts are exact. Loaded once per process.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+
+        # Same resolution as sentence-transformers for short model names
+        name = EMBEDDING_MODEL_NAME if "/" in EMBEDDING_MODEL_NAME else f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+        tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True).backend_tokenizer
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        _tokenizer = tokenizer
+    return _tokenizer
+
+def _word_counts(tokenizer, words: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Token count of each word and whether it ends a sentence."""
+    global _cache_owner
+    if _cache_owner is not tokenizer or len(_word_ids) > WORD_CACHE_MAX:
+        _word_ids.clear()
+        _word_tokens.clear()
+        _sentence_ends.clear()
+        _cache_owner = tokenizer
+    missing = list(set(words).difference(_word_ids))
+    if missing:
+        # With the leading space a word has inside a text (matters for
+        # byte-level BPE, ignored by WordPiece)
+        for w, enc in zip(missing, tokenizer.encode_batch([" " + w for w in missing], add_special_tokens=False)):
+            _word_ids[w] = len(_word_tokens)
+            _word_tokens.append(len(enc.ids))
+            _sentence_ends.append(_SENTENCE_END.search(w) is not None)
+    ids = np.fromiter(map(_word_ids.__getitem__, words), dtype=np.int64, count=len(words))
+    return np.asarray(_word_tokens, dtype=np.int64)[ids], np.asarray(_sentence_ends, dtype=bool)[ids]
+
+def _split_word(tokenizer, word: str, budget: int) -> List[str]:
+    """
+    Pieces of a word longer than `budget` tokens, cut between its tokens,
+    each at most `budget` tokens as _word_counts counts it.
+    """
+    # Encoded the way _word_counts counts, with the leading space; offsets
+    # are shifted back onto the word, and kept strictly inside it
+    offsets = tokenizer.encode(" " + word, add_special_tokens=False).offsets
+    cuts = sorted({min(max(offsets[i][0] - 1, 1), len(word) - 1) for i in range(budget, len(offsets), budget)})
+    if not cuts:
+        cuts = [len(word) // 2]
+    pieces = [word[a:b] for a, b in zip([0, *cuts], [*cuts, len(word)])]
+    # A piece tokenized on its own can take more tokens than it did inside
+    # the word (byte-level BPE merges differ at the cut): split it again.
+    # Pieces are strictly shorter than the word, so this ends.
+    counts = [len(enc.ids) for enc in tokenizer.encode_batch([" " + p for p in pieces], add_special_tokens=False)]
+    out: List[str] = []
+    for piece, count in zip(pieces, counts):
+        out.extend(_split_word(tokenizer, piece, budget) if count > budget and len(piece) > 1 else [piece])
+    return out
+
+def _pack(sums: Sequence[int], para: Sequence[bool], target: int, overlap: int) -> List[Tuple[int, int]]:
+    """Unit ranges [i, j) of the chunks, from the prefix sums of unit token counts."""
+    n = len(sums) - 1
+    ranges, i = [], 0
+    while i < n:
+        # As many units as fit, at least one (a unit always fits on its own)
+        j = max(bisect.bisect_right(sums, sums[i] + target, i + 1) - 1, i + 1)
+        if j < n:
+            # Prefer ending on a paragraph once at least half full
+            for c in range(j, i + 1, -1):
+                if para[c - 1] and sums[c] - sums[i] >= target // 2:
+                    j = c
+                    break
+        ranges.append((i, j))
+        if j >= n:
+            break
+        # Repeat the trailing sentences that fit in `overlap` tokens
+        k = j
+        while k - 1 > i and sums[j] - sums[k - 1] <= overlap:
+            k -= 1
+        i = k
+    return ranges
+
+def chunk_pages(
+    pages: Sequence[Tuple[int, str]],
+    tokenizer=None,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    max_tokens: int = EMBEDDING_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[TextChunk]:
+    """Chunks of a document given as (page number, raw text) pairs."""
+    tokenizer = tokenizer or get_tokenizer()
+    specials = len(tokenizer.encode("", add_special_tokens=True).ids)
+    budget = max_tokens - specials
+    target = min(target_tokens, budget)
+
+    words: List[str] = []
+    seps: List[int] = []         # separator length before each word: 0 (start / inside a split word), 1 or 2 (paragraph break)
+    paras: List[str] = []
+    page_first: List[int] = []   # first word of each non-empty page
+    page_nos: List[int] = []
+    for page_no, raw in pages:
+        first = len(words)
+        for para in _PARAGRAPH_BREAK.split(raw):
+            para_words = para.split()
+            if para_words:
+                seps.append(2 if words else 0)
+                seps.extend([1] * (len(para_words) - 1))
+                words.extend(para_words)
+                paras.append(" ".join(para_words))
+        if len(words) > first:
+            page_first.append(first)
+            page_nos.append(page_no)
+    if not words:
+        return []
+
+    counts, sentence_end = _word_counts(tokenizer, words)
+    if counts.max() > budget:
+        # Rare: a "word" longer than a chunk (a URL, a table row without spaces)
+        split_words, split_seps, split_first = [], [], []
+        firsts = iter(page_first)
+        next_first = next(firsts, None)
+        for i, (w, sep, c) in enumerate(zip(words, seps, counts.tolist())):
+            if i == next_first:
+                split_first.append(len(split_words))
+                next_first = next(firsts, None)
+            pieces = _split_word(tokenizer, w, budget) if c > budget else [w]
+            split_words.extend(pieces)
+            split_seps.append(sep)
+            split_seps.extend([0] * (len(pieces) - 1))
+        words, seps, page_first = split_words, split_seps, split_first
+        counts, sentence_end = _word_counts(tokenizer, words)
+
+    n = len(words)
+    lens = np.fromiter(map(len, words), dtype=np.int64, count=n)
+    sep_arr = np.asarray(seps, dtype=np.int64)
+    word_start = np.cumsum(sep_arr + lens) - lens
+    # Splitting words does not change the text
+    doc = "\n\n".join(paras)
+    csum = np.concatenate([[0], np.cumsum(counts)])
+
+    # Units: sentences, also ended by a paragraph break or a split word
+    para_start = sep_arr == 2
+    is_end = sentence_end.copy()
+    is_end[:-1] |= para_start[1:] | (sep_arr[1:] == 0)
+    is_end[-1] = True
+    unit_ends = (np.flatnonzero(is_end) + 1).tolist()
+
+    # Sentences over the budget become several units, cut between words
+    bounds: List[int] = []
+    a = 0
+    for b in unit_ends:
+        while csum[b] - csum[a] > budget:
+            # At least one word per unit, even one still over the budget
+            # (a single character the tokenizer cannot fit)
+            a = max(a + 1, int(np.searchsorted(csum, csum[a] + budget, side="right")) - 1)
+            if a >= b:
+                break
+            bounds.append(a)
+        bounds.append(b)
+        a = b
+    unit_words = [0, *bounds]
+    unit_para = [b >= n or bool(para_start[b]) for b in bounds]
+    sums = csum[unit_words].tolist()
+
+    ranges = [(unit_words[i], unit_words[j]) for i, j in _pack(sums, unit_para, target, overlap_tokens)]
+
+    # Word ranges -> chunks, re-counting exactly those fuller than the target
+    chunks: List[TextChunk] = []
+    while ranges:
+        check = [(a, b) for a, b in ranges if csum[b] - csum[a] > target]
+        exact = {}
+        if check:
+            texts = [doc[word_start[a]:word_start[b - 1] + lens[b - 1]] for a, b in check]
+            for r, enc in zip(check, tokenizer.encode_batch(texts, add_special_tokens=True)):
+                exact[r] = len(enc.ids)
+        retry = []
+        for a, b in ranges:
+            tokens = exact.get((a, b), int(csum[b] - csum[a]) + specials)
+            if tokens > max_tokens and b - a > 1:
+                mid = (a + b) // 2
+                retry.extend([(a, mid), (mid, b)])
+                continue
+            start, end = int(word_start[a]), int(word_start[b - 1] + lens[b - 1])
+            chunks.append(TextChunk(
+                doc[start:end], start, end,
+                page_nos[bisect.bisect_right(page_first, a) - 1],
+                page_nos[bisect.bisect_right(page_first, b - 1) - 1],
+                tokens,
+            ))
+        ranges = retry
+    chunks.sort(key=lambda c: (c.start, c.end))
+    return chunks
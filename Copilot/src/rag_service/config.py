@@ -8,3 +8,54 @@ CHROMA_COLLECTION_NAME = "credit_policies"
 
 # Default embedding model name for SentenceTransformers
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# PDF chunking (chunker.py) counts tokens with the embedding model's own
+# tokenizer. EMBEDDING_MAX_TOKENS is the model's input window, special
+# tokens included (256 for all-MiniLM-L6-v2): no chunk is longer, so none
+# is truncated when embedded. Chunks aim for CHUNK_TARGET_TOKENS and
+# repeat up to CHUNK_OVERLAP_TOKENS of trailing sentences.
+EMBEDDING_MAX_TOKENS = 256
+CHUNK_TARGET_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 40
+
+# Ingest looks chunk embeddings up by (model, sha256 of the text) in this
+# on-disk cache before running the model (see embedding_cache.py), so
+# re-ingested files and text repeated across emails are embedded once.
+# EMBEDDING_CACHE_DTYPE: "float16" (half the disk) or "float32".
+# EMBEDDING_CACHE_DIR = None disables the cache.
+EMBEDDING_CACHE_DIR = str(Path(__file__).resolve().parent.parent / "embedding_cache")
+EMBEDDING_CACHE_DTYPE = "float16"
+
+# Hot reload: a long-running API process checks at most once per
+# INDEX_REFRESH_SECONDS whether another process (scripts/ingest.py) has
+# written to the collection, and reopens it if so (see vector_store.py)
+INDEX_REFRESH_SECONDS = 1.0
+
+# Query result cache in search_service.search: LRU bounded by the estimated
+# bytes of the cached hits, entries expire after RESULT_CACHE_TTL_SECONDS
+# and the whole cache is dropped when the collection generation changes.
+# RESULT_CACHE_MAX_BYTES = 0 disables it.
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = 600.0
+
+# Ingest embedding stage (ingest_pipeline.py): parsed chunks are embedded
+# and written to Chroma in batches of EMBED_BATCH_SIZE by a background
+# thread while parsing continues; at most EMBED_MAX_INFLIGHT_BATCHES
+# batches are queued between the two.
+EMBED_BATCH_SIZE = 256
+EMBED_MAX_INFLIGHT_BATCHES = 4
+
+# Folder ingestion (scripts/ingest.py --pdf-dir): PDFs are parsed and
+# chunked by INGEST_WORKERS worker processes (None = one per CPU) and
+# embedded / written by the ingest process.
+INGEST_WORKERS = None
+
+# PST ingestion reports progress (messages/sec) every PST_PROGRESS_EVERY
+# messages.
+PST_PROGRESS_EVERY = 1000
+
+# Ingestion manifest (ingest_manifest.py, CHROMA_PERSIST_DIR/ingest_manifest.json):
+# per source file size / mtime / sha256 and whether its ingest completed,
+# so scripts/ingest.py skips unchanged files. Saved at most once per
+# INGEST_MANIFEST_SAVE_SECONDS while ingesting.
+INGEST_MANIFEST_SAVE_SECONDS = 5.0
@@ -0,0 +1,144 @@
+"""Ingestion manifest: what was ingested from each source file, and how far.
+
+Kept as CHROMA_PERSIST_DIR/ingest_manifest.json, one entry per resolved
+source path:
+
+    {"size": ..., "mtime_ns": ..., "sha256": "..." or null, "complete": true}
+
+A source whose entry is complete and whose file is unchanged - same size
+and mtime, or same sha256 after a touch - is skipped by scripts/ingest.py.
+Starting a source never hashes it, so a large PST produces its first
+chunks without an extra full read: the resume check compares the size /
+mtime signature, and hashes only when the size is the same but the mtime
+is not. The digest is taken once, when the source completes (if the file
+still has the signature it was read with), and reused by later checks;
+sha256 is null until then.
+A source left incomplete by an interrupted run is read again in full;
+resuming relies on content-addressed chunk ids (vector_store.chunk_id):
+the chunks the interrupted run already wrote are found in Chroma by id
+and are neither embedded nor written again. No chunk offset is kept,
+since every chunk has to be produced anyway for its id to be known, and
+a stored chunk that is not produced counts as vanished.
+
+Saves are atomic (write + rename) and throttled to one per
+INGEST_MANIFEST_SAVE_SECONDS; an entry lost in a crash only means the
+source is read again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import CHROMA_PERSIST_DIR, INGEST_MANIFEST_SAVE_SECONDS
+
+MANIFEST_FILE = "ingest_manifest.json"
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class IngestManifest:
+    def __init__(self, store_dir: Optional[str] = None, skip_unchanged: bool = True):
+        # skip_unchanged=False still records progress but re-reads every source
+        self.skip_unchanged = skip_unchanged
+        self._path = Path(store_dir or CHROMA_PERSIST_DIR) / MANIFEST_FILE
+        try:
+            self._entries: Dict[str, Dict[str, Any]] = json.loads(self._path.read_text())
+        except FileNotFoundError:
+            self._entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(source)
+
+    def unchanged(self, source: str) -> bool:
+        """True when `source` was ingested completely and the file has not changed since."""
+        if not self.skip_unchanged:
+            return False
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is None or not entry["complete"]:
+                return False
+            st = os.stat(source)
+            if st.st_size != entry["size"]:
+                return False
+            if st.st_mtime_ns == entry["mtime_ns"]:
+                return True
+            # Touched: compare content, and remember the new mtime if equal
+            if entry["sha256"] is None or file_sha256(source) != entry["sha256"]:
+                return False
+            entry["mtime_ns"] = st.st_mtime_ns
+            self._dirty = True
+            return True
+
+    def begin(self, source: str) -> bool:
+        """
+        Record that `source` is being ingested. True when this resumes a
+        previous run interrupted on the same content.
+        """
+        st = os.stat(source)
+        with self._lock:
+            prev = self._entries.get(source)
+        digest, same = None, False
+        if prev is not None and st.st_size == prev["size"]:
+            if st.st_mtime_ns == prev["mtime_ns"]:
+                digest, same = prev["sha256"], True
+            elif prev["sha256"] is not None:
+                # Same size, new mtime: only the content can tell
+                digest = file_sha256(source)
+                same = digest == prev["sha256"]
+        with self._lock:
+            resumed = prev is not None and not prev["complete"] and same
+            self._entries[source] = {
+                "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest, "complete": False,
+            }
+            self._touch_locked()
+        return resumed
+
+    def complete(self, source: str) -> None:
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is None:
+                return
+            signature = (entry["size"], entry["mtime_ns"]) if entry["sha256"] is None else None
+        digest = None
+        if signature is not None:
+            # Only a file still as it was read is hashed: a digest of newer
+            # content would let a touch-check skip it unread
+            try:
+                st = os.stat(source)
+            except OSError:
+                st = None
+            if st is not None and (st.st_size, st.st_mtime_ns) == signature:
+                digest = file_sha256(source)
+        with self._lock:
+            entry["complete"] = True
+            if digest is not None:
+                entry["sha256"] = digest
+            self._touch_locked()
+
+    def save(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _touch_locked(self) -> None:
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= INGEST_MANIFEST_SAVE_SECONDS:
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(json.dumps(self._entries))
+        os.replace(tmp, self._path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
@@ -0,0 +1,205 @@
+"""Batched embedding stage shared by PDF and PST ingestion.
+
+The caller's thread is the producer: it parses the source and cuts the
+(id, document, metadata) chunks into batches of EMBED_BATCH_SIZE. One
+consumer thread filters each batch down to chunks not stored yet (see
+vector_store.SourceSync), embeds them (embeddings.embed_documents) and
+writes them to Chroma in WRITE_BATCH slices, so parsing the next pages /
+messages overlaps with embedding the previous ones. At most
+EMBED_MAX_INFLIGHT_BATCHES batches wait between the two, which bounds
+memory on large PST files. A single consumer keeps the embedding model and
+the embedding cache single-writer.
+
+Folders of PDFs (pdf_ingest.ingest_pdf_dir) additionally parse and chunk
+their files in a process pool (pool_map); the results stream into the
+same single writer.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import EMBED_BATCH_SIZE, EMBED_MAX_INFLIGHT_BATCHES
+from .embeddings import embed_documents
+from .ingest_manifest import IngestManifest
+from .vector_store import SourceSync
+
+Chunk = Tuple[str, str, Dict[str, Any]]  # (chunk id, document, metadata)
+
+_DONE = object()
+
+class IngestStats:
+    """Totals over one or more ingest_chunks calls (chunks/sec for scripts/ingest.py)."""
+    def __init__(self):
+        self.chunks = 0
+        self.added = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.skipped = 0
+        self.resumed = 0
+        self.seconds = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks} chunks in {self.seconds:.1f}s ({self.chunks_per_sec:.1f} chunks/sec): "
+            f"{self.added} embedded and written, {self.unchanged} unchanged, {self.removed} removed; "
+            f"{self.skipped} unchanged sources skipped, {self.resumed} resumed"
+        )
+
+def _write_batch(items) -> None:
+    # items: (SourceSync, chunk) pairs, possibly of several sources; their
+    # new chunks are embedded in one call
+    by_source = {}
+    for sync, chunk in items:
+        by_source.setdefault(sync, []).append(chunk)
+    todo = []
+    for sync, chunks in by_source.items():
+        new = [chunks[i] for i in sync.pending([c[0] for c in chunks])]
+        if new:
+            todo.append((sync, new))
+    if not todo:
+        return
+    vectors = embed_documents([chunk[1] for _, new in todo for chunk in new])
+    start = 0
+    for sync, new in todo:
+        ids, docs, metas = (list(x) for x in zip(*new))
+        sync.write(ids, docs, metas, vectors[start:start + len(new)])
+        start += len(new)
+
+def ingest_sources(
+    sources: Iterable[Tuple[str, Iterable[Chunk]]],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_inflight: int = EMBED_MAX_INFLIGHT_BATCHES,
+    stats: Optional[IngestStats] = None,
+    manifest: Optional[IngestManifest] = None,
+) -> int:
+    """
+    Make the stored chunks of each `source` exactly its `chunks` (see
+    vector_store.SourceSync), embedding and writing them batch by batch
+    while the producer keeps iterating. Batches run across source
+    boundaries, so a folder of small files still embeds full batches. With
+    a manifest, each source is recorded when it starts and when its last
+    batch is written (see ingest_manifest.py). Returns the number of chunks
+    produced.
+    """
+    if batch_size < 1 or max_inflight < 1:
+        raise ValueError("batch_size and max_inflight must be >= 1")
+    started = time.perf_counter()
+    batches = queue.Queue(maxsize=max_inflight)
+    failed = []
+    totals = [0, 0, 0]  # added, unchanged, removed
+
+    def consume():
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            if failed:
+                continue  # drain so the producer never blocks
+            items, finished = batch
+            try:
+                _write_batch(items)
+                # A source's last chunks are in this batch or an earlier one
+                for sync in finished:
+                    for i, n in enumerate(sync.finish()):
+                        totals[i] += n
+                    if manifest is not None:
+                        manifest.complete(sync.source)
+            except BaseException as exc:
+                failed.append(exc)
+
+    consumer = threading.Thread(target=consume, name="ingest-embed", daemon=True)
+    consumer.start()
+    count = 0
+    items, finished = [], []
+    try:
+        for source, chunks in sources:
+            if manifest is not None and manifest.begin(source) and stats is not None:
+                stats.resumed += 1
+            sync = SourceSync(source)
+            for chunk in chunks:
+                items.append((sync, chunk))
+                count += 1
+                if len(items) >= batch_size:
+                    batches.put((items, finished))
+                    items, finished = [], []
+                    if failed:
+                        break
+            if failed:
+                break
+            finished.append(sync)
+        if (items or finished) and not failed:
+            batches.put((items, finished))
+    finally:
+        batches.put(_DONE)
+        consumer.join()
+        if manifest is not None:
+            manifest.save()
+    if failed:
+        raise failed[0]
+
+    if stats is not None:
+        stats.chunks += count
+        stats.added += totals[0]
+        stats.unchanged += totals[1]
+        stats.removed += totals[2]
+        stats.seconds += time.perf_counter() - started
+    return count
+
+def ingest_chunks(
+    source: str,
+    chunks: Iterable[Chunk],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_inflight: int = EMBED_MAX_INFLIGHT_BATCHES,
+    stats: Optional[IngestStats] = None,
+    manifest: Optional[IngestManifest] = None,
+) -> int:
+    """ingest_sources for a single source."""
+    return ingest_sources([(source, chunks)], batch_size, max_inflight, stats, manifest)
+
+def find_files(root: str, suffix: str) -> List[Path]:
+    """Files under `root` (recursively) ending in `suffix`, any case, sorted."""
+    suffix = suffix.lower()
+    return sorted(p.resolve() for p in Path(root).rglob("*") if p.suffix.lower() == suffix and p.is_file())
+
+def pool_map(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: Optional[int] = None,
+    max_inflight: Optional[int] = None,
+) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Run fn over `items` in a process pool and yield (item, fn(item), None)
+    in completion order, or (item, None, error) when fn raised. At most
+    `max_inflight` items (default twice the pool size) are submitted ahead
+    of the consumer, so parsed files never pile up in memory.
+    workers: pool size, None = one per CPU.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+    items = iter(items)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+    try:
+        while True:
+            for item in items:
+                pending[pool.submit(fn, item)] = item
+                if len(pending) >= max_inflight:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error is not None else future.result()), error
+    finally:
+        # Also reached when the consumer stops early: drop the queued work
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,75 +1,96 @@
-import re
-import uuid
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 
 import fitz  # PyMuPDF
 
-from .vector_store import get_collection
+from .chunker import chunk_pages
+from .config import INGEST_WORKERS
+from .ingest_manifest import IngestManifest
+from .ingest_pipeline import Chunk, IngestStats, find_files, ingest_chunks, ingest_sources, pool_map
+from .vector_store import chunk_id, content_hash
 
-def _normalize_ws(t: str) -> str:
-    t = t.replace("\xa0", " ")
-    t = re.sub(r"[ \t]+", " ", t)
-    t = re.sub(r"\s+\n", "\n", t)
-    return t.strip()
-
-def _read_pdf_pages(pdf_path: str) -> List[Dict[str, Any]]:
+def _iter_pages(pdf_path: str) -> Iterator[Dict[str, Any]]:
     doc = fitz.open(pdf_path)
-    pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text("text")
-        pages.append({"page": i + 1, "text": text})
-    return pages
-
-def _split_into_paragraphs(text: str) -> List[str]:
-    text = _normalize_ws(text)
-    paras = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
-    return paras if paras else ([text] if text else [])
+    try:
+        for i, page in enumerate(doc):
+            yield {"page": i + 1, "text": page.get_text("text")}
+    finally:
+        doc.close()
 
-def _sliding_chunks(paragraphs: List[str], target_tokens=180, overlap_tokens=40) -> List[str]:
-    words = []
-    for p in paragraphs:
-        words.extend(p.split())
-        words.append("<PBRK>")
-    chunks, i, n = [], 0, len(words)
-    while i < n:
-        j = min(n, i + target_tokens)
-        k = j
-        while k > i and k < n and words[k - 1] != "<PBRK>":
-            k -= 1
-        if k <= i + target_tokens * 0.5:
-            k = j
-        seg = [w for w in words[i:k] if w != "<PBRK>"]
-        txt = " ".join(seg).strip()
-        if txt:
-            chunks.append(txt)
-        if k >= n:
-            break
-        i = max(k - overlap_tokens, 0)
-        if i == k:
-            i += 1
-    return chunks
+def iter_pdf_chunks(pdf_path: str) -> Iterator[Chunk]:
+    """
+    (id, text, metadata) of each chunk of a PDF. Chunks are cut by model
+    tokens and may span pages (chunker.py); "page" is where a chunk starts.
+    """
+    pages = [(p["page"], p["text"]) for p in _iter_pages(pdf_path)]
+    per_page: Dict[int, int] = {}
+    for c in chunk_pages(pages):
+        # Numbered within the starting page, so an edit on one page does
+        # not change the ids of chunks on later pages
+        ci = per_page[c.page] = per_page.get(c.page, -1) + 1
+        yield chunk_id(pdf_path, c.page, ci, c.text), c.text, {
+            "source_type": "pdf",
+            "source": pdf_path,
+            "page": c.page,
+            "page_end": c.page_end,
+            "chunk": ci,
+            "content_hash": content_hash(c.text),
+        }
 
-def ingest_pdf(pdf_path: str) -> int:
-    """Ingest a PDF into Chroma as source_type='pdf'. Returns number of chunks."""
-    col = get_collection()
+def ingest_pdf(
+    pdf_path: str, stats: Optional[IngestStats] = None, manifest: Optional[IngestManifest] = None
+) -> int:
+    """
+    Ingest a PDF into Chroma as source_type='pdf'. Returns number of chunks,
+    0 when the manifest shows the file unchanged since its last ingest.
+    """
     pdf_path = str(Path(pdf_path).resolve())
-    pages = _read_pdf_pages(pdf_path)
+    if manifest is not None and manifest.unchanged(pdf_path):
+        if stats is not None:
+            stats.skipped += 1
+        return 0
+    # Pages are parsed while earlier chunks are embedded; re-ingesting a
+    # file only embeds and writes chunks that changed, and drops the ones
+    # that are gone
+    return ingest_chunks(pdf_path, iter_pdf_chunks(pdf_path), stats=stats, manifest=manifest)
+
+def extract_pdf_chunks(pdf_path: str) -> List[Chunk]:
+    """All chunks of a PDF; runs in the pool workers of ingest_pdf_dir."""
+    return list(iter_pdf_chunks(pdf_path))
+
+def ingest_pdf_dir(
+    root: str,
+    workers: Optional[int] = INGEST_WORKERS,
+    stats: Optional[IngestStats] = None,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+    manifest: Optional[IngestManifest] = None,
+) -> Tuple[int, int]:
+    """
+    Ingest every PDF under `root` (recursively): files are parsed and
+    chunked in a process pool, and the chunks stream into one embedding /
+    writing stage (ingest_pipeline.py). A PDF that fails to parse is passed
+    to on_error(path, error) and skipped, or raises when on_error is None.
+    With a manifest, PDFs unchanged since their last ingest are skipped
+    without being opened. Returns (PDFs ingested, chunks).
+    """
+    paths = [str(p) for p in find_files(root, ".pdf")]
+    if manifest is not None:
+        todo = [p for p in paths if not manifest.unchanged(p)]
+        if stats is not None:
+            stats.skipped += len(paths) - len(todo)
+        paths = todo
+    files = 0
 
-    ids, docs, metas = [], [], []
-    for p in pages:
-        paras = _split_into_paragraphs(p["text"])
-        chunks = _sliding_chunks(paras, target_tokens=180, overlap_tokens=40)
-        for ci, chunk in enumerate(chunks):
-            ids.append(str(uuid.uuid4()))
-            docs.append(chunk)
-            metas.append({
-                "source_type": "pdf",
-                "source": pdf_path,
-                "page": p["page"],
-                "chunk": ci,
-            })
+    def parsed():
+        nonlocal files
+        for path, chunks, error in pool_map(extract_pdf_chunks, paths, workers):
+            if error is not None:
+                if on_error is None:
+                    raise error
+                on_error(path, error)
+                continue
+            files += 1
+            yield path, chunks
 
-    if docs:
-        col.add(ids=ids, documents=docs, metadatas=metas)
-    return len(docs)
+    count = ingest_sources(parsed(), stats=stats, manifest=manifest)
+    return files, count
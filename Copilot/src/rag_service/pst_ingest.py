@@ -4,16 +4,19 @@ Note:
   - Requires the `pypff` package and native libpff installed on your system.
   - If that's painful, consider exporting PST to .eml/.mbox and parsing with stdlib instead.
 """
-import uuid
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional
 
 try:
     import pypff  # type: ignore
 except ImportError:  # pragma: no cover - optional dependency
     pypff = None
 
-from .vector_store import get_collection
+from .config import PST_PROGRESS_EVERY
+from .ingest_manifest import IngestManifest
+from .ingest_pipeline import Chunk, IngestStats, ingest_chunks
+from .vector_store import chunk_id, content_hash
 
 def _message_to_email_dict(msg) -> Dict[str, Any]:
     """Extract minimal fields from a pypff message object."""
@@ -36,37 +39,50 @@ def _message_to_email_dict(msg) -> Dict[str, Any]:
         "thread_id": conversation_id,
     }
 
-def _walk_folder(folder, collected: List[Dict[str, Any]]):
-    # messages
-    for i in range(folder.number_of_messages):
-        m = folder.get_message(i)
-        collected.append(_message_to_email_dict(m))
-    # subfolders
-    for j in range(folder.number_of_sub_folders):
-        sub = folder.get_sub_folder(j)
-        _walk_folder(sub, collected)
+def _walk_folder(root) -> Iterator[Any]:
+    """Messages of `root` and all its subfolders, depth-first, without recursion."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        for i in range(folder.number_of_messages):
+            yield folder.get_message(i)
+        # Reversed so subfolders come out in their stored order
+        for j in reversed(range(folder.number_of_sub_folders)):
+            stack.append(folder.get_sub_folder(j))
 
-def load_pst_emails(pst_path: str) -> List[Dict[str, Any]]:
-    """Return a list of normalized email dicts from a PST file."""
+def iter_pst_emails(
+    pst_path: str, progress: Optional[Callable[[int, float], None]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Normalized email dicts of a PST file, one message at a time, so memory
+    does not grow with the mailbox. progress(messages, messages_per_sec)
+    is called every PST_PROGRESS_EVERY messages and once at the end.
+    """
     if pypff is None:
         raise RuntimeError("pypff is not installed. Install it to use PST ingestion.")
 
     pst_path = str(Path(pst_path).resolve())
     file = pypff.file()
     file.open(pst_path)
-    root = file.get_root_folder()
-    emails: List[Dict[str, Any]] = []
-    _walk_folder(root, emails)
-    file.close()
-    return emails
+    started = time.perf_counter()
+    count = 0
+    try:
+        for m in _walk_folder(file.get_root_folder()):
+            yield _message_to_email_dict(m)
+            count += 1
+            if progress is not None and count % PST_PROGRESS_EVERY == 0:
+                progress(count, count / max(time.perf_counter() - started, 1e-9))
+    finally:
+        file.close()
+    if progress is not None:
+        progress(count, count / max(time.perf_counter() - started, 1e-9))
 
-def ingest_pst(pst_path: str) -> int:
-    """Ingest PST messages into Chroma as source_type='email'. Returns count."""
-    col = get_collection()
-    emails = load_pst_emails(pst_path)
-    pst_path = str(Path(pst_path).resolve())
+def load_pst_emails(pst_path: str) -> List[Dict[str, Any]]:
+    """Return a list of normalized email dicts from a PST file."""
+    return list(iter_pst_emails(pst_path))
 
-    ids, docs, metas = [], [], []
+def iter_email_chunks(pst_path: str, emails) -> Iterator[Chunk]:
+    """(id, text, metadata) of each non-empty email, one chunk per message."""
     for e in emails:
         text_lines = [
             f"Subject: {e.get('subject','')}",
@@ -81,9 +97,7 @@ def ingest_pst(pst_path: str) -> int:
         if not text:
             continue
 
-        ids.append(str(uuid.uuid4()))
-        docs.append(text)
-        metas.append({
+        yield chunk_id(pst_path, e.get("id"), 0, text), text, {
             "source_type": "email",
             "source": pst_path,
             "message_id": e.get("id"),
@@ -91,8 +105,32 @@ def ingest_pst(pst_path: str) -> int:
             "subject": e.get("subject"),
             "from": e.get("from"),
             "sent_at": e.get("sent_at"),
-        })
+            "content_hash": content_hash(text),
+        }
+
+def ingest_pst(
+    pst_path: str,
+    stats: Optional[IngestStats] = None,
+    progress: Optional[Callable[[int, float], None]] = None,
+    manifest: Optional[IngestManifest] = None,
+) -> int:
+    """
+    Ingest PST messages into Chroma as source_type='email'. Returns count,
+    0 when the manifest shows the file unchanged since its last ingest.
+    Messages stream from the PST into EMBED_BATCH_SIZE batches, so parsed
+    messages do not pile up; the ids of the PST's chunks (those already
+    stored, and those produced this run) are kept in memory to find
+    unchanged and vanished chunks, so memory still grows with the number
+    of chunks, by about one id each. progress: see iter_pst_emails.
+    """
+    pst_path = str(Path(pst_path).resolve())
+    if manifest is not None and manifest.unchanged(pst_path):
+        if stats is not None:
+            stats.skipped += 1
+        return 0
+    emails = iter_pst_emails(pst_path, progress)
 
-    if docs:
-        col.add(ids=ids, documents=docs, metadatas=metas)
-    return len(docs)
+    # Re-ingesting a file only embeds and writes messages that changed,
+    # and drops the ones that are gone; new text seen before (quoted
+    # replies) still gets its embedding from the cache
+    return ingest_chunks(pst_path, iter_email_chunks(pst_path, emails), stats=stats, manifest=manifest)
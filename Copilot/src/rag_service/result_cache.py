@@ -0,0 +1,119 @@
+"""
+Byte-bounded LRU + TTL cache of search results.
+
+Entries are keyed on the normalized query and the search arguments and
+tagged with the index generation they were computed at: the first lookup
+or insert under a different generation empties the cache, so results
+never outlive the commit they came from. Sizes are estimated from the
+hit texts and metadata; least recently used entries are evicted until
+the total fits in max_bytes.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import json
+import threading
+import time
+import unicodedata
+
+# Per-hit bookkeeping on top of text and metadata (dict, floats, ints)
+_HIT_OVERHEAD_BYTES = 200
+
+
+def normalize_query(query: str) -> str:
+    """Cache form of a query: NFKC, casefolded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def cache_key(query: str, **params: Any) -> Tuple[str, str]:
+    """Key for `query` searched with `params` (kind, k, filters, ...)."""
+    return normalize_query(query), json.dumps(params, sort_keys=True, default=str)
+
+
+def hits_size(hits: List[Any]) -> int:
+    """Estimated bytes held by a hit list (hits indexable like dicts)."""
+    size = 0
+    for hit in hits:
+        size += _HIT_OVERHEAD_BYTES + len(hit["text"].encode("utf-8"))
+        size += len(json.dumps(hit["meta"], default=str))
+    return size
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires at, size, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._generation: Any = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_generation(self, generation: Any) -> None:
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable, generation: Any) -> Optional[Any]:
+        """Cached value for `key` at `generation`, or None."""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, generation: Any, value: Any, size: int) -> None:
+        """Cache `value` (about `size` bytes); values larger than the cache are skipped."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
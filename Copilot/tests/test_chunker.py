@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+pytest.importorskip("tokenizers")
+
+from rag_service.chunker import chunk_pages
+
+
+@pytest.fixture(scope="module")
+def bpe_tokenizer():
+    """Small byte-level BPE tokenizer: a word counts differently with and without its leading space."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>", special_tokens=[("<s>", 0), ("</s>", 1)]
+    )
+    trainer = trainers.BpeTrainer(
+        vocab_size=300, special_tokens=["<s>", "</s>"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(["hello world the quick brown fox " * 50, "xx yy zz"], trainer)
+    return tokenizer
+
+
+def _chunk_with_timeout(pages, seconds=20, **kwargs):
+    result = []
+    worker = threading.Thread(target=lambda: result.append(chunk_pages(pages, **kwargs)), daemon=True)
+    worker.start()
+    worker.join(seconds)
+    assert result, f"chunk_pages did not finish within {seconds}s"
+    return result[0]
+
+
+@pytest.mark.parametrize("text", [
+    "x" * 40,                                      # one word far over the budget: used to loop forever
+    "hello " + "x" * 40 + " world. " + "ab" * 300,
+    "é" * 50,
+    "\U0001F600" * 30,                             # 4 bytes per character
+])
+def test_over_long_words_are_split_to_fit(bpe_tokenizer, text):
+    chunks = _chunk_with_timeout(
+        [(1, text)], tokenizer=bpe_tokenizer, max_tokens=10, target_tokens=8, overlap_tokens=2
+    )
+
+    for c in chunks:
+        assert c.tokens <= 10
+        assert len(bpe_tokenizer.encode(c.text, add_special_tokens=True).ids) <= 10
+    # The chunks cover the whole text, only whitespace between them
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+    for prev, c in zip(chunks, chunks[1:]):
+        assert not text[prev.end:c.start].strip()
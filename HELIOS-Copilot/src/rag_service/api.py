@@ -3,7 +3,7 @@ from typing import Literal, List, Dict, Any, Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
-from .search_service import search, Kind
+from .search_service import cache_stats, search, Kind
 from .llm_vertex import generate_vertex_answer
 
 app = FastAPI(title="Credit RAG Search API", version="0.1.0")
@@ -20,6 +20,10 @@ class SearchResponse(BaseModel):
     k: int
     results: List[SearchResponseItem]
 
+@app.get("/cache_stats")
+def cache_stats_endpoint() -> Dict[str, Any]:
+    return cache_stats()
+
 @app.get("/search", response_model=SearchResponse)
 def search_endpoint(query: str, kind: Kind = "all", k: int = 5):
     hits = search(query, kind=kind, k=k)
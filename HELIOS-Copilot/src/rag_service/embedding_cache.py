@@ -0,0 +1,142 @@
+"""On-disk embedding cache keyed by (model name, sha256 of the chunk text).
+
+Layout under EMBEDDING_CACHE_DIR/<model>/:
+  - meta.json   : model name, vector dtype and dimension
+  - vectors.bin : row-major matrix of cached vectors, memory-mapped for reads
+  - keys.bin    : 32-byte sha256 digest per row, same order
+
+Both files are append-only: vectors are written before their keys, so a
+crash mid-append leaves at most a tail that the next open cuts off.
+Vectors are stored as EMBEDDING_CACHE_DTYPE (float16 halves the size);
+freshly computed vectors are rounded the same way, so a chunk gets the
+same embedding whether it came from the model or from the cache.
+Single writer assumed: run one ingest process at a time.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from .config import EMBEDDING_CACHE_DTYPE
+
+DIGEST_BYTES = 32
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+def _model_dir_name(model_name: str) -> str:
+    # Readable and filesystem-safe, plus a hash so distinct names never collide
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)[:64]
+    return f"{slug}-{hashlib.sha256(model_name.encode('utf-8')).hexdigest()[:8]}"
+
+def _append(path: Path, data: bytes) -> None:
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str, model_name: str, dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self._dir = Path(cache_dir) / _model_dir_name(model_name)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._meta_path = self._dir / "meta.json"
+        self._vectors_path = self._dir / "vectors.bin"
+        self._keys_path = self._dir / "keys.bin"
+
+        self.dtype = np.dtype(dtype)
+        self.dim = 0
+        if self._meta_path.exists():
+            meta = json.loads(self._meta_path.read_text())
+            # An existing cache keeps the dtype it was created with
+            self.dtype = np.dtype(meta["dtype"])
+            self.dim = int(meta["dim"])
+        self._rows = {}        # digest -> row
+        self._vectors = None   # memmap (rows x dim)
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _load(self) -> None:
+        if not self.dim:
+            return
+        keys = np.fromfile(self._keys_path, dtype=np.uint8) if self._keys_path.exists() else np.zeros(0, np.uint8)
+        row_bytes = self.dim * self.dtype.itemsize
+        vec_size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+        n = min(len(keys) // DIGEST_BYTES, vec_size // row_bytes)
+        # Drop the tail of an interrupted append
+        if len(keys) != n * DIGEST_BYTES:
+            os.truncate(self._keys_path, n * DIGEST_BYTES)
+        if vec_size != n * row_bytes:
+            os.truncate(self._vectors_path, n * row_bytes)
+        keys = keys[: n * DIGEST_BYTES].reshape(n, DIGEST_BYTES)
+        self._rows = {keys[i].tobytes(): i for i in range(n)}
+        self._map(n)
+
+    def _map(self, n: int) -> None:
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(n, self.dim)) if n else None
+        )
+
+    def lookup(self, digests: Sequence[bytes]) -> np.ndarray:
+        """Row of each digest, -1 where not cached."""
+        return np.asarray([self._rows.get(d, -1) for d in digests], dtype=np.int64)
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Cached vectors of `rows` (all >= 0) as float32."""
+        return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def add(self, digests: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Append vectors for digests not cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(digests):
+            return
+        if not self.dim:
+            self.dim = int(vectors.shape[1])
+            self._meta_path.write_text(json.dumps(
+                {"model": self.model_name, "dtype": self.dtype.name, "dim": self.dim}
+            ))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"embedding dimension {vectors.shape[1]} != cached {self.dim} for {self.model_name}")
+        new, seen = [], set()
+        for i, d in enumerate(digests):
+            if d not in self._rows and d not in seen:
+                new.append(i)
+                seen.add(d)
+        if not new:
+            return
+        _append(self._vectors_path, np.ascontiguousarray(vectors[new], dtype=self.dtype).tobytes())
+        _append(self._keys_path, b"".join(digests[i] for i in new))
+        start = len(self._rows)
+        for n, i in enumerate(new):
+            self._rows[digests[i]] = start + n
+        self._map(len(self._rows))
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], Sequence]) -> np.ndarray:
+        """
+        Embeddings of `texts` (float32, len(texts) x dim): cached ones are
+        read back, the rest computed with `embed_fn` (each distinct text
+        once) and added to the cache.
+        """
+        digests = [text_digest(t) for t in texts]
+        rows = self.lookup(digests)
+        first = {}
+        for i, d in enumerate(digests):
+            if rows[i] < 0:
+                first.setdefault(d, i)
+        self.hits += int((rows >= 0).sum())
+        self.misses += len(first)
+        if first:
+            computed = np.asarray(embed_fn([texts[i] for i in first.values()]), dtype=np.float32)
+            self.add(list(first), computed)
+            rows = self.lookup(digests)
+        if not len(texts):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.vectors(rows)
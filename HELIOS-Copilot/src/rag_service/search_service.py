@@ -1,11 +1,34 @@
 from typing import Literal, List, Dict, Any
-from .vector_store import get_collection
+from .config import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS
+from .result_cache import ResultCache, cache_key, hits_size
+from .vector_store import get_collection, get_generation
 
 Kind = Literal["all", "pdf", "email"]
 
+_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+
 def search(query: str, kind: Kind = "all", k: int = 5) -> List[Dict[str, Any]]:
-    """Search the Chroma collection, optionally filtering by source_type."""
+    """
+    Search the Chroma collection, optionally filtering by source_type.
+    Results are cached per collection generation (see result_cache.py).
+    """
     col = get_collection()
+    if not RESULT_CACHE_MAX_BYTES:
+        return _query(col, query, kind, k)
+
+    key = cache_key(query, kind=kind, k=k)
+    generation = get_generation()
+    hits = _cache.get(key, generation)
+    if hits is None:
+        hits = _query(col, query, kind, k)
+        _cache.put(key, generation, hits, hits_size(hits))
+    return [dict(h) for h in hits]
+
+def cache_stats() -> Dict[str, Any]:
+    """Result cache counters (hits, misses, evictions, ...) and size."""
+    return _cache.stats()
+
+def _query(col, query: str, kind: Kind, k: int) -> List[Dict[str, Any]]:
     where = None
     if kind == "pdf":
         where = {"source_type": "pdf"}
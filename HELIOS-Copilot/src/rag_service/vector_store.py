@@ -1,9 +1,58 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
 import chromadb
-from .config import CHROMA_PERSIST_DIR, CHROMA_COLLECTION_NAME
+from .config import CHROMA_PERSIST_DIR, CHROMA_COLLECTION_NAME, INDEX_REFRESH_SECONDS
 from .embeddings import get_embedding_function
 
+# Bumped by every write (see _bump_generation), so a long-running API
+# process notices commits made by scripts/ingest.py in another process
+GENERATION_FILE = "generation"
+
+# Chunks per col.upsert / col.delete call (Chroma caps the batch size)
+WRITE_BATCH = 4096
+
 _client = None
 _collection = None
+_lock = threading.Lock()  # guards the stale check and swap of _client / _collection
+_generation = 0       # generation the cached client / collection were opened at
+_last_check = 0.0
+
+def _generation_path() -> Path:
+    return Path(CHROMA_PERSIST_DIR) / GENERATION_FILE
+
+def _read_generation() -> int:
+    try:
+        return int(_generation_path().read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _bump_generation() -> None:
+    global _generation
+    generation = _read_generation() + 1
+    path = _generation_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(str(generation))
+    os.replace(tmp, path)
+    # Our own write is already visible to our client
+    _generation = generation
+
+def _is_stale() -> bool:
+    """True once another process committed a newer generation (checked at most once per INDEX_REFRESH_SECONDS)."""
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < INDEX_REFRESH_SECONDS:
+        return False
+    _last_check = now
+    return _read_generation() > _generation
+
+def get_generation() -> int:
+    """Generation of the collection get_collection() currently serves."""
+    return _generation
 
 def get_client():
     global _client
@@ -12,12 +61,91 @@ def get_client():
     return _client
 
 def get_collection():
-    global _collection
-    if _collection is None:
-        client = get_client()
-        emb_fn = get_embedding_function()
-        _collection = client.get_or_create_collection(
-            name=CHROMA_COLLECTION_NAME,
-            embedding_function=emb_fn,
-        )
-    return _collection
+    global _client, _collection, _generation
+    with _lock:
+        if _collection is not None and _is_stale():
+            # Chroma caches one system (and its vector index) per path; drop it
+            # so the next client reads the new commit from disk. Queries already
+            # holding the old collection finish on it, so the old system is not
+            # stopped here: it is freed with the last reference to it.
+            _client.clear_system_cache()
+            _client = None
+            _collection = None
+        if _collection is None:
+            _generation = _read_generation()
+            client = get_client()
+            emb_fn = get_embedding_function()
+            _collection = client.get_or_create_collection(
+                name=CHROMA_COLLECTION_NAME,
+                embedding_function=emb_fn,
+            )
+        return _collection
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_id(source: str, locator, chunk_index: int, text: str) -> str:
+    """
+    Content-addressed chunk id from (source, page / message id, chunk
+    index, content hash): the same chunk always gets the same id, and any
+    change to its text gives a new one.
+    """
+    key = "\x1f".join([source, str(locator), str(chunk_index), content_hash(text)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class SourceSync:
+    """
+    Makes the stored chunks of `source` exactly the ids (from chunk_id) it
+    produces, for chunks that arrive in batches (ingest_pipeline.py):
+    pending() filters a batch down to the chunks not stored yet, write()
+    upserts them with their embeddings, and finish() deletes the stored
+    chunks the source no longer produced.
+    """
+    def __init__(self, source: str):
+        self.source = source
+        self._col = get_collection()
+        # Stored ids not produced yet this run; what is left at finish()
+        # has vanished from the source
+        self._unseen = set(self._col.get(where={"source": source}, include=[])["ids"])
+        # Ids produced so far this run, stored or written: a repeat (same
+        # Message-ID and text twice in a PST) is neither embedded nor
+        # written again, in whichever batch it comes
+        self._seen = set()
+        self.added = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def pending(self, ids):
+        """Indexes of the `ids` that still need embedding and writing."""
+        out = []
+        for i, chunk in enumerate(ids):
+            if chunk in self._seen:
+                continue
+            self._seen.add(chunk)
+            if chunk in self._unseen:
+                self._unseen.discard(chunk)
+                self.unchanged += 1
+            else:
+                out.append(i)
+        return out
+
+    def write(self, ids, documents, metadatas, embeddings=None) -> None:
+        for start in range(0, len(ids), WRITE_BATCH):
+            end = start + WRITE_BATCH
+            self._col.upsert(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end] if embeddings is not None else None,
+            )
+        self.added += len(ids)
+
+    def finish(self):
+        """Delete vanished chunks and publish; returns (added, unchanged, removed)."""
+        vanished = sorted(self._unseen)
+        for start in range(0, len(vanished), WRITE_BATCH):
+            self._col.delete(ids=vanished[start:start + WRITE_BATCH])
+        self.removed = len(vanished)
+        if self.added or self.removed:
+            _bump_generation()
+        return self.added, self.unchanged, self.removed
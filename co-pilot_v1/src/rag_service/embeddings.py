@@ -1,8 +1,43 @@
+from typing import List
+
+import numpy as np
 from chromadb.utils import embedding_functions
-from .config import EMBEDDING_MODEL_NAME
+from .config import EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_DIR
+from .embedding_cache import EmbeddingCache
+
+_embedding_function = None
+_cache = None
 
 def get_embedding_function():
-    """Return a Chroma-compatible embedding function using SentenceTransformers."""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=EMBEDDING_MODEL_NAME
-    )
+    """
+    Return a Chroma-compatible embedding function using SentenceTransformers.
+    One instance per process: the collection (vector_store.get_collection)
+    and embed_documents share it, so the model is loaded once.
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        _embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=EMBEDDING_MODEL_NAME
+        )
+    return _embedding_function
+
+def get_embedding_cache():
+    """The on-disk embedding cache, None when disabled (EMBEDDING_CACHE_DIR)."""
+    global _cache
+    if _cache is None and EMBEDDING_CACHE_DIR:
+        _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME)
+    return _cache
+
+def _embed(texts: List[str]):
+    # The model is already loaded by get_collection(); the cache saves
+    # running it, not loading it
+    return get_embedding_function()(texts)
+
+def embed_documents(texts: List[str]) -> List[List[float]]:
+    """Embeddings for chunks about to be written to Chroma, cached on disk."""
+    if not texts:
+        return []
+    cache = get_embedding_cache()
+    if cache is None:
+        return np.asarray(_embed(texts), dtype=np.float32).tolist()
+    return cache.embed(texts, _embed).tolist()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The package lives under src/ (not installed); scripts put it on the path the same way
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,77 @@
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from rag_service.snippets import DEFAULT_FIELDS, SNIPPET_ONLY_FIELDS, hit_payloads
+from rag_service.tfidf_index import TfidfIndex
+
+_DISCLAIMER = (
+    "This message and any attachments are confidential and intended solely for the addressee. "
+    "If you have received it in error please notify the sender and delete it. "
+) * 10
+
+
+def _synthetic_emails(n_docs: int, vocab_size: int, body_len: int, rng: np.random.Generator):
+    # Email-shaped docs: short header, Zipf body, long disclaimer
+    vocab = np.array([f"t{i}" for i in range(vocab_size)])
+    texts = []
+    for i in range(n_docs):
+        ids = np.minimum(rng.zipf(1.2, size=rng.integers(body_len // 2, body_len * 2)), vocab_size) - 1
+        texts.append(
+            f"Subject: report {i}\nFrom: a@example.com\nTo: b@example.com\n\n"
+            + " ".join(vocab[ids]) + "\n\n" + _DISCLAIMER
+        )
+    metas = [{"source_type": "email", "source": f"synthetic-{i}", "subject": f"report {i}"} for i in range(n_docs)]
+    return texts, metas
+
+
+def _measure(index: TfidfIndex, queries, k: int, fields):
+    sizes, build_ms, dump_ms = [], [], []
+    for q in queries:
+        hits = index.search(q, k=k)
+        for h in hits:
+            h.text  # read the doc store outside the timings
+        start = time.perf_counter()
+        payload = {"hits": hit_payloads(hits, q, fields)}
+        middle = time.perf_counter()
+        body = json.dumps(payload)
+        end = time.perf_counter()
+        sizes.append(len(body.encode("utf-8")))
+        build_ms.append((middle - start) * 1000.0)
+        dump_ms.append((end - middle) * 1000.0)
+    return statistics.mean(sizes), statistics.median(build_ms), statistics.median(dump_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hit payload size and serialization time: full text vs snippets")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--body-len", type=int, default=400, help="Body tokens per email (about)")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts, metas = _synthetic_emails(args.docs, args.vocab, args.body_len, rng)
+    queries = [f"t{rng.integers(5, 50)} t{rng.integers(50, 2000)}" for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as store:
+        index = TfidfIndex(store)
+        index.add_documents(texts, metas)
+
+        print(f"{'payload':>13} {'bytes/resp':>11} {'build ms':>9} {'json ms':>8}")
+        rows = {"full text": DEFAULT_FIELDS, "snippet_only": SNIPPET_ONLY_FIELDS}
+        results = {}
+        for label, fields in rows.items():
+            results[label] = _measure(index, queries, args.k, fields)
+            size, build, dump = results[label]
+            print(f"{label:>13} {size:>11.0f} {build:>9.3f} {dump:>8.3f}")
+        full, snip = results["full text"], results["snippet_only"]
+        print(f"payload {full[0] / snip[0]:.1f}x smaller, json.dumps {full[2] / snip[2]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
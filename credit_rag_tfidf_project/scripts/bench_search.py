@@ -0,0 +1,66 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from rag_service.tfidf_index import TfidfIndex
+
+
+def _synthetic_corpus(n_docs: int, vocab_size: int, doc_len: int, rng: np.random.Generator):
+    # Zipf-distributed term ids so a few terms are very common, most are rare
+    vocab = np.array([f"t{i}" for i in range(vocab_size)])
+    texts = []
+    for _ in range(n_docs):
+        ids = np.minimum(rng.zipf(1.2, size=rng.integers(doc_len // 2, doc_len * 2)), vocab_size) - 1
+        texts.append(" ".join(vocab[ids]))
+    metas = [
+        {"source_type": "email" if i % 4 == 0 else "pdf", "source": "synthetic", "page": i}
+        for i in range(n_docs)
+    ]
+    return texts, metas
+
+
+def _time_queries(index: TfidfIndex, queries, strategy: str, k: int):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, k=k, strategy=strategy)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 top-k latency vs corpus size: dense vs WAND")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated corpus sizes")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--doc-len", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'docs':>8} {'query':>7} {'dense p50':>10} {'dense p95':>10} {'wand p50':>10} {'wand p95':>10}")
+
+    for n_docs in [int(s) for s in args.sizes.split(",")]:
+        texts, metas = _synthetic_corpus(n_docs, args.vocab, args.doc_len, rng)
+        with tempfile.TemporaryDirectory() as store:
+            index = TfidfIndex(store)
+            index.add_documents(texts, metas)
+
+            query_sets = {
+                # one frequent + two mid-frequency terms
+                "common": [f"t0 t{rng.integers(5, 50)} t{rng.integers(50, 500)}" for _ in range(args.queries)],
+                # selective terms, the case WAND is meant for
+                "rare": [f"t{rng.integers(500, 5000)} t{rng.integers(500, 5000)}" for _ in range(args.queries)],
+            }
+            for label, queries in query_sets.items():
+                d50, d95 = _time_queries(index, queries, "dense", args.k)
+                w50, w95 = _time_queries(index, queries, "wand", args.k)
+                print(f"{n_docs:>8} {label:>7} {d50:>10.2f} {d95:>10.2f} {w50:>10.2f} {w95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
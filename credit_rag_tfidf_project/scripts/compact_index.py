@@ -0,0 +1,37 @@
+import argparse
+from pathlib import Path
+
+from rag_service.config import TFIDF_STORE_DIR
+from rag_service.ingest_manifest import IngestManifest
+from rag_service.tfidf_index import open_index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Delete sources from the BM25 index and reclaim the space of deleted docs"
+    )
+    parser.add_argument("--store", default=str(TFIDF_STORE_DIR), help="Index store directory")
+    parser.add_argument(
+        "--delete", action="append", default=[], metavar="SOURCE",
+        help="Delete all chunks of this source (PDF or .msg path); repeatable",
+    )
+    parser.add_argument(
+        "--min-deleted-ratio", type=float, default=0.0,
+        help="Only rewrite segments with more than this fraction of deleted docs",
+    )
+    args = parser.parse_args()
+
+    idx = open_index(Path(args.store))
+    manifest = IngestManifest(Path(args.store))
+    for source in args.delete:
+        deleted = idx.delete_by_source(str(Path(source).resolve()))
+        # So a later ingest of the file is not skipped as unchanged
+        manifest.forget([str(Path(source).resolve())])
+        print(f"Deleted {deleted} chunks of {source}")
+
+    reclaimed = idx.compact(args.min_deleted_ratio)
+    print(f"Reclaimed {reclaimed} deleted chunks; {idx.n_docs} live chunks remain")
+
+
+if __name__ == "__main__":
+    main()
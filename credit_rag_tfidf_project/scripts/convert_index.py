@@ -0,0 +1,32 @@
+import argparse
+from pathlib import Path
+
+from rag_service.config import TFIDF_STORE_DIR
+from rag_service.segments import read_manifest
+from rag_service.tfidf_index import convert_store
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-index a BM25 store into the current segment format / tokenizer settings"
+    )
+    parser.add_argument("--store", default=str(TFIDF_STORE_DIR), help="Index store directory")
+    args = parser.parse_args()
+
+    store = Path(args.store)
+    converted = convert_store(store)
+    if converted:
+        print(f"Converted {converted} documents in {store}")
+
+    manifest = read_manifest(store)
+    if manifest is None:
+        print(f"No index found in {store}")
+        return
+    print(
+        f"{store}: {manifest['n_docs']} docs in {len(manifest['segments'])} segments "
+        f"(format {manifest.get('format')}, {manifest.get('vocab_size', 0)} terms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
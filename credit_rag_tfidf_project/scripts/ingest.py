@@ -1,24 +1,70 @@
 import argparse
+from pathlib import Path
+import time
 
-from rag_service.pdf_ingest import ingest_pdf
-from rag_service.msg_ingest import ingest_msg
+from rag_service.config import INGEST_WORKERS
+from rag_service.ingest_manifest import IngestManifest
+from rag_service.pdf_ingest import ingest_pdf, ingest_pdf_dir
+from rag_service.msg_ingest import ingest_msg, ingest_msg_dir
 
 
 def main():
     parser = argparse.ArgumentParser(description="Ingest PDFs and .msg emails into TF-IDF index")
     parser.add_argument("--pdf", help="Path to a single PDF file to ingest")
-    parser.add_argument("--msg", help="Path to a .msg file or folder of .msg files to ingest")
+    parser.add_argument("--pdf-dir", help="Folder to ingest every PDF from, recursively")
+    parser.add_argument("--msg", help="Path to a .msg file, or a folder to ingest every .msg file from, recursively")
+    parser.add_argument(
+        "--workers", type=int, default=INGEST_WORKERS,
+        help="Workers parsing --pdf-dir / --msg folder files (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Re-ingest sources even if unchanged since their last ingest",
+    )
     args = parser.parse_args()
 
-    if not args.pdf and not args.msg:
-        parser.error("Provide at least one of --pdf or --msg")
+    if not args.pdf and not args.pdf_dir and not args.msg:
+        parser.error("Provide at least one of --pdf, --pdf-dir or --msg")
+
+    # Sources unchanged since their last ingest are skipped, which also
+    # resumes an interrupted folder ingest (see ingest_manifest.py)
+    manifest = IngestManifest(skip_unchanged=not args.force)
 
     if args.pdf:
-        count = ingest_pdf(args.pdf)
-        print(f"Ingested {count} PDF chunks from {args.pdf}")
+        if manifest.unchanged(str(Path(args.pdf).resolve())):
+            print(f"Skipped {args.pdf}: unchanged since its last ingest")
+        else:
+            count = ingest_pdf(args.pdf, manifest=manifest)
+            print(f"Ingested {count} PDF chunks from {args.pdf}")
+
+    def report(path, error):
+        print(f"Skipped {path}: {error}")
+
+    if args.pdf_dir:
+        start = time.perf_counter()
+        files, count, skipped = ingest_pdf_dir(
+            args.pdf_dir, workers=args.workers, on_error=report, manifest=manifest
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            f"Ingested {count} PDF chunks from {files} PDFs under {args.pdf_dir} "
+            f"in {elapsed:.1f}s ({files / elapsed if elapsed else 0.0:.1f} files/sec); "
+            f"{skipped} unchanged PDFs skipped"
+        )
 
-    if args.msg:
-        count = ingest_msg(args.msg)
+    if args.msg and Path(args.msg).is_dir():
+        start = time.perf_counter()
+        files, count, skipped = ingest_msg_dir(
+            args.msg, workers=args.workers, on_error=report, manifest=manifest
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            f"Ingested {count} .msg email chunks from {files} files under {args.msg} "
+            f"in {elapsed:.1f}s ({files / elapsed if elapsed else 0.0:.1f} files/sec); "
+            f"{skipped} unchanged files skipped"
+        )
+    elif args.msg:
+        count = ingest_msg(args.msg, manifest=manifest)
         print(f"Ingested {count} .msg email chunks from {args.msg}")
 
 
@@ -0,0 +1,130 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rag_service.tfidf_index import TfidfIndex
+
+
+def _synthetic_batch(start: int, n_docs: int, vocab: np.ndarray, doc_len: int, rng: np.random.Generator):
+    # Zipf-distributed terms, as in bench_search.py
+    texts = []
+    for _ in range(n_docs):
+        ids = np.minimum(rng.zipf(1.2, size=rng.integers(doc_len // 2, doc_len * 2)), len(vocab)) - 1
+        texts.append(" ".join(vocab[ids]))
+    metas = [
+        {"source_type": "email" if i % 4 == 0 else "pdf", "source": f"synthetic-{i // 1000}", "page": i}
+        for i in range(start, start + n_docs)
+    ]
+    return texts, metas
+
+
+def _rss_mb() -> tuple:
+    """
+    Resident memory as (private heap, mapped file pages) in MB. File pages
+    are the memory-mapped segments in the OS page cache: shared between
+    processes and reclaimable. Falls back to peak RSS off Linux.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("RssAnon", "RssFile"):
+                    fields[key] = int(value.split()[0]) / 1024.0
+        return fields["RssAnon"], fields["RssFile"]
+    except (OSError, KeyError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 0.0
+
+
+def _disk_mb(store: Path) -> dict:
+    """On-disk size by component."""
+    groups = {"postings": 0, "doc store": 0, "total": 0}
+    for path in store.rglob("*"):
+        if not path.is_file():
+            continue
+        size = path.stat().st_size
+        groups["total"] += size
+        if path.name.startswith("postings_"):
+            groups["postings"] += size
+        elif path.name.startswith(("docs", "docstore", "doc_offsets")):
+            groups["doc store"] += size
+    return {k: v / 2**20 for k, v in groups.items()}
+
+
+def _measure(store: str, queries: int, k: int) -> None:
+    """Child process: memory after opening the index and after serving queries."""
+    base_anon, base_file = _rss_mb()
+    index = TfidfIndex(store)
+    opened_anon, _ = _rss_mb()
+    rng = np.random.default_rng(1)
+    start = time.perf_counter()
+    for _ in range(queries):
+        index.search(f"t{rng.integers(0, 50)} t{rng.integers(50, 5000)}", k=k)
+    per_query = (time.perf_counter() - start) * 1000.0 / max(queries, 1)
+    anon, file = _rss_mb()
+    print(f"{opened_anon - base_anon:.1f} {anon - base_anon:.1f} {file - base_file:.1f} {per_query:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="BM25 store size and resident memory: plain vs compressed segments"
+    )
+    parser.add_argument("--docs", type=int, default=1_000_000, help="Synthetic chunks")
+    parser.add_argument("--batch", type=int, default=100_000, help="Chunks per add_documents call")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--doc-len", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--measure", metavar="STORE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.queries, args.k)
+        return
+
+    vocab = np.array([f"t{i}" for i in range(args.vocab)])
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {"plain": Path(tmp) / "plain", "compressed": Path(tmp) / "compressed"}
+        indexes = {label: TfidfIndex(path, compress=(label == "compressed")) for label, path in stores.items()}
+
+        rng = np.random.default_rng(0)
+        text_bytes = 0
+        for start in range(0, args.docs, args.batch):
+            texts, metas = _synthetic_batch(start, min(args.batch, args.docs - start), vocab, args.doc_len, rng)
+            # What the original pickle store kept in RAM: every text as a str
+            text_bytes += sum(sys.getsizeof(t) for t in texts)
+            for index in indexes.values():
+                index.add_documents(texts, metas)
+        for index in indexes.values():
+            index.wait_for_merge()
+
+        print(f"{args.docs} chunks; all texts as Python str objects: {text_bytes / 2**20:.1f} MB\n")
+        print("RSS columns are MB growth of the serving process: heap after opening and after")
+        print("the queries, and memory-mapped segment pages touched (page cache, reclaimable).\n")
+        print(
+            f"{'layout':>11} {'disk MB':>9} {'postings':>9} {'doc store':>10} "
+            f"{'heap open':>10} {'heap query':>11} {'mapped':>8} {'ms/query':>9}"
+        )
+        for label, path in stores.items():
+            disk = _disk_mb(path)
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--measure", str(path),
+                 "--queries", str(args.queries), "--k", str(args.k)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            heap_open, heap_query, mapped, per_query = (float(v) for v in out[-4:])
+            print(
+                f"{label:>11} {disk['total']:>9.1f} {disk['postings']:>9.1f} {disk['doc store']:>10.1f} "
+                f"{heap_open:>10.1f} {heap_query:>11.1f} {mapped:>8.1f} {per_query:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import argparse
 from rag_service.search_service import search
+from rag_service.snippets import make_snippet
 
 
 def main():
@@ -12,7 +13,7 @@ def main():
     for h in hits:
         meta = h["meta"]
         print(f"RANK {h['rank']} | SCORE {h['score']:.4f} | PAGE {meta.get('page')} | SOURCE {meta.get('source')}")
-        print(h["text"][:300].replace("\n", " "))
+        print(make_snippet(h["text"], args.query)["text"].replace("\n", " "))
         print("-" * 80)
 
 
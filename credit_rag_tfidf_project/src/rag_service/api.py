@@ -1,7 +1,10 @@
-from fastapi import FastAPI
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
-from .search_service import search
+from .search_service import cache_stats, search, search_many
+from .snippets import hit_payloads, payload_fields
 from .llm_vertex import generate_vertex_answer
 
 
@@ -12,6 +15,20 @@ class SearchRequest(BaseModel):
     question: str           # natural language question
     kind: str = "all"       # "all" | "pdf" | "email"
     k: int = 5              # top-k hits to use as context
+    filters: Optional[Dict[str, Any]] = None   # metadata filter, see filters.py
+    # Hit keys returned: any of rank, text, meta, score, distance, snippet
+    # (snippets.py); snippet_only = everything but the full text
+    fields: Optional[List[str]] = None
+    snippet_only: bool = False
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]      # scored together in one batch
+    kind: str = "all"       # "all" | "pdf" | "email"
+    k: int = 5              # top-k hits per query
+    filters: Optional[Dict[str, Any]] = None
+    fields: Optional[List[str]] = None
+    snippet_only: bool = False
 
 
 @app.get("/health")
@@ -19,11 +36,40 @@ def health():
     return {"status": "ok"}
 
 
+# Result cache counters and size (see result_cache.py)
+@app.get("/cache_stats")
+def get_cache_stats():
+    return cache_stats()
+
+
 # Optional: hits-only endpoint for debugging BM25 results
+# (fields: comma-separated hit keys, e.g. "rank,meta,snippet")
 @app.get("/search_hits")
-def search_hits(query: str, kind: str = "all", k: int = 5):
+def search_hits(
+    query: str, kind: str = "all", k: int = 5, fields: Optional[str] = None, snippet_only: bool = False
+):
+    try:
+        keys = payload_fields(fields.split(",") if fields else None, snippet_only)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     hits = search(query, kind=kind, k=k)
-    return {"hits": hits}
+    return {"hits": hit_payloads(hits, query, keys)}
+
+
+# Batch hits-only endpoint for offline evaluation / report jobs
+@app.post("/search_hits/batch")
+def search_hits_batch(req: BatchSearchRequest):
+    try:
+        keys = payload_fields(req.fields, req.snippet_only)
+        hits_per_query = search_many(req.queries, kind=req.kind, k=req.k, filters=req.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "results": [
+            {"query": q, "hits": hit_payloads(hits, q, keys)}
+            for q, hits in zip(req.queries, hits_per_query)
+        ]
+    }
 
 
 # Main RAG endpoint: search + Vertex LLM answer
@@ -35,11 +81,16 @@ def search_and_answer(req: SearchRequest):
     1. BM25 search over PDFs + emails
     2. Build RAG prompt from top-k hits
     3. Call Vertex GenAI via VertexGenAI wrapper
-    4. Return final answer + raw hits
+    4. Return final answer + raw hits (or just the requested hit fields)
     """
-    hits = search(req.question, kind=req.kind, k=req.k)
+    try:
+        keys = payload_fields(req.fields, req.snippet_only)
+        hits = search(req.question, kind=req.kind, k=req.k, filters=req.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The prompt gets the full texts; the response only what was asked for
     answer = generate_vertex_answer(req.question, hits)
     return {
         "answer": answer,
-        "hits": hits,
+        "hits": hit_payloads(hits, req.question, keys),
     }
@@ -0,0 +1,260 @@
+"""
+Columnar metadata store for BM25 segments.
+
+Instead of one JSON object per doc, every metadata field becomes a column:
+  - "str"   : dictionary-encoded; meta_<i>.npy holds int32 codes (-1 =
+              field missing) into the sorted distinct values
+              meta_<i>_dict.npy / meta_<i>_dict_offsets.npy, so a source path
+              shared by a thousand chunks is stored once
+  - "int"   : int64 values (page numbers, epochs)
+  - "float" : float64 values
+  - "json"  : anything else (lists, bools, None, mixed types), one JSON
+              value per doc in meta_<i>.npy / meta_<i>_offsets.npy
+Numeric columns add meta_<i>_present.npy when some docs lack the field.
+meta_fields.json lists the fields (first-seen order) and their kind.
+
+Values are normalised like the old JSON store (json.dumps(default=str)),
+so a datetime comes back as its string form. Filters evaluate directly on
+the codes / values (see filters.py) and a doc's dict is only built for
+returned hits. JsonRows reads segments written before columns existed.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from pathlib import Path
+import bisect
+import json
+
+import numpy as np
+
+from . import segments
+
+FIELDS_FILE = "meta_fields.json"
+
+
+def _kind(values: List[Any]) -> str:
+    if all(type(v) is str for v in values):
+        return "str"
+    if all(type(v) is int for v in values):
+        return "int"
+    if all(type(v) in (int, float) for v in values):
+        return "float"
+    return "json"
+
+
+def write_columns(seg_dir: Path, metadatas: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Column arrays for `metadatas` (file stem -> array, saved by the caller
+    with the rest of the segment); writes meta_fields.json itself.
+    """
+    rows = [json.loads(json.dumps(m, default=str)) for m in metadatas]
+    names: Dict[str, None] = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+
+    fields = []
+    arrays: Dict[str, np.ndarray] = {}
+    for i, name in enumerate(names):
+        docs = [d for d, row in enumerate(rows) if name in row]
+        values = [rows[d][name] for d in docs]
+        kind = _kind(values)
+        fields.append({"name": name, "kind": kind})
+        key = f"meta_{i}"
+
+        if kind == "str":
+            distinct = sorted(set(values))
+            code_of = {v: c for c, v in enumerate(distinct)}
+            codes = np.full(len(rows), -1, dtype=np.int32)
+            codes[docs] = [code_of[v] for v in values]
+            arrays[key] = codes
+            arrays[key + "_dict"], arrays[key + "_dict_offsets"] = segments.pack_strings(distinct)
+        elif kind in ("int", "float"):
+            col = np.zeros(len(rows), dtype=np.int64 if kind == "int" else np.float64)
+            col[docs] = values
+            arrays[key] = col
+            if len(docs) < len(rows):
+                present = np.zeros(len(rows), dtype=bool)
+                present[docs] = True
+                arrays[key + "_present"] = present
+        else:
+            encoded = [""] * len(rows)
+            for d, v in zip(docs, values):
+                encoded[d] = json.dumps(v)
+            arrays[key], arrays[key + "_offsets"] = segments.pack_strings(encoded)
+
+    with open(seg_dir / FIELDS_FILE, "w", encoding="utf-8") as f:
+        json.dump(fields, f)
+    return arrays
+
+
+class _StringTable:
+    """Sequence view over packed utf-8 strings (sorted for str dictionaries)."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def code(self, value: str) -> int:
+        """Index of `value` (binary search), -1 if absent."""
+        i = bisect.bisect_left(self, value)
+        return i if i < len(self) and self[i] == value else -1
+
+
+class _Column:
+    __slots__ = ("kind", "values", "table", "_present")
+
+    def __init__(self, kind: str, values: np.ndarray, present: Optional[np.ndarray], table: Optional[_StringTable]):
+        self.kind = kind
+        self.values = values
+        self.table = table
+        self._present = present
+
+    @property
+    def present(self) -> Optional[np.ndarray]:
+        """Docs that have the field (None: all of them)."""
+        if self._present is None and self.kind == "str":
+            self._present = np.asarray(self.values) >= 0
+        elif self._present is None and self.kind == "json":
+            self._present = np.diff(self.table._offsets) > 0
+        return self._present
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+class MetadataColumns:
+    """
+    Read side of write_columns. Every column is mapped when the segment is
+    opened (like the rest of the segment, so hits stay readable after a
+    merge removes the directory); pages are only touched when used.
+    """
+
+    def __init__(self, seg_dir: Path, n_docs: int):
+        self.n_docs = n_docs
+        with open(seg_dir / FIELDS_FILE, "r", encoding="utf-8") as f:
+            self.fields: List[Dict[str, str]] = json.load(f)
+        self._index = {f["name"]: i for i, f in enumerate(self.fields)}
+        self._columns = [self._open(seg_dir, i, f["kind"]) for i, f in enumerate(self.fields)]
+        self._objects: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _open(seg_dir: Path, i: int, kind: str) -> _Column:
+        key = f"meta_{i}"
+        values = segments.open_array(seg_dir / f"{key}.npy")
+        present = None
+        table = None
+        if kind == "str":
+            table = _StringTable(
+                segments.open_array(seg_dir / f"{key}_dict.npy"),
+                segments.open_array(seg_dir / f"{key}_dict_offsets.npy"),
+            )
+        elif kind == "json":
+            table = _StringTable(values, segments.open_array(seg_dir / f"{key}_offsets.npy"))
+        elif (seg_dir / f"{key}_present.npy").exists():
+            present = segments.open_array(seg_dir / f"{key}_present.npy")
+        return _Column(kind, values, present, table)
+
+    def _column(self, i: int) -> _Column:
+        return self._columns[i]
+
+    def _value(self, col: _Column, doc_id: int) -> Any:
+        if col.kind == "str":
+            return col.table[int(col.values[doc_id])]
+        if col.kind == "json":
+            return json.loads(col.table[doc_id])
+        return col.values[doc_id].item()
+
+    def row(self, doc_id: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for i, field in enumerate(self.fields):
+            col = self._column(i)
+            if col.present is None or col.present[doc_id]:
+                out[field["name"]] = self._value(col, doc_id)
+        return out
+
+    def objects(self, field: str) -> np.ndarray:
+        """All values of `field` as an object array (None where missing), cached."""
+        out = self._objects.get(field)
+        if out is None:
+            out = np.empty(self.n_docs, dtype=object)
+            i = self._index.get(field)
+            if i is not None:
+                col = self._column(i)
+                for d in range(self.n_docs):
+                    if col.present is None or col.present[d]:
+                        out[d] = self._value(col, d)
+            self._objects[field] = out
+        return out
+
+    def equals_mask(self, field: str, value: Any) -> np.ndarray:
+        return self.isin_mask(field, [value])
+
+    def isin_mask(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        i = self._index.get(field)
+        if i is None:
+            return np.zeros(self.n_docs, dtype=bool)
+        col = self._column(i)
+        if col.kind == "str":
+            codes = [col.table.code(v) for v in values if isinstance(v, str)]
+            return np.isin(col.values, [c for c in codes if c >= 0])
+        if col.kind in ("int", "float"):
+            numbers = [v for v in values if _is_number(v) or isinstance(v, bool)]
+            mask = np.isin(col.values, numbers)
+            return mask if col.present is None else (mask & col.present)
+        allowed = list(values)
+        return np.fromiter((v in allowed for v in self.objects(field)), dtype=bool, count=self.n_docs)
+
+    def numeric(self, field: str) -> np.ndarray:
+        """Float view of `field` (NaN where missing or not a number)."""
+        i = self._index.get(field)
+        if i is not None and self._column(i).kind in ("int", "float"):
+            col = self._column(i)
+            out = np.asarray(col.values, dtype=np.float64)
+            if col.present is not None:
+                out = np.where(col.present, out, np.nan)
+            return out
+        return _numeric_from_objects(self.objects(field))
+
+
+def _numeric_from_objects(objects: np.ndarray) -> np.ndarray:
+    out = np.full(len(objects), np.nan)
+    for d, v in enumerate(objects):
+        if _is_number(v):
+            out[d] = v
+    return out
+
+
+class JsonRows:
+    """Same interface over the older one-JSON-object-per-doc store."""
+
+    def __init__(self, metas: np.ndarray, offsets: np.ndarray):
+        self._rows = _StringTable(metas, offsets)
+        self.n_docs = len(self._rows)
+        self._objects: Dict[str, np.ndarray] = {}
+
+    def row(self, doc_id: int) -> Dict[str, Any]:
+        return json.loads(self._rows[doc_id])
+
+    def objects(self, field: str) -> np.ndarray:
+        out = self._objects.get(field)
+        if out is None:
+            out = np.empty(self.n_docs, dtype=object)
+            for d in range(self.n_docs):
+                out[d] = self.row(d).get(field)
+            self._objects[field] = out
+        return out
+
+    def equals_mask(self, field: str, value: Any) -> np.ndarray:
+        return self.objects(field) == value
+
+    def isin_mask(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        allowed = list(values)
+        return np.fromiter((v in allowed for v in self.objects(field)), dtype=bool, count=self.n_docs)
+
+    def numeric(self, field: str) -> np.ndarray:
+        return _numeric_from_objects(self.objects(field))
@@ -5,3 +5,108 @@ DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
 CHUNK_PAGE_SIZE = 1  # one chunk per PDF page for now
+
+# BM25 index store (append-only segments + manifest)
+TFIDF_STORE_DIR = BASE_DIR / "tfidf_store"
+
+# Background merge: once more than SEGMENT_MERGE_FACTOR consecutive segments
+# hold fewer than SEGMENT_MERGE_MAX_DOCS docs each, they are compacted into one.
+SEGMENT_MERGE_FACTOR = 10
+SEGMENT_MERGE_MAX_DOCS = 5000
+
+# Top-k retrieval in BM25 search:
+#   "dense" - score every eligible doc, select with np.argpartition
+#   "wand"  - postings traversal with per-term upper bounds (WAND pruning)
+#   "auto"  - WAND for queries whose postings are tiny relative to the corpus
+BM25_TOPK_STRATEGY = "auto"
+
+# BM25 parameters. BM25_SCORING: "bm25" (with IDF) or "bm25_noidf" (the
+# original scoring without IDF, kept for A/B comparison).
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_SCORING = "bm25"
+
+# BM25F for docs indexed with fields (emails: subject / participants /
+# body, see fields.py); text outside any named field counts as "body".
+# A term's frequency in field f is scaled by
+#   weight_f / (1 - b_f + b_f * field length / average field length)
+# and summed over the fields before the usual k1 saturation. The scaled
+# frequencies are computed at index time against the store's running
+# average field lengths, so queries cost the same as plain BM25. Docs
+# without fields (PDF pages) keep plain BM25. Changing these re-indexes
+# the store on next load.
+BM25F_FIELDS = {
+    "subject": {"weight": 3.0, "b": 0.5},
+    "participants": {"weight": 1.5, "b": 0.3},
+    "body": {"weight": 1.0, "b": 0.75},
+}
+
+# Tokenizer pipeline (tokenizer.py). Changing any of these makes the index
+# re-tokenize its stored documents on next load.
+#   TOKEN_PATTERN       - regex for one token (applied after NFKC + casefold)
+#   TOKENIZER_STOPWORDS - drop common English function words
+#   TOKENIZER_STEMMER   - "none" or "light" (plural / possessive stripping)
+TOKEN_PATTERN = r"\w+(?:[.,'’\-]\w+)*"
+TOKENIZER_STOPWORDS = True
+TOKENIZER_STEMMER = "none"
+
+# Positional postings: store token positions (delta-encoded) per posting so
+# search supports quoted phrases and a proximity boost. Off by default since
+# positions make the postings several times larger; changing it re-indexes
+# the store on next load.
+BM25_POSITIONS = False
+
+# Proximity boost (needs BM25_POSITIONS): each pair of consecutive query
+# terms occurring within BM25_PROXIMITY_WINDOW tokens of each other adds
+# BM25_PROXIMITY_WEIGHT * min(idf of the pair) / distance. 0 disables.
+BM25_PROXIMITY_WEIGHT = 1.0
+BM25_PROXIMITY_WINDOW = 5
+
+# Deleted docs are only tombstoned; the background merge rewrites a segment
+# once more than this fraction of its docs is deleted (TfidfIndex.compact
+# reclaims on demand).
+SEGMENT_COMPACT_DELETED_RATIO = 0.3
+
+# Segment storage: varint-encoded postings and a zlib block doc store (text
+# is decompressed only for returned hits). False writes plain int32 / utf-8
+# arrays; both layouts are readable (see scripts/report_index_size.py).
+BM25_COMPRESS = True
+
+# Sharded BM25 (sharded_index.py): with BM25_SHARDS > 1, chunks are
+# hash-partitioned by source across that many shard stores under
+# TFIDF_STORE_DIR and every query is scored in all shards in parallel,
+# one worker process per shard unless BM25_SHARD_WORKERS says otherwise
+# (0 = search the shards one after another in the calling process).
+# Changing BM25_SHARDS re-partitions the store on next load.
+BM25_SHARDS = 1
+BM25_SHARD_WORKERS = None
+
+# Hot reload: long-running processes (the API) look for generations
+# committed by other processes (scripts/ingest.py) at most once per
+# INDEX_REFRESH_SECONDS before a search - one stat() of the manifest when
+# nothing changed. 0 checks on every search.
+INDEX_REFRESH_SECONDS = 1.0
+
+# Query result cache in search_service.search: LRU bounded by the estimated
+# bytes of the cached hits, entries expire after RESULT_CACHE_TTL_SECONDS
+# and the whole cache is dropped when the index generation changes.
+# RESULT_CACHE_MAX_BYTES = 0 disables it.
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = 600.0
+
+# Query-aware snippets (snippets.py): the best-matching window of about
+# SNIPPET_CHARS characters of a hit, returned with highlight offsets when
+# an API client asks for "snippet" (fields / snippet_only).
+SNIPPET_CHARS = 300
+
+# Folder ingestion (scripts/ingest.py --pdf-dir, ingest_pool.py): files are
+# parsed by INGEST_WORKERS worker processes (None = one per CPU) and
+# written by the ingest process in commits of about INGEST_COMMIT_DOCS
+# chunks, so a folder becomes a few segments instead of one per file.
+INGEST_WORKERS = None
+INGEST_COMMIT_DOCS = 5000
+
+# .msg folders (scripts/ingest.py --msg) use the same pool and commits.
+# MSG_INGEST_EXECUTOR: "process" (parsing is CPU-bound Python) or "thread"
+# (cheaper to start, for small folders or where processes are unavailable).
+MSG_INGEST_EXECUTOR = "process"
@@ -0,0 +1,73 @@
+"""
+Document fields for BM25F scoring (see config.BM25F_FIELDS).
+
+A fielded doc is its stored text plus named character spans into it,
+[(field, start, end), ...], non-overlapping and in text order; text outside
+the spans belongs to DEFAULT_FIELD. Ingest builds both with compose(), so
+the stored text (and everything that displays it) stays what it was:
+
+    text, spans = compose([(None, "Subject: "), ("subject", subject), ...])
+
+Docs indexed without spans (fields=None) are scored with plain BM25.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import BM25F_FIELDS, BM25_B
+
+DEFAULT_FIELD = "body"
+
+# Field index -> name; the default field is always present
+FIELD_NAMES: List[str] = list(BM25F_FIELDS) + ([] if DEFAULT_FIELD in BM25F_FIELDS else [DEFAULT_FIELD])
+
+Span = Tuple[str, int, int]
+
+
+def compose(parts: Iterable[Tuple[Optional[str], str]]) -> Tuple[str, List[Span]]:
+    """
+    Concatenate (field, text) parts into one text, recording the span of
+    every part with a field name; unnamed parts (labels, separators) and
+    empty ones add no span.
+    """
+    chunks: List[str] = []
+    spans: List[Span] = []
+    offset = 0
+    for field, part in parts:
+        if field is not None and part:
+            spans.append((field, offset, offset + len(part)))
+        chunks.append(part)
+        offset += len(part)
+    return "".join(chunks), spans
+
+
+def pieces(text: str, spans: List[Span]) -> Tuple[List[str], List[int]]:
+    """`text` cut at the span bounds: consecutive pieces and the field index of each."""
+    out: List[str] = []
+    field_ids: List[int] = []
+    default = FIELD_NAMES.index(DEFAULT_FIELD)
+    pos = 0
+    for field, start, end in sorted(spans, key=lambda s: s[1]):
+        if field not in FIELD_NAMES:
+            raise ValueError(f"unknown field {field!r} (see config.BM25F_FIELDS)")
+        if start < pos or end < start or end > len(text):
+            raise ValueError(f"field span {(field, start, end)} overlaps or is out of range")
+        if start > pos:
+            out.append(text[pos:start])
+            field_ids.append(default)
+        out.append(text[start:end])
+        field_ids.append(FIELD_NAMES.index(field))
+        pos = end
+    if pos < len(text):
+        out.append(text[pos:])
+        field_ids.append(default)
+    return out, field_ids
+
+
+def field_params() -> Tuple[np.ndarray, np.ndarray]:
+    """(weight, b) per field index."""
+    params = [BM25F_FIELDS.get(name, {}) for name in FIELD_NAMES]
+    return (
+        np.asarray([p.get("weight", 1.0) for p in params], dtype=np.float64),
+        np.asarray([p.get("b", BM25_B) for p in params], dtype=np.float64),
+    )
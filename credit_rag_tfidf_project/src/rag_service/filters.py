@@ -0,0 +1,89 @@
+"""
+Metadata filter expressions for BM25 search.
+
+A filter is a dict; several keys are AND-ed together:
+
+    {"source": "/docs/policy.pdf"}            equality
+    {"source_type": ["pdf", "email"]}         membership
+    {"page": {"gte": 3, "lte": 10}}           range (gt / gte / lt / lte)
+    {"from": "Jane Doe", "page": {"lt": 5}}   combined
+
+Filters are evaluated per segment as vectorized predicates over the
+metadata columns (string equality / membership compares dictionary codes)
+and return a boolean doc mask; source_type equality uses the segment's
+partition.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_RANGE_OPS = ("gt", "gte", "lt", "lte")
+
+# (field, op, value) with op in "eq" | "in" | "range"
+Clause = Tuple[str, str, Any]
+
+
+def parse_filters(spec: Optional[Dict[str, Any]]) -> List[Clause]:
+    """Validate a filter dict and turn it into a list of clauses."""
+    if not spec:
+        return []
+    if not isinstance(spec, dict):
+        raise ValueError("filters must be a dict of field -> value")
+
+    clauses: List[Clause] = []
+    for field, value in spec.items():
+        if isinstance(value, dict):
+            unknown = set(value) - set(_RANGE_OPS)
+            if unknown or not value:
+                raise ValueError(
+                    f"filter on {field!r}: range must use keys {', '.join(_RANGE_OPS)}"
+                )
+            clauses.append((field, "range", dict(value)))
+        elif isinstance(value, (list, tuple, set)):
+            clauses.append((field, "in", list(value)))
+        else:
+            clauses.append((field, "eq", value))
+    return clauses
+
+
+def evaluate(reader, kind: str, clauses: List[Clause]) -> Optional[np.ndarray]:
+    """
+    Boolean mask of the docs in `reader` (a SegmentReader) that pass `kind`
+    and every clause, or None when nothing is filtered.
+    """
+    mask: Optional[np.ndarray] = None
+
+    def _and(m: np.ndarray) -> None:
+        nonlocal mask
+        mask = m if mask is None else (mask & m)
+
+    if kind != "all":
+        _and(reader.partition(kind))
+
+    for field, op, value in clauses:
+        if op == "eq" and field == "source_type":
+            _and(reader.partition(str(value)))
+        elif op == "eq":
+            _and(reader.equals_mask(field, value))
+        elif op == "in":
+            if field == "source_type":
+                m = np.zeros(reader.n_docs, dtype=bool)
+                for v in value:
+                    m |= reader.partition(str(v))
+            else:
+                m = reader.isin_mask(field, value)
+            _and(m)
+        else:
+            col = reader.numeric_column(field)
+            m = ~np.isnan(col)
+            if "gt" in value:
+                m &= col > value["gt"]
+            if "gte" in value:
+                m &= col >= value["gte"]
+            if "lt" in value:
+                m &= col < value["lt"]
+            if "lte" in value:
+                m &= col <= value["lte"]
+            _and(m)
+
+    return mask
@@ -0,0 +1,83 @@
+"""
+Compact search hit returned by TfidfIndex.search / search_many.
+
+A Hit keeps a reference to its segment reader and local doc id instead of
+copying the text and metadata dict; both are read from the segment on
+first access. It still behaves like the old hit dict
+(hit["text"], hit.get("meta"), keys) so callers and the prompt builder
+are unchanged, and to_dict() produces the exact JSON shape the API
+returns.
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_KEYS = ("rank", "text", "meta", "score", "distance")
+
+
+class Hit:
+    __slots__ = ("rank", "score", "distance", "_reader", "_doc_id", "_text", "_meta")
+
+    def __init__(self, rank: int, score: float, distance: float, reader, doc_id: int):
+        self.rank = rank
+        self.score = score
+        self.distance = distance
+        self._reader = reader
+        self._doc_id = doc_id
+        self._text: Optional[str] = None
+        self._meta: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, hit: Dict[str, Any]) -> "Hit":
+        """Hit already read out (e.g. returned by a shard worker process)."""
+        out = cls(hit["rank"], hit["score"], hit["distance"], None, -1)
+        out._text = hit["text"]
+        out._meta = hit["meta"]
+        return out
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._reader.document(self._doc_id)
+        return self._text
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        if self._meta is None:
+            self._meta = self._reader.metadata(self._doc_id)
+        return self._meta
+
+    # ----------------- dict compatibility -----------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _KEYS else default
+
+    def keys(self) -> Iterator[str]:
+        return iter(_KEYS)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_KEYS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _KEYS
+
+    def to_dict(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """The hit as a plain dict, restricted to `keys` when given."""
+        if keys is None:
+            return {key: getattr(self, key) for key in _KEYS}
+        return {key: self[key] for key in keys}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Hit):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # mutable-dict semantics, like the dicts it replaces
+
+    def __repr__(self) -> str:
+        return f"Hit(rank={self.rank}, score={self.score:.4f}, meta={self.meta!r})"
@@ -0,0 +1,95 @@
+"""
+Ingestion manifest: which source files are in the index, as of which content.
+
+TFIDF_STORE_DIR/ingest_manifest.json maps each resolved source path to the
+file's size, mtime and sha256 as read, and the chunks committed for it:
+
+    {"/policies/credit.pdf": {"size": 81234, "mtime_ns": ..., "sha256": "...", "chunks": 12}}
+
+Index commits are atomic per batch of sources (upsert_sources), so a
+source is either fully in the index or not at all; its entry is written
+right after the commit holding it. scripts/ingest.py skips sources whose
+file is unchanged (same size and mtime, or same sha256 after a touch),
+which also makes an interrupted folder ingest resume after its last
+committed batch. The manifest lives inside the store, so rebuilding the
+store from scratch forgets it too.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from . import segments
+from .config import TFIDF_STORE_DIR
+
+MANIFEST_NAME = "ingest_manifest.json"
+
+Signature = Dict[str, Any]  # {"size", "mtime_ns", "sha256"}
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_signature(path: str) -> Signature:
+    """Size, mtime and sha256 of a file; take it before parsing the file."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+class IngestManifest:
+    def __init__(self, store_dir: Optional[Path] = None, skip_unchanged: bool = True):
+        # skip_unchanged=False still records sources but re-reads all of them
+        self.skip_unchanged = skip_unchanged
+        self.store_dir = Path(store_dir or TFIDF_STORE_DIR)
+        try:
+            self._entries: Dict[str, Dict[str, Any]] = json.loads(
+                (self.store_dir / MANIFEST_NAME).read_text()
+            )
+        except FileNotFoundError:
+            self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(source)
+
+    def unchanged(self, source: str) -> bool:
+        """True when `source` is in the index as of the file's current content."""
+        entry = self._entries.get(source)
+        if not self.skip_unchanged or entry is None:
+            return False
+        st = os.stat(source)
+        if st.st_size != entry["size"]:
+            return False
+        if st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        # Touched: compare content, and remember the new mtime if equal
+        if file_sha256(source) != entry["sha256"]:
+            return False
+        entry["mtime_ns"] = st.st_mtime_ns
+        self._save()
+        return True
+
+    def record(self, signatures: Dict[str, Signature], chunks: Dict[str, int]) -> None:
+        """Mark sources as committed to the index, with the signatures taken when read."""
+        if not signatures:
+            return
+        for source, signature in signatures.items():
+            self._entries[source] = dict(signature, chunks=chunks.get(source, 0))
+        self._save()
+
+    def forget(self, sources: Iterable[str]) -> None:
+        removed = [s for s in sources if self._entries.pop(s, None) is not None]
+        if removed:
+            self._save()
+
+    def _save(self) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        segments.commit_manifest(self.store_dir, self._entries, name=MANIFEST_NAME)
@@ -0,0 +1,60 @@
+"""
+Folder ingestion: parse files in a worker pool, write from one process.
+
+Parsing (PDF page extraction, .msg decoding) is CPU-bound and independent
+per file, so it runs in a ProcessPoolExecutor (or a ThreadPoolExecutor,
+see config.MSG_INGEST_EXECUTOR); the index itself has a
+single writer, the calling process, which consumes the parsed files in
+completion order and commits them in batches (upsert_sources). At most
+`max_inflight` files are submitted ahead of the writer, so memory stays
+bounded however many files a folder holds. Worker functions must be
+module-level (picklable) and must not touch the index.
+"""
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+import os
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def find_files(root: str, suffix: str) -> List[Path]:
+    """Files under `root` (recursively) ending in `suffix`, any case, sorted."""
+    suffix = suffix.lower()
+    return sorted(
+        p.resolve() for p in Path(root).rglob("*") if p.suffix.lower() == suffix and p.is_file()
+    )
+
+
+def pool_map(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: Optional[int] = None,
+    max_inflight: Optional[int] = None,
+    executor: Callable[..., Executor] = ProcessPoolExecutor,
+) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Yield (item, fn(item), None) for every item in completion order, or
+    (item, None, error) when fn raised. workers: pool size (None = one per
+    CPU); max_inflight: submitted but not yet yielded items (default twice
+    the pool size).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+    items = iter(items)
+    pool = executor(max_workers=workers)
+    pending = {}
+    try:
+        while True:
+            for item in items:
+                pending[pool.submit(fn, item)] = item
+                if len(pending) >= max_inflight:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error is not None else future.result()), error
+    finally:
+        # Also reached when the writer stops early: drop the queued work
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,70 +1,169 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 import extract_msg
 
-from .tfidf_index import index
+from .config import INGEST_COMMIT_DOCS, INGEST_WORKERS, MSG_INGEST_EXECUTOR
+from .fields import compose
+from .ingest_manifest import IngestManifest, Signature, file_signature
+from .ingest_pool import find_files, pool_map
 
+_EXECUTORS = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
 
-def _parse_msg(path: Path):
-    msg = extract_msg.Message(str(path))
 
-    subject = msg.subject or ""
-    sender = msg.sender or ""
-    to = msg.to or ""
-    cc = msg.cc or ""
-    sent_at = msg.date or ""
-    body = msg.body or ""
+def _parse_msg(path: str) -> Tuple[Signature, Dict[str, Any]]:
+    # Pool worker: the signature is taken before the message is read, so a
+    # file changed meanwhile is seen as changed on the next run
+    signature = file_signature(path)
+    msg = extract_msg.Message(path)
+    try:
+        subject = msg.subject or ""
+        sender = msg.sender or ""
+        to = msg.to or ""
+        cc = msg.cc or ""
+        sent_at = msg.date or ""
+        body = msg.body or ""
+    finally:
+        # Message keeps the OLE file open until closed
+        msg.close()
 
-    return {
-        "id": str(path),
+    return signature, {
+        "id": path,
         "subject": subject,
         "from": sender,
         "to": [a.strip() for a in to.split(";") if a.strip()],
         "cc": [a.strip() for a in cc.split(";") if a.strip()],
         "sent_at": sent_at,
         "body": body,
-        "file_path": str(path),
+        "file_path": path,
     }
 
 
-def ingest_msg(path: str) -> int:
+def _email_doc(e: Dict[str, Any]):
+    """(text, metadata, field spans) of a parsed email, or None when it has no text."""
+    # Same text as before; the spans let BM25F weight the subject and
+    # the participants apart from the body (config.BM25F_FIELDS)
+    text, spans = compose([
+        (None, "Subject: "), ("subject", e["subject"]),
+        (None, "\nFrom: "), ("participants", e["from"]),
+        (None, "\nTo: "), ("participants", ", ".join(e["to"])),
+        (None, "\nCC: "), ("participants", ", ".join(e["cc"])),
+        (None, f"\nDate: {e['sent_at']}\n\n"),
+        ("body", e["body"] or ""),
+    ])
+    if not text.strip():
+        return None
+
+    meta = {
+        "source_type": "email",
+        "source": e["file_path"],
+        "subject": e["subject"],
+        "from": e["from"],
+        "sent_at": e["sent_at"],
+    }
+    return text, meta, spans
+
+
+def ingest_msg_dir(
+    root: str,
+    workers: Optional[int] = INGEST_WORKERS,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+    manifest: Optional[IngestManifest] = None,
+    executor: str = MSG_INGEST_EXECUTOR,
+) -> Tuple[int, int, int]:
+    """
+    Ingest every .msg file under `root` (recursively). Messages are parsed
+    in a pool of `workers` processes or threads (executor "process" or
+    "thread", see ingest_pool.py) and written by this process in commits
+    of about INGEST_COMMIT_DOCS emails; each file replaces its previous
+    copy. A file that fails to parse is passed to on_error(path, error)
+    and skipped, or raises when on_error is None. With a manifest, files
+    unchanged since their last ingest are skipped without being opened,
+    and each commit is recorded in it. Returns (files ingested, email
+    chunks, unchanged files skipped).
+    """
+    # Imported here rather than at module level so pool workers running
+    # _parse_msg never load the index
+    from .tfidf_index import get_index
+    index = get_index()
+
+    files = 0
+    chunks = 0
+    sources: Dict[str, Signature] = {}
+    counts: Dict[str, int] = {}
+    texts: List[str] = []
+    metas: List[Dict[str, Any]] = []
+    fields: List[Any] = []
+
+    def commit():
+        # Sources without text are still listed, so their previous copy goes
+        index.upsert_sources(list(sources), texts, metas, fields)
+        if manifest is not None:
+            manifest.record(sources, counts)
+        sources.clear()
+        counts.clear()
+        texts.clear()
+        metas.clear()
+        fields.clear()
+
+    paths = [str(p) for p in find_files(root, ".msg")]
+    skipped = 0
+    if manifest is not None:
+        todo = [p for p in paths if not manifest.unchanged(p)]
+        skipped = len(paths) - len(todo)
+        paths = todo
+    for path, result, error in pool_map(_parse_msg, paths, workers, executor=_EXECUTORS[executor]):
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(path, error)
+            continue
+        signature, email = result
+        doc = _email_doc(email)
+        sources[path] = signature
+        counts[path] = 0 if doc is None else 1
+        files += 1
+        if doc is not None:
+            text, meta, spans = doc
+            texts.append(text)
+            metas.append(meta)
+            fields.append(spans)
+            chunks += 1
+        if len(sources) >= INGEST_COMMIT_DOCS:
+            commit()
+    if sources:
+        commit()
+
+    return files, chunks, skipped
+
+
+def ingest_msg(path: str, manifest: Optional[IngestManifest] = None) -> int:
+    """
+    Ingest a .msg file, or every .msg file under a folder (ingest_msg_dir
+    with the default pool). With a manifest, files unchanged since their
+    last ingest are skipped.
+    """
     p = Path(path).resolve()
 
-    emails = []
-    if p.is_file() and p.suffix.lower() == ".msg":
-        emails.append(_parse_msg(p))
-    elif p.is_dir():
-        for f in sorted(p.glob("*.msg")):
-            emails.append(_parse_msg(f))
-    else:
+    if p.is_dir():
+        return ingest_msg_dir(str(p), manifest=manifest)[1]
+    if not (p.is_file() and p.suffix.lower() == ".msg"):
         raise ValueError(f"{path} is neither a .msg file nor a folder of .msg files")
 
-    texts = []
-    metas = []
-
-    for e in emails:
-        header = (
-            f"Subject: {e['subject']}\n"
-            f"From: {e['from']}\n"
-            f"To: {', '.join(e['to'])}\n"
-            f"CC: {', '.join(e['cc'])}\n"
-            f"Date: {e['sent_at']}\n\n"
-        )
-        text = header + (e["body"] or "")
-        if not text.strip():
-            continue
+    from .tfidf_index import get_index
+    index = get_index()
+
+    source = str(p)
+    if manifest is not None and manifest.unchanged(source):
+        return 0
+    signature, email = _parse_msg(source)
+    doc = _email_doc(email)
+    texts, metas, fields = ([doc[0]], [doc[1]], [doc[2]]) if doc is not None else ([], [], [])
 
-        texts.append(text)
-        metas.append(
-            {
-                "source_type": "email",
-                "source": e["file_path"],
-                "subject": e["subject"],
-                "from": e["from"],
-                "sent_at": e["sent_at"],
-            }
-        )
-
-    if texts:
-        index.add_documents(texts, metas)
+    # Re-ingesting an email replaces its previous copy
+    index.upsert_sources([source], texts, metas, fields)
+    if manifest is not None:
+        manifest.record({source: signature}, {source: len(texts)})
 
     return len(texts)
@@ -1,34 +1,127 @@
 from pathlib import Path
 import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 
-from .tfidf_index import index
+from .config import INGEST_COMMIT_DOCS, INGEST_WORKERS
+from .ingest_manifest import IngestManifest, Signature, file_signature
+from .ingest_pool import find_files, pool_map
 
 
-def ingest_pdf(pdf_path: str) -> int:
+def extract_pdf(pdf_path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Page texts and metadatas of a PDF (one chunk per non-empty page)."""
     pdf_path = str(Path(pdf_path).resolve())
-    doc = fitz.open(pdf_path)
-
     texts = []
     metas = []
 
-    for i, page in enumerate(doc):
-        raw = page.get_text("text") or ""
-        text = re.sub(r"\s+", " ", raw).strip()
-        if not text:
-            continue
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            raw = page.get_text("text") or ""
+            text = re.sub(r"\s+", " ", raw).strip()
+            if not text:
+                continue
+
+            texts.append(text)
+            metas.append(
+                {
+                    "source_type": "pdf",
+                    "source": pdf_path,
+                    "page": i + 1,
+                }
+            )
+
+    return texts, metas
+
+
+def _read_pdf(pdf_path: str) -> Tuple[Signature, List[str], List[Dict[str, Any]]]:
+    # Pool worker: the signature is taken before the pages are read, so a
+    # file changed meanwhile is seen as changed on the next run
+    signature = file_signature(pdf_path)
+    texts, metas = extract_pdf(pdf_path)
+    return signature, texts, metas
+
+
+def ingest_pdf(pdf_path: str, manifest: Optional[IngestManifest] = None) -> int:
+    """
+    Ingest one PDF, replacing its previous pages. With a manifest, a PDF
+    unchanged since its last ingest is skipped (returns 0).
+    """
+    # Imported here rather than at module level so pool workers running
+    # extract_pdf never load the index
+    from .tfidf_index import get_index
+    index = get_index()
 
-        texts.append(text)
-        metas.append(
-            {
-                "source_type": "pdf",
-                "source": pdf_path,
-                "page": i + 1,
-            }
-        )
+    pdf_path = str(Path(pdf_path).resolve())
+    if manifest is not None and manifest.unchanged(pdf_path):
+        return 0
+    signature, texts, metas = _read_pdf(pdf_path)
 
-    if texts:
-        index.add_documents(texts, metas)
+    # Re-ingesting a revised PDF replaces its previous pages
+    index.upsert_source(pdf_path, texts, metas)
+    if manifest is not None:
+        manifest.record({pdf_path: signature}, {pdf_path: len(texts)})
 
     return len(texts)
+
+
+def ingest_pdf_dir(
+    root: str,
+    workers: Optional[int] = INGEST_WORKERS,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+    manifest: Optional[IngestManifest] = None,
+) -> Tuple[int, int, int]:
+    """
+    Ingest every PDF under `root` (recursively). Pages are extracted in a
+    process pool (ingest_pool.py) and written by this process in commits
+    of about INGEST_COMMIT_DOCS pages; each PDF replaces its previous
+    pages. A PDF that fails to parse is passed to on_error(path, error)
+    and skipped, or raises when on_error is None. With a manifest, PDFs
+    unchanged since their last ingest are skipped without being opened,
+    and each commit is recorded in it. Returns (PDFs ingested, chunks,
+    unchanged PDFs skipped).
+    """
+    from .tfidf_index import get_index
+    index = get_index()
+
+    files = 0
+    chunks = 0
+    sources: Dict[str, Signature] = {}
+    counts: Dict[str, int] = {}
+    texts: List[str] = []
+    metas: List[Dict[str, Any]] = []
+
+    def commit():
+        index.upsert_sources(list(sources), texts, metas)
+        if manifest is not None:
+            manifest.record(sources, counts)
+        sources.clear()
+        counts.clear()
+        texts.clear()
+        metas.clear()
+
+    paths = [str(p) for p in find_files(root, ".pdf")]
+    skipped = 0
+    if manifest is not None:
+        todo = [p for p in paths if not manifest.unchanged(p)]
+        skipped = len(paths) - len(todo)
+        paths = todo
+    for path, result, error in pool_map(_read_pdf, paths, workers):
+        if error is not None:
+            if on_error is None:
+                raise error
+            on_error(path, error)
+            continue
+        signature, page_texts, page_metas = result
+        sources[path] = signature
+        counts[path] = len(page_texts)
+        texts.extend(page_texts)
+        metas.extend(page_metas)
+        files += 1
+        chunks += len(page_texts)
+        if len(texts) >= INGEST_COMMIT_DOCS:
+            commit()
+    if sources:
+        commit()
+
+    return files, chunks, skipped
@@ -1,5 +1,65 @@
-from .tfidf_index import index
+from typing import Any, Dict, Optional
+import time
 
+from .config import INDEX_REFRESH_SECONDS, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS
+from .result_cache import ResultCache, cache_key, hits_size
+from .tfidf_index import get_index
 
-def search(query: str, kind: str = "all", k: int = 5):
-    return index.search(query, kind=kind, k=k)
+_last_refresh = 0.0
+_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+
+
+def _refresh_index() -> None:
+    """Swap in generations committed by other processes (throttled)."""
+    global _last_refresh
+    now = time.monotonic()
+    if now - _last_refresh >= INDEX_REFRESH_SECONDS:
+        _last_refresh = now
+        get_index().refresh()
+
+
+def search(
+    query: str,
+    kind: str = "all",
+    k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    scoring: Optional[str] = None,
+):
+    """
+    filters: optional metadata filter, e.g.
+      {"source": "/docs/policy.pdf", "page": {"gte": 3, "lte": 10}}
+      {"from": "Jane Doe"}
+    (see filters.py). Only matching docs are scored.
+    scoring: "bm25" | "bm25_noidf" to override config.BM25_SCORING (A/B runs).
+    Results are cached per index generation (see result_cache.py).
+    """
+    _refresh_index()
+    index = get_index()
+    if not RESULT_CACHE_MAX_BYTES:
+        return index.search(query, kind=kind, k=k, filters=filters, scoring=scoring)
+
+    key = cache_key(query, kind=kind, k=k, filters=filters, scoring=scoring)
+    # Read before searching: a commit in between only makes the entry
+    # newer than its tag, and the next lookup drops it
+    generation = index.generation
+    hits = _cache.get(key, generation)
+    if hits is None:
+        hits = index.search(query, kind=kind, k=k, filters=filters, scoring=scoring)
+        _cache.put(key, generation, hits, hits_size(hits))
+    return list(hits)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Result cache counters (hits, misses, evictions, ...) and size."""
+    return _cache.stats()
+
+
+def search_many(
+    queries,
+    kind: str = "all",
+    k: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    scoring: Optional[str] = None,
+):
+    _refresh_index()
+    return get_index().search_many(list(queries), kind=kind, k=k, filters=filters, scoring=scoring)
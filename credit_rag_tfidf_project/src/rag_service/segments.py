@@ -0,0 +1,683 @@
+"""
+Append-only, memory-mapped segment store for the BM25 index.
+
+Layout under the store directory:
+  - manifest.json     : committed generation + ordered list of live segments
+  - seg_000001/ ...   : one immutable directory per ingest batch (or merge)
+
+Each segment is a set of flat .npy arrays opened with numpy.memmap, so
+opening an index costs a few page-table entries instead of unpickling the
+corpus, and several worker processes share the pages through the OS page
+cache:
+  - term_ids.npy                         : sorted global term ids (vocabulary.py)
+  - postings_offsets.npy                 : per-term slice into the postings
+                                           (counted in postings)
+  - postings_docs_vb.npy / postings_tfs_vb.npy (+ _offsets: per-term byte slice)
+                                         : segment-local doc ids (delta-encoded
+                                           within each term) and tfs, as
+                                           LEB128 varints
+  - term_max_tf.npy / term_min_len.npy   : per-term max tf and min doc length,
+                                           enough to upper-bound a term's BM25
+                                           contribution (WAND pruning)
+  - doc_lengths.npy                      : token count per doc
+  - docstore.npy / docstore_blocks.npy   : doc store: utf-8 text in zlib blocks
+                                           of ~DOCSTORE_BLOCK_BYTES; the block
+                                           table holds (byte offset, first doc)
+  - doc_offsets.npy                      : per-doc offsets in the uncompressed text
+  - meta_fields.json + meta_<i>*.npy     : columnar metadata, one column per
+                                           field, strings dictionary-encoded
+                                           (columns.py)
+  - positions.npy / positions_offsets.npy (optional, BM25_POSITIONS)
+                                         : token positions per posting,
+                                           delta-encoded in the smallest
+                                           unsigned dtype that fits
+  - postings_ftfs.npy / term_max_ftf.npy / field_spans.npy + _offsets
+    (optional, docs indexed with fields) : BM25F pseudo-frequency per posting
+                                           (field weights and length
+                                           normalisation applied), its max per
+                                           term over fielded docs, and each
+                                           doc's field spans as JSON ("" = doc
+                                           without fields; fields.py)
+  - deletes_<generation>.npy (optional)  : tombstone bitmap (np.packbits, one
+                                           bit per doc), written next to the
+                                           segment when docs are deleted and
+                                           named by the manifest entry
+
+A segment is written completely before the manifest that references it is
+replaced (write to a temp file + os.replace), so a crash mid-ingest leaves
+the previous commit readable. Directories not listed in the manifest are
+leftovers of an interrupted write and are ignored.
+
+Segments written with compress=False keep plain int32 postings
+(postings_docs.npy / postings_tfs.npy) and uncompressed text (docs.npy);
+readers accept both layouts. Segments written before metadata columns
+hold one JSON object per doc (metas.npy / meta_offsets.npy) plus a
+source_type partition code (source_type_codes.npy + source_types.json)
+and are still read as they are.
+
+Single writer assumed: run one ingest process at a time.
+"""
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from functools import lru_cache
+from pathlib import Path
+import copy
+import json
+import os
+import pickle
+import shutil
+import zlib
+
+import numpy as np
+
+from . import columns
+
+MANIFEST_NAME = "manifest.json"
+
+# Written into the manifest; stores without it hold pickle segments,
+# "mmap-v1" segments keyed postings by term string. "mmap-v2" segments
+# (uncompressed) are read as they are.
+SEGMENT_FORMAT = "mmap-v3"
+READABLE_FORMATS = ("mmap-v2", "mmap-v3")
+
+# Uncompressed text per doc-store block; a hit decompresses one block
+DOCSTORE_BLOCK_BYTES = 16 * 1024
+# Decompressed blocks kept per segment reader
+DOCSTORE_CACHE_BLOCKS = 8
+
+# (term ids, per-term offsets, doc ids, tfs): postings sorted by term id,
+# then by segment-local doc id
+Postings = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+# (per-posting offsets, position deltas): positions of posting p are
+# cumsum(deltas[offsets[p]:offsets[p + 1]])
+Positions = Tuple[np.ndarray, np.ndarray]
+
+# (field spans per doc, None for docs without fields; BM25F pseudo-frequency
+# per posting, in postings order): see fields.py
+FieldData = Tuple[List[Optional[List[Tuple[str, int, int]]]], np.ndarray]
+
+
+def segment_name(number: int) -> str:
+    return f"seg_{number:06d}"
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_array(path: Path, arr: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def open_array(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Older NumPy cannot memory-map a zero-length array
+        return np.load(path)
+
+
+def pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate utf-8 encoded strings into one byte array + offsets."""
+    return pack_bytes([v.encode("utf-8") for v in values])
+
+
+def pack_bytes(encoded: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate byte strings into one byte array + offsets."""
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+def encode_varints(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    LEB128-encode non-negative ints (7 bits per byte, high bit = more
+    bytes follow). Returns (bytes, per-value byte offsets).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        n_bytes += values >= (np.uint64(1) << np.uint64(shift))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(n_bytes, out=offsets[1:])
+    out = np.empty(int(offsets[-1]), dtype=np.uint8)
+    for i in range(int(n_bytes.max()) if len(values) else 0):
+        sel = n_bytes > i
+        byte = (values[sel] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        more = (n_bytes[sel] > i + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[:-1][sel] + i] = byte | more
+    return out, offsets
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Inverse of encode_varints for a whole byte run (vectorized)."""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    if data.max() < 0x80:
+        # Every value fits one byte (tfs, dense doc-id deltas)
+        return data.astype(np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.r_[0, ends[:-1] + 1]
+    # Index of every byte within its value -> shift of its 7 payload bits
+    shift = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.int64) << (7 * shift)
+    return np.add.reduceat(parts, starts)
+
+
+def _group_deltas(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Deltas within each offsets-delimited group; each group's first value stays absolute."""
+    values = np.asarray(values, dtype=np.int64)
+    deltas = np.diff(values, prepend=0)
+    starts = offsets[:-1][np.diff(offsets) > 0]
+    deltas[starts] = values[starts]
+    return deltas
+
+
+def _group_prefix_sums(deltas: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Inverse of _group_deltas: running sums restarting at every group."""
+    totals = np.cumsum(deltas, dtype=np.int64)
+    # Subtract the running total reached before each group's first delta
+    before = np.r_[0, totals][offsets[:-1]]
+    return totals - np.repeat(before, np.diff(offsets))
+
+
+def build_postings(
+    term_col: np.ndarray, doc_col: np.ndarray, tf_col: Optional[np.ndarray] = None
+) -> Postings:
+    """
+    Group (term id, doc id) rows into postings. Without `tf_col` every row
+    is one token occurrence and tf is the number of repeated pairs; with it
+    the rows must be unique pairs carrying their tf (merging segments).
+    """
+    key = (np.asarray(term_col, dtype=np.int64) << 32) | np.asarray(doc_col, dtype=np.int64)
+    if tf_col is None:
+        keys, tfs = np.unique(key, return_counts=True)
+    else:
+        order = np.argsort(key, kind="stable")
+        keys, tfs = key[order], np.asarray(tf_col)[order]
+    term_ids, starts = np.unique(keys >> 32, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+    return (
+        term_ids.astype(np.int32),
+        offsets,
+        (keys & 0xFFFFFFFF).astype(np.int32),
+        tfs.astype(np.int32),
+    )
+
+
+def posting_sums(term_col: np.ndarray, doc_col: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Sum of `values` over the rows of each (term id, doc id) pair, in the
+    postings order of build_postings (for unique pairs: `values` reordered).
+    """
+    key = (np.asarray(term_col, dtype=np.int64) << 32) | np.asarray(doc_col, dtype=np.int64)
+    _, inverse = np.unique(key, return_inverse=True)
+    return np.bincount(inverse.ravel(), weights=values).astype(np.float32)
+
+
+def build_positions(term_col: np.ndarray, doc_col: np.ndarray, pos_col: np.ndarray) -> Positions:
+    """
+    Positional counterpart of build_postings for the same occurrence rows
+    (ascending positions within each (term, doc) pair): positions grouped
+    in postings order and delta-encoded within each posting.
+    """
+    key = (np.asarray(term_col, dtype=np.int64) << 32) | np.asarray(doc_col, dtype=np.int64)
+    order = np.argsort(key, kind="stable")
+    key, positions = key[order], np.asarray(pos_col, dtype=np.int64)[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.zeros(0, dtype=np.int64)
+    deltas = np.diff(positions, prepend=0)
+    deltas[starts] = positions[starts]
+    dtype = np.min_scalar_type(int(deltas.max())) if len(deltas) else np.uint8
+    return np.append(starts, len(key)).astype(np.int64), deltas.astype(dtype)
+
+
+def decode_positions(positions: Positions) -> np.ndarray:
+    """Absolute positions of every occurrence, in postings order."""
+    offsets, deltas = positions
+    return _group_prefix_sums(deltas, offsets)
+
+
+# ----------------- manifest -----------------
+
+def read_manifest(store_dir: Path, name: str = MANIFEST_NAME) -> Optional[Dict[str, Any]]:
+    path = store_dir / name
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def commit_manifest(store_dir: Path, manifest: Dict[str, Any], name: str = MANIFEST_NAME) -> None:
+    """
+    Atomically replace the manifest: readers see either the old or the new
+    commit, never a partial one. `name` picks another JSON file committed
+    the same way (the shard layout, see sharded_index.py).
+    """
+    path = store_dir / name
+    tmp = path.with_name(path.name + ".tmp")
+    _fsync_write(tmp, json.dumps(manifest, indent=2).encode("utf-8"))
+    os.replace(tmp, path)
+
+
+# ----------------- writing -----------------
+
+def write_segment(
+    store_dir: Path,
+    name: str,
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    doc_lengths: Sequence[int],
+    postings: Postings,
+    positions: Optional[Positions] = None,
+    compress: bool = True,
+    fields: Optional[FieldData] = None,
+) -> Dict[str, Any]:
+    """
+    Write one immutable segment and return its manifest entry.
+    Postings use global term ids and segment-local doc ids (0..n_docs-1).
+    compress: varint postings + zlib doc store (False: plain arrays).
+    fields: BM25F data when some docs were indexed with fields.
+    """
+    final_dir = store_dir / name
+    tmp_dir = store_dir / (name + ".tmp")
+    for d in (tmp_dir, final_dir):
+        if d.exists():
+            # Leftover of an interrupted write that never got committed
+            shutil.rmtree(d)
+    tmp_dir.mkdir()
+
+    term_ids, postings_offsets, postings_docs, postings_tfs = postings
+    lengths = np.asarray(doc_lengths, dtype=np.int32)
+
+    # Per-term upper-bound ingredients: BM25 term weight grows with tf and
+    # shrinks with doc length, so w(max tf, min length) bounds every posting
+    # whatever avgdl turns out to be at query time.
+    if len(term_ids):
+        starts = postings_offsets[:-1]
+        term_max_tf = np.maximum.reduceat(postings_tfs, starts).astype(np.int32)
+        term_min_len = np.minimum.reduceat(lengths[postings_docs], starts).astype(np.int32)
+    else:
+        term_max_tf = np.zeros(0, dtype=np.int32)
+        term_min_len = np.zeros(0, dtype=np.int32)
+
+    doc_bytes, doc_offsets = pack_strings(documents)
+
+    arrays = {
+        "term_ids": term_ids,
+        "postings_offsets": postings_offsets,
+        "term_max_tf": term_max_tf,
+        "term_min_len": term_min_len,
+        "doc_lengths": lengths,
+        "doc_offsets": doc_offsets,
+    }
+    # source_type, source, page, ... become columns, so filters (and kind
+    # partitions) compare codes instead of decoding a dict per doc
+    arrays.update(columns.write_columns(tmp_dir, metadatas))
+    if compress:
+        docs_vb, docs_vb_offsets = encode_varints(_group_deltas(postings_docs, postings_offsets))
+        tfs_vb, tfs_vb_offsets = encode_varints(postings_tfs)
+        arrays["postings_docs_vb"] = docs_vb
+        arrays["postings_docs_vb_offsets"] = docs_vb_offsets[postings_offsets]
+        arrays["postings_tfs_vb"] = tfs_vb
+        arrays["postings_tfs_vb_offsets"] = tfs_vb_offsets[postings_offsets]
+        arrays["docstore"], arrays["docstore_blocks"] = _compress_docs(doc_bytes, doc_offsets)
+    else:
+        arrays["postings_docs"] = postings_docs
+        arrays["postings_tfs"] = postings_tfs
+        arrays["docs"] = doc_bytes
+    if positions is not None:
+        arrays["positions_offsets"], arrays["positions"] = positions
+    if fields is not None:
+        spans, ftfs = fields
+        ftfs = np.asarray(ftfs, dtype=np.float32)
+        fielded = np.asarray([s is not None for s in spans], dtype=bool)
+        arrays["postings_ftfs"] = ftfs
+        # Bound of the BM25F part of a term's weight (saturation grows with
+        # the pseudo-frequency); plain docs keep the tf / length bound
+        if len(term_ids):
+            arrays["term_max_ftf"] = np.maximum.reduceat(
+                np.where(fielded[postings_docs], ftfs, 0.0).astype(np.float32), postings_offsets[:-1]
+            )
+        else:
+            arrays["term_max_ftf"] = np.zeros(0, dtype=np.float32)
+        arrays["field_spans"], arrays["field_spans_offsets"] = pack_strings(
+            ["" if s is None else json.dumps([list(span) for span in s]) for s in spans]
+        )
+    for key, arr in arrays.items():
+        save_array(tmp_dir / f"{key}.npy", arr)
+
+    os.replace(tmp_dir, final_dir)
+    return {"name": name, "n_docs": len(documents), "total_len": int(lengths.sum())}
+
+
+def _compress_docs(doc_bytes: np.ndarray, doc_offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cut the concatenated text into blocks of whole docs, a new block starting
+    at the first doc past each DOCSTORE_BLOCK_BYTES boundary, and zlib each.
+    Returns (compressed bytes, block table rows (byte offset, first doc)).
+    """
+    n_docs = len(doc_offsets) - 1
+    window = doc_offsets[:-1] // DOCSTORE_BLOCK_BYTES
+    first_docs = np.flatnonzero(np.r_[True, window[1:] != window[:-1]]) if n_docs else np.zeros(0, dtype=np.int64)
+    bounds = np.append(first_docs, n_docs)
+    data, byte_offsets = pack_bytes([
+        zlib.compress(doc_bytes[doc_offsets[a]:doc_offsets[b]].tobytes())
+        for a, b in zip(bounds[:-1], bounds[1:])
+    ])
+    return data, np.stack([byte_offsets, bounds]).T.astype(np.int64)
+
+
+def remove_segment(store_dir: Path, name: str) -> None:
+    shutil.rmtree(store_dir / name, ignore_errors=True)
+
+
+def deletes_name(generation: int) -> str:
+    return f"deletes_{generation:06d}.npy"
+
+
+def write_deletes(store_dir: Path, name: str, generation: int, deleted: np.ndarray) -> str:
+    """
+    Write the tombstone bitmap of segment `name` (boolean array, True =
+    deleted) for the commit of `generation`; returns the file name to put
+    in the manifest entry. Earlier bitmaps stay until that commit lands.
+    """
+    file_name = deletes_name(generation)
+    save_array(store_dir / name / file_name, np.packbits(deleted))
+    return file_name
+
+
+def read_live(store_dir: Path, entry: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Boolean live-doc mask of a manifest entry, None if nothing is deleted."""
+    if not entry.get("deletes"):
+        return None
+    bits = np.load(store_dir / entry["name"] / entry["deletes"])
+    return ~np.unpackbits(bits, count=entry["n_docs"]).astype(bool)
+
+
+# ----------------- reading -----------------
+
+class SegmentReader:
+    """
+    Read-only view of one segment. Nothing is loaded up front: every lookup
+    reads straight from the memory-mapped arrays, except the (small)
+    tombstone bitmap, unpacked into `live` when the entry has one.
+    """
+
+    def __init__(self, store_dir: Path, name: str, entry: Optional[Dict[str, Any]] = None):
+        self.name = name
+        seg_dir = store_dir / name
+
+        self._postings_offsets = open_array(seg_dir / "postings_offsets.npy")
+        self._compressed = (seg_dir / "postings_docs_vb.npy").exists()
+        if self._compressed:
+            self._postings_docs_vb = open_array(seg_dir / "postings_docs_vb.npy")
+            self._postings_docs_vb_offsets = open_array(seg_dir / "postings_docs_vb_offsets.npy")
+            self._postings_tfs_vb = open_array(seg_dir / "postings_tfs_vb.npy")
+            self._postings_tfs_vb_offsets = open_array(seg_dir / "postings_tfs_vb_offsets.npy")
+        else:
+            self._postings_docs = open_array(seg_dir / "postings_docs.npy")
+            self._postings_tfs = open_array(seg_dir / "postings_tfs.npy")
+
+        self._doc_offsets = open_array(seg_dir / "doc_offsets.npy")
+        if (seg_dir / "docstore.npy").exists():
+            self._docs: Optional[np.ndarray] = None
+            self._docstore = open_array(seg_dir / "docstore.npy")
+            self._docstore_blocks = open_array(seg_dir / "docstore_blocks.npy")
+            self._block = lru_cache(maxsize=DOCSTORE_CACHE_BLOCKS)(self._read_block)
+        else:
+            self._docs = open_array(seg_dir / "docs.npy")
+        self.doc_lengths = open_array(seg_dir / "doc_lengths.npy")
+        self.term_ids = open_array(seg_dir / "term_ids.npy")
+
+        self.n_docs = len(self.doc_lengths)
+        if (seg_dir / columns.FIELDS_FILE).exists():
+            self.meta = columns.MetadataColumns(seg_dir, self.n_docs)
+        else:
+            self.meta = columns.JsonRows(open_array(seg_dir / "metas.npy"), open_array(seg_dir / "meta_offsets.npy"))
+        # None = no deleted docs; otherwise True for docs still live
+        self.live = read_live(store_dir, entry) if entry is not None else None
+
+        bounds_path = seg_dir / "term_max_tf.npy"
+        if bounds_path.exists():
+            self._term_max_tf: Optional[np.ndarray] = open_array(bounds_path)
+            self._term_min_len: Optional[np.ndarray] = open_array(seg_dir / "term_min_len.npy")
+        else:
+            # Segment written before bounds existed: derived per term on demand
+            self._term_max_tf = None
+            self._term_min_len = None
+
+        codes_path = seg_dir / "source_type_codes.npy"
+        if codes_path.exists():
+            self._source_type_codes: Optional[np.ndarray] = open_array(codes_path)
+            with open(seg_dir / "source_types.json", "r", encoding="utf-8") as f:
+                self._source_types: List[str] = json.load(f)
+        else:
+            # Segment written before partitions existed, or with metadata
+            # columns (partition() then compares source_type codes)
+            self._source_type_codes = None
+            self._source_types = []
+
+        positions_path = seg_dir / "positions.npy"
+        self.has_positions = positions_path.exists()
+        if self.has_positions:
+            self._positions: Optional[np.ndarray] = open_array(positions_path)
+            self._positions_offsets: Optional[np.ndarray] = open_array(seg_dir / "positions_offsets.npy")
+        else:
+            self._positions = None
+            self._positions_offsets = None
+
+        ftfs_path = seg_dir / "postings_ftfs.npy"
+        self.has_fields = ftfs_path.exists()
+        if self.has_fields:
+            self._postings_ftfs: Optional[np.ndarray] = open_array(ftfs_path)
+            self._term_max_ftf: Optional[np.ndarray] = open_array(seg_dir / "term_max_ftf.npy")
+            spans_offsets = open_array(seg_dir / "field_spans_offsets.npy")
+            self._field_spans = columns._StringTable(open_array(seg_dir / "field_spans.npy"), spans_offsets)
+            # True for docs scored with BM25F
+            self.fielded: Optional[np.ndarray] = np.diff(spans_offsets) > 0
+        else:
+            self._postings_ftfs = None
+            self._term_max_ftf = None
+            self.fielded = None
+
+        # Per-segment caches; segments are immutable so they never go stale
+        self._partitions: Dict[str, np.ndarray] = {}
+
+    def with_live(self, live: Optional[np.ndarray]) -> "SegmentReader":
+        """Same segment under a new live mask; shares the mapped arrays and caches."""
+        reader = copy.copy(self)
+        reader.live = live
+        return reader
+
+    def slots(self, term_ids: Sequence[int]) -> np.ndarray:
+        """
+        Position of each global term id in this segment's term table, -1 for
+        terms the segment does not contain (one vectorized binary search).
+        """
+        ids = np.asarray(term_ids, dtype=np.int64)
+        if not len(self.term_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self.term_ids, ids)
+        pos = np.minimum(pos, len(self.term_ids) - 1)
+        return np.where(self.term_ids[pos] == ids, pos, -1)
+
+    def postings_at(self, slot: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._compressed:
+            # Only this term's bytes are decoded
+            start, end = self._postings_docs_vb_offsets[slot], self._postings_docs_vb_offsets[slot + 1]
+            doc_ids = np.cumsum(decode_varints(self._postings_docs_vb[start:end])).astype(np.int32)
+            start, end = self._postings_tfs_vb_offsets[slot], self._postings_tfs_vb_offsets[slot + 1]
+            tfs = decode_varints(self._postings_tfs_vb[start:end]).astype(np.int32)
+            return doc_ids, tfs
+        start, end = self._postings_offsets[slot], self._postings_offsets[slot + 1]
+        return self._postings_docs[start:end], self._postings_tfs[start:end]
+
+    def _all_postings(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, tfs) of every posting, decoded in one pass when compressed."""
+        if self._compressed:
+            doc_ids = _group_prefix_sums(decode_varints(self._postings_docs_vb), self._postings_offsets)
+            tfs = decode_varints(self._postings_tfs_vb)
+            return doc_ids.astype(np.int32), tfs.astype(np.int32)
+        return self._postings_docs, self._postings_tfs
+
+    def doc_freq(self, slot: int) -> int:
+        """Number of docs in this segment containing the term at `slot`."""
+        return int(self._postings_offsets[slot + 1] - self._postings_offsets[slot])
+
+    def term_bound(self, slot: int) -> Tuple[int, int]:
+        """(max tf, min doc length) over the postings of the term at `slot`."""
+        if self._term_max_tf is not None:
+            return int(self._term_max_tf[slot]), int(self._term_min_len[slot])
+        doc_ids, tfs = self.postings_at(slot)
+        return int(tfs.max()), int(self.doc_lengths[doc_ids].min())
+
+    def ftfs_at(self, slot: int) -> Optional[np.ndarray]:
+        """BM25F pseudo-frequencies of the term at `slot` (None: segment without fields)."""
+        if self._postings_ftfs is None:
+            return None
+        start, end = self._postings_offsets[slot], self._postings_offsets[slot + 1]
+        return self._postings_ftfs[start:end]
+
+    def ftf_bound(self, slot: int) -> float:
+        """Max BM25F pseudo-frequency of the term at `slot` over fielded docs."""
+        return float(self._term_max_ftf[slot]) if self._term_max_ftf is not None else 0.0
+
+    def all_ftfs(self) -> Optional[np.ndarray]:
+        """BM25F pseudo-frequency of every posting, in postings order."""
+        return self._postings_ftfs
+
+    def field_spans(self, doc_id: int) -> Optional[List[Tuple[str, int, int]]]:
+        """Field spans of a doc, None if it was indexed without fields."""
+        if self.fielded is None or not self.fielded[doc_id]:
+            return None
+        return [tuple(span) for span in json.loads(self._field_spans[doc_id])]
+
+    def positions(self, slot: int, i: int) -> np.ndarray:
+        """Token positions of the i-th posting of the term at `slot`."""
+        p = self._postings_offsets[slot] + i
+        start, end = self._positions_offsets[p], self._positions_offsets[p + 1]
+        return np.cumsum(self._positions[start:end], dtype=np.int64)
+
+    def postings_arrays(self) -> Postings:
+        doc_ids, tfs = self._all_postings()
+        return self.term_ids, self._postings_offsets, doc_ids, tfs
+
+    def positions_arrays(self) -> Optional[Positions]:
+        if not self.has_positions:
+            return None
+        return self._positions_offsets, self._positions
+
+    def csc_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The postings laid out term-major are already a CSC (docs x terms)
+        matrix: returns (tfs, doc ids, per-term offsets).
+        """
+        doc_ids, tfs = self._all_postings()
+        return tfs, doc_ids, self._postings_offsets
+
+    def _read_block(self, block: int) -> bytes:
+        start, end = self._docstore_blocks[block, 0], self._docstore_blocks[block + 1, 0]
+        return zlib.decompress(self._docstore[start:end].tobytes())
+
+    def document(self, doc_id: int) -> str:
+        start, end = self._doc_offsets[doc_id], self._doc_offsets[doc_id + 1]
+        if self._docs is not None:
+            return bytes(self._docs[start:end]).decode("utf-8")
+        # Compressed store: decompress (or reuse) the doc's block only
+        block = int(np.searchsorted(self._docstore_blocks[:, 1], doc_id, side="right")) - 1
+        block_start = self._doc_offsets[self._docstore_blocks[block, 1]]
+        return self._block(block)[start - block_start:end - block_start].decode("utf-8")
+
+    def metadata(self, doc_id: int) -> Dict[str, Any]:
+        return self.meta.row(doc_id)
+
+    def partition(self, source_type: str) -> np.ndarray:
+        """Boolean mask of the docs whose source_type is `source_type`."""
+        mask = self._partitions.get(source_type)
+        if mask is None:
+            if self._source_type_codes is not None:
+                if source_type in self._source_types:
+                    mask = np.asarray(self._source_type_codes) == self._source_types.index(source_type)
+                else:
+                    mask = np.zeros(self.n_docs, dtype=bool)
+            else:
+                mask = self.meta.equals_mask("source_type", source_type)
+            self._partitions[source_type] = mask
+        return mask
+
+    def column(self, field: str) -> np.ndarray:
+        """
+        All values of one metadata field as an object array (None where the
+        field is missing), decoded once per segment and cached.
+        """
+        return self.meta.objects(field)
+
+    def numeric_column(self, field: str) -> np.ndarray:
+        """Float view of a metadata field (NaN where missing or not a number)."""
+        return self.meta.numeric(field)
+
+    def equals_mask(self, field: str, value: Any) -> np.ndarray:
+        """Boolean mask of the docs whose `field` equals `value`."""
+        return self.meta.equals_mask(field, value)
+
+    def isin_mask(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        """Boolean mask of the docs whose `field` is one of `values`."""
+        return self.meta.isin_mask(field, values)
+
+
+# ----------------- store conversion -----------------
+
+def read_documents(
+    store_dir: Path, name: str
+) -> Tuple[List[str], List[Dict[str, Any]], List[Optional[List[Tuple[str, int, int]]]]]:
+    """
+    Texts, metadata and field spans (None per doc without fields) of a
+    segment in any earlier on-disk format (pickle or memory-mapped); used
+    to re-index a store into the current format.
+    """
+    seg_dir = store_dir / name
+    if (seg_dir / "documents.pkl").exists():
+        with open(seg_dir / "documents.pkl", "rb") as f:
+            documents = pickle.load(f)
+        with open(seg_dir / "metadatas.pkl", "rb") as f:
+            metadatas = pickle.load(f)
+        return documents, metadatas, [None] * len(documents)
+
+    doc_offsets = open_array(seg_dir / "doc_offsets.npy")
+    if (seg_dir / "docstore.npy").exists():
+        docstore, blocks = open_array(seg_dir / "docstore.npy"), open_array(seg_dir / "docstore_blocks.npy")
+        docs = np.frombuffer(b"".join(
+            zlib.decompress(docstore[blocks[b, 0]:blocks[b + 1, 0]].tobytes())
+            for b in range(len(blocks) - 1)
+        ), dtype=np.uint8)
+    else:
+        docs = open_array(seg_dir / "docs.npy")
+    documents = [
+        bytes(docs[doc_offsets[i]:doc_offsets[i + 1]]).decode("utf-8")
+        for i in range(len(doc_offsets) - 1)
+    ]
+    if (seg_dir / columns.FIELDS_FILE).exists():
+        meta = columns.MetadataColumns(seg_dir, len(documents))
+    else:
+        meta = columns.JsonRows(open_array(seg_dir / "metas.npy"), open_array(seg_dir / "meta_offsets.npy"))
+    metadatas = [meta.row(i) for i in range(len(documents))]
+    if (seg_dir / "field_spans.npy").exists():
+        spans = columns._StringTable(
+            open_array(seg_dir / "field_spans.npy"), open_array(seg_dir / "field_spans_offsets.npy")
+        )
+        fields = [
+            [tuple(span) for span in json.loads(spans[i])] if spans[i] else None
+            for i in range(len(documents))
+        ]
+    else:
+        fields = [None] * len(documents)
+    return documents, metadatas, fields
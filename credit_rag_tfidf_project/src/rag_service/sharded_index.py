@@ -0,0 +1,389 @@
+"""
+Sharded BM25 index: scatter-gather search over N TfidfIndex shards.
+
+Chunks are hash-partitioned by their metadata "source" (CRC32, so the
+partition is the same in every process), which keeps all chunks of a PDF
+or an email in one shard: delete / upsert by source touch that shard only.
+Layout under the store directory:
+  - shards.json           : {"n_shards": N, "dir": "shards_N"}
+  - shards_N/shard_00/ ... : one ordinary TfidfIndex store per shard
+
+A query runs in two steps:
+  1. gather: the calling process sums every shard's live doc count, token
+     count and per-term df (TfidfIndex.term_stats; postings offsets only)
+  2. scatter: every shard runs TfidfIndex.search with those global
+     statistics, each in a worker process, and returns its own top-k
+Each shard thus scores with the N / avgdl / df of the whole corpus, and
+the merged top-k has the scores one unsharded index over the same docs
+would give; ties go to the lower shard, then the shard's own order.
+
+Workers open the shards read-only (memory-mapped, so pages are shared
+through the page cache) and refresh a shard once the calling process has
+committed or loaded a newer generation of it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+import shutil
+import threading
+import zlib
+
+from . import segments
+from .config import TFIDF_STORE_DIR, BM25_SHARDS, BM25_SHARD_WORKERS
+from .filters import parse_filters
+from .hits import Hit
+from .tfidf_index import (
+    SHARD_LAYOUT_NAME,
+    DocFields,
+    Stats,
+    TfidfIndex,
+    _query_terms,
+    convert_store,
+    stored_documents,
+    write_store,
+)
+
+
+def shard_of(source: str, n_shards: int) -> int:
+    """Shard holding the chunks of `source`."""
+    return zlib.crc32(source.encode("utf-8")) % n_shards
+
+
+def _doc_shard(text: str, meta: Dict[str, Any], n_shards: int) -> int:
+    # Chunks without a source are spread by their text
+    source = meta.get("source")
+    return shard_of(text if source is None else str(source), n_shards)
+
+
+class ShardedIndex:
+    """
+    Same interface as TfidfIndex (search, search_many, add / delete /
+    upsert by source, compact) over `n_shards` shard stores.
+    workers: search processes (None = one per shard, 0 = search the shards
+    in the calling process).
+    """
+
+    def __init__(
+        self,
+        store_dir: Optional[Path] = None,
+        n_shards: Optional[int] = None,
+        workers: Optional[int] = None,
+        compress: Optional[bool] = None,
+    ):
+        self._store_dir = Path(store_dir) if store_dir is not None else TFIDF_STORE_DIR
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        self.n_shards = BM25_SHARDS if n_shards is None else n_shards
+        if self.n_shards < 2:
+            raise ValueError("a sharded index needs at least 2 shards")
+
+        # Unsharded store or a different shard count: re-partition first
+        reshard_store(self._store_dir, self.n_shards)
+        self._shard_dirs = _shard_dirs(self._store_dir, self.n_shards)
+        self._shards = [TfidfIndex(d, compress=compress) for d in self._shard_dirs]
+
+        if workers is None:
+            workers = BM25_SHARD_WORKERS
+        self._workers = self.n_shards if workers is None else workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    # ----------------- corpus statistics -----------------
+
+    @property
+    def n_docs(self) -> int:
+        return sum(shard.n_docs for shard in self._shards)
+
+    @property
+    def total_len(self) -> int:
+        return sum(shard.total_len for shard in self._shards)
+
+    @property
+    def avgdl(self) -> float:
+        n_docs = self.n_docs
+        return self.total_len / n_docs if n_docs else 0.0
+
+    def is_empty(self) -> bool:
+        return all(shard.is_empty() for shard in self._shards)
+
+    @property
+    def generation(self) -> int:
+        """Sum of the shard generations: moves whenever any shard commits."""
+        return sum(shard.generation for shard in self._shards)
+
+    def refresh(self) -> bool:
+        """TfidfIndex.refresh for every shard; worker processes follow on their next call."""
+        return any([shard.refresh() for shard in self._shards])
+
+    def term_stats(self, terms: List[str]) -> Stats:
+        """Corpus statistics for `terms` summed over the shards."""
+        n_docs = total_len = 0
+        dfs = dict.fromkeys(terms, 0)
+        for shard in self._shards:
+            shard_docs, shard_len, shard_dfs = shard.term_stats(terms)
+            n_docs += shard_docs
+            total_len += shard_len
+            for term, df in shard_dfs.items():
+                dfs[term] += df
+        return n_docs, total_len, dfs
+
+    # ----------------- public API -----------------
+
+    def add_documents(
+        self, texts: List[str], metadatas: List[Dict[str, Any]], fields: Optional[DocFields] = None
+    ) -> None:
+        """Add a batch of chunks; each shard gets its part as one new segment."""
+        self.upsert_sources([], texts, metadatas, fields)
+
+    def delete_by_source(self, source: str) -> int:
+        return self.upsert_sources([source], [], [])
+
+    def upsert_source(
+        self,
+        source: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        fields: Optional[DocFields] = None,
+    ) -> int:
+        """Replace all docs of `source` in one commit of its shard."""
+        return self.upsert_sources([source], texts, metadatas, fields)
+
+    def upsert_sources(
+        self,
+        sources: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        fields: Optional[DocFields] = None,
+    ) -> int:
+        """
+        upsert_source for a batch of sources. Each shard commits its part
+        atomically; the shards commit one after another.
+        """
+        if len(texts) != len(metadatas):
+            raise ValueError("texts and metadatas must have the same length")
+        if fields is None:
+            fields = [None] * len(texts)
+        elif len(fields) != len(texts):
+            raise ValueError("texts and fields must have the same length")
+        parts: List[Tuple[List[str], List[str], List[Dict[str, Any]], DocFields]] = [
+            ([], [], [], []) for _ in self._shards
+        ]
+        for source in sources:
+            parts[shard_of(source, self.n_shards)][0].append(source)
+        for text, meta, spans in zip(texts, metadatas, fields):
+            part = parts[_doc_shard(text, meta, self.n_shards)]
+            part[1].append(text)
+            part[2].append(meta)
+            part[3].append(spans)
+        return sum(
+            shard.upsert_sources(*part)
+            for shard, part in zip(self._shards, parts)
+            if part[0] or part[1]
+        )
+
+    def compact(self, min_deleted_ratio: float = 0.0) -> int:
+        return sum(shard.compact(min_deleted_ratio) for shard in self._shards)
+
+    def wait_for_merge(self) -> None:
+        for shard in self._shards:
+            shard.wait_for_merge()
+
+    def close(self) -> None:
+        """Stop the worker processes (started again by the next search)."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def search(
+        self,
+        query: str,
+        kind: str = "all",
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        strategy: Optional[str] = None,
+        scoring: Optional[str] = None,
+    ) -> List[Hit]:
+        """TfidfIndex.search over all shards (same arguments and hits)."""
+        parse_filters(filters)  # a bad filter fails here, not in every worker
+        if self.is_empty() or not query.strip():
+            return []
+        kwargs = dict(
+            query=query, kind=kind, k=k, filters=filters, strategy=strategy, scoring=scoring,
+            stats=self.term_stats(_query_terms(query)),
+        )
+        return _merge_hits(self._scatter("search", kwargs), k)
+
+    def search_many(
+        self,
+        queries: List[str],
+        kind: str = "all",
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        scoring: Optional[str] = None,
+    ) -> List[List[Hit]]:
+        """TfidfIndex.search_many over all shards, one batch per shard."""
+        parse_filters(filters)
+        queries = list(queries)
+        if self.is_empty():
+            return [[] for _ in queries]
+        terms = list(dict.fromkeys(t for q in queries for t in _query_terms(q)))
+        kwargs = dict(
+            queries=queries, kind=kind, k=k, filters=filters, scoring=scoring,
+            stats=self.term_stats(terms),
+        )
+        per_shard = self._scatter("search_many", kwargs)
+        return [_merge_hits([hits[i] for hits in per_shard], k) for i in range(len(queries))]
+
+    # ----------------- scatter-gather -----------------
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._workers)
+            return self._pool
+
+    def _scatter(self, method: str, kwargs: Dict[str, Any]) -> List[Any]:
+        """Run `method` on every shard; results in shard order."""
+        if self._workers == 0:
+            return [getattr(shard, method)(**kwargs) for shard in self._shards]
+        pool = self._executor()
+        futures = [
+            pool.submit(_shard_call, str(shard_dir), shard.generation, method, kwargs)
+            for shard_dir, shard in zip(self._shard_dirs, self._shards)
+        ]
+        results = [future.result() for future in futures]
+        if method == "search":
+            return [[Hit.from_dict(h) for h in hits] for hits in results]
+        return [[[Hit.from_dict(h) for h in hits] for hits in per_query] for per_query in results]
+
+
+def _merge_hits(per_shard: List[List[Hit]], k: int) -> List[Hit]:
+    """Global top-k of the per-shard hit lists, re-ranked."""
+    ranked = sorted(
+        ((s, hit) for s, hits in enumerate(per_shard) for hit in hits),
+        key=lambda sh: (-sh[1].score, sh[0], sh[1].rank),
+    )
+    top = [hit for _, hit in ranked[:k]]
+    for rank, hit in enumerate(top, start=1):
+        hit.rank = rank
+    return top
+
+
+# ----------------- worker processes -----------------
+
+# Shards opened by this worker process, by shard directory
+_worker_shards: Dict[str, TfidfIndex] = {}
+
+
+def _shard_call(shard_dir: str, generation: int, method: str, kwargs: Dict[str, Any]):
+    """
+    Worker side of ShardedIndex._scatter: run `method` on the shard, with
+    hits returned as plain dicts (a Hit reads from a segment mapped in
+    this process only).
+    """
+    shard = _worker_shards.get(shard_dir)
+    if shard is None:
+        shard = _worker_shards[shard_dir] = TfidfIndex(Path(shard_dir))
+    elif shard.generation < generation:
+        shard.refresh()
+    result = getattr(shard, method)(**kwargs)
+    if method == "search":
+        return [h.to_dict() for h in result]
+    return [[h.to_dict() for h in hits] for hits in result]
+
+
+# ----------------- store layout -----------------
+
+def _layout_dir(n_shards: int) -> str:
+    return f"shards_{n_shards}"
+
+
+def _shard_dirs(store_dir: Path, n_shards: int) -> List[Path]:
+    return [store_dir / _layout_dir(n_shards) / f"shard_{i:02d}" for i in range(n_shards)]
+
+
+def _store_batches(store_dirs: List[Path]) -> Iterator[Tuple[List[str], List[Dict[str, Any]], DocFields]]:
+    """Live (texts, metadatas, field spans) of every segment of `store_dirs`, in order."""
+    for store_dir in store_dirs:
+        manifest = segments.read_manifest(store_dir)
+        for entry in manifest["segments"] if manifest else []:
+            yield stored_documents(store_dir, entry)
+
+
+def _shard_batches(batches, shard: int, n_shards: int):
+    """The part of each (texts, metadatas, field spans) batch that belongs to `shard`."""
+    for texts, metas, fields in batches:
+        keep = [j for j, (t, m) in enumerate(zip(texts, metas)) if _doc_shard(t, m, n_shards) == shard]
+        yield [texts[j] for j in keep], [metas[j] for j in keep], [fields[j] for j in keep]
+
+
+def _remove_store(store_dir: Path) -> None:
+    """Drop an unsharded store's manifest, segments and vocabulary."""
+    manifest = segments.read_manifest(store_dir)
+    if manifest is None:
+        return
+    (store_dir / segments.MANIFEST_NAME).unlink()
+    for entry in manifest["segments"]:
+        segments.remove_segment(store_dir, entry["name"])
+    if manifest.get("vocab"):
+        segments.remove_segment(store_dir, manifest["vocab"])
+
+
+def reshard_store(store_dir: Path, n_shards: int) -> int:
+    """
+    Partition the docs of `store_dir` into `n_shards` shard stores, from an
+    unsharded store or a sharded one with a different shard count. The new
+    layout is committed (shards.json) before the old files are removed.
+    Returns the number of docs moved (0 if the layout already matches).
+    """
+    store_dir = Path(store_dir)
+    layout = segments.read_manifest(store_dir, SHARD_LAYOUT_NAME)
+    if layout is not None and layout["n_shards"] == n_shards:
+        return 0
+
+    if layout is None:
+        # Legacy pickles / older segment formats are converted first
+        convert_store(store_dir)
+        sources = [store_dir]
+    else:
+        sources = _shard_dirs(store_dir, layout["n_shards"])
+
+    target = store_dir / _layout_dir(n_shards)
+    if target.exists():
+        # Leftover of an interrupted reshard
+        shutil.rmtree(target)
+    moved = 0
+    for i, shard_dir in enumerate(_shard_dirs(store_dir, n_shards)):
+        shard_dir.mkdir(parents=True)
+        batches = _shard_batches(_store_batches(sources), i, n_shards)
+        moved += sum(entry["n_docs"] for entry in write_store(shard_dir, batches))
+
+    segments.commit_manifest(
+        store_dir, {"n_shards": n_shards, "dir": _layout_dir(n_shards)}, SHARD_LAYOUT_NAME
+    )
+    if layout is None:
+        _remove_store(store_dir)
+    else:
+        shutil.rmtree(store_dir / layout["dir"], ignore_errors=True)
+    return moved
+
+
+def unshard_store(store_dir: Path) -> int:
+    """
+    Merge a sharded store back into one unsharded store (BM25_SHARDS set
+    back to 1). Returns the number of docs moved.
+    """
+    store_dir = Path(store_dir)
+    layout = segments.read_manifest(store_dir, SHARD_LAYOUT_NAME)
+    if layout is None:
+        return 0
+    # shards.json is authoritative: a root manifest next to it is left over
+    # from an interrupted reshard / unshard
+    _remove_store(store_dir)
+    moved = sum(
+        entry["n_docs"]
+        for entry in write_store(store_dir, _store_batches(_shard_dirs(store_dir, layout["n_shards"])))
+    )
+    (store_dir / SHARD_LAYOUT_NAME).unlink()
+    shutil.rmtree(store_dir / layout["dir"], ignore_errors=True)
+    return moved
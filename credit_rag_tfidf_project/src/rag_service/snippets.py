@@ -0,0 +1,99 @@
+"""
+Query-aware snippets and trimmed hit payloads for the API.
+
+A snippet is the window of about SNIPPET_CHARS characters of a hit's text
+that holds the most distinct query terms (then the most matches), found
+from the token offsets of the text, plus the offsets of every query-term
+match inside it so a client can highlight without re-tokenizing:
+
+    {"text": "...", "start": 1210, "end": 1498, "highlights": [[12, 20], ...]}
+
+start / end locate the window in the full text; highlights are relative
+to the snippet. Clients pick the hit keys they display (`fields`, or
+`snippet_only` for everything but the full text), which keeps long email
+bodies out of the response.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import SNIPPET_CHARS
+from .tokenizer import tokenizer
+
+HIT_FIELDS = ("rank", "text", "meta", "score", "distance", "snippet")
+DEFAULT_FIELDS = ("rank", "text", "meta", "score", "distance")
+SNIPPET_ONLY_FIELDS = ("rank", "meta", "score", "distance", "snippet")
+
+
+def _best_window(matches: List[Tuple[int, int, str]], max_chars: int) -> Tuple[int, int]:
+    """Index range [i, j) of the matches forming the best window of max_chars."""
+    best, best_key = (0, 0), None
+    counts: Dict[str, int] = {}
+    j = 0
+    for i, (start, _, _) in enumerate(matches):
+        while j < len(matches) and matches[j][1] - start <= max_chars:
+            counts[matches[j][2]] = counts.get(matches[j][2], 0) + 1
+            j += 1
+        key = (len(counts), j - i)
+        if best_key is None or key > best_key:
+            best, best_key = (i, j), key
+        term = matches[i][2]
+        counts[term] -= 1
+        if not counts[term]:
+            del counts[term]
+    return best
+
+
+def make_snippet(text: str, query: str, max_chars: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """Best-matching window of `text` for `query`, with highlight offsets."""
+    terms = set(tokenizer.tokenize_query(query))
+    tokens, offsets = tokenizer.tokenize_with_offsets(text)
+    matches = [(start, end, t) for t, (start, end) in zip(tokens, offsets) if t in terms]
+
+    if matches:
+        i, j = _best_window(matches, max_chars)
+        first, last = matches[i][0], matches[j - 1][1]
+        # Centre the matches in the window
+        start = max(0, first - (max_chars - (last - first)) // 2)
+    else:
+        first = last = start = 0
+    end = min(len(text), start + max_chars)
+    start = max(0, min(start, end - max_chars))
+
+    # Do not cut words at either edge
+    if start > 0:
+        cut = text.find(" ", start, first)
+        start = cut + 1 if cut >= 0 else start
+    if end < len(text):
+        cut = text.rfind(" ", last, end)
+        end = cut if cut >= 0 else end
+
+    return {
+        "text": text[start:end],
+        "start": start,
+        "end": end,
+        "highlights": [[s - start, e - start] for s, e, _ in matches if s >= start and e <= end],
+    }
+
+
+def payload_fields(fields: Optional[Sequence[str]] = None, snippet_only: bool = False) -> Tuple[str, ...]:
+    """
+    Hit keys to return: `fields` when given, else SNIPPET_ONLY_FIELDS with
+    snippet_only, else the full hit (DEFAULT_FIELDS).
+    """
+    if fields:
+        unknown = [f for f in fields if f not in HIT_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown hit fields {unknown}; expected some of {list(HIT_FIELDS)}")
+        return tuple(dict.fromkeys(fields))
+    return SNIPPET_ONLY_FIELDS if snippet_only else DEFAULT_FIELDS
+
+
+def hit_payloads(hits, query: str, fields: Sequence[str] = DEFAULT_FIELDS) -> List[Dict[str, Any]]:
+    """JSON-ready hits restricted to `fields` (see payload_fields)."""
+    keys = [f for f in fields if f != "snippet"]
+    out = []
+    for hit in hits:
+        payload = hit.to_dict(keys)
+        if "snippet" in fields:
+            payload["snippet"] = make_snippet(hit["text"], query)
+        out.append(payload)
+    return out
@@ -1,107 +1,543 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Tuple
 from pathlib import Path
+from operator import itemgetter
+import bisect
+import heapq
+import math
 import pickle
+import re
+import threading
+
 import numpy as np
+from scipy import sparse
+
+from . import segments
+from .fields import FIELD_NAMES, Span, field_params, pieces
+from .filters import evaluate, parse_filters
+from .hits import Hit
+from .tokenizer import tokenizer
+from .vocabulary import Vocabulary
+from .config import (
+    TFIDF_STORE_DIR,
+    SEGMENT_MERGE_FACTOR,
+    SEGMENT_MERGE_MAX_DOCS,
+    SEGMENT_COMPACT_DELETED_RATIO,
+    BM25_TOPK_STRATEGY,
+    BM25_K1,
+    BM25_B,
+    BM25_SCORING,
+    BM25_POSITIONS,
+    BM25_COMPRESS,
+    BM25_PROXIMITY_WEIGHT,
+    BM25_PROXIMITY_WINDOW,
+    BM25_SHARDS,
+    BM25F_FIELDS,
+)
+
+
+# Queries scored per sparse product in search_many (bounds the dense
+# docs x queries score block held in memory)
+_SEARCH_MANY_CHUNK = 64
+
+# "auto" picks WAND when the query's postings are this many times smaller
+# than the corpus (see scripts/bench_search.py)
+_WAND_POSTINGS_RATIO = 50
+
+_PHRASE_RE = re.compile(r'"([^"]+)"')
+
+# Written at the store root by a sharded store (sharded_index.py)
+SHARD_LAYOUT_NAME = "shards.json"
 
+# Field spans per doc (None: doc without fields), see fields.py
+DocFields = List[Optional[List[Span]]]
 
-def _tokenize(text: str) -> List[str]:
-    # Super simple tokenizer; you can later improve (regex, stopwords, etc.)
-    return text.lower().split()
+# (live docs, live token count, live df per query term): the corpus
+# statistics BM25 needs. A shard of a sharded index scores with the sums
+# over all shards (sharded_index.py) instead of its own.
+Stats = Tuple[int, int, Dict[str, int]]
 
 
-def _bm25_score(
-    query_terms: List[str],
-    doc_terms: List[str],
-    term_freq: Dict[str, int],
-    doc_len: int,
-    avgdl: float,
-    k1: float = 1.5,
-    b: float = 0.75,
-) -> float:
+class _Snapshot(NamedTuple):
     """
-    Standard BM25 scoring for one document.
+    One committed generation as searched: published with a single
+    attribute assignment, so a query that took it keeps a consistent view
+    (readers, doc-id bases, vocabulary, statistics) while a commit or a
+    reload swaps in the next one.
     """
-    score = 0.0
-    if avgdl == 0:
-        return score
 
-    # Precompute term frequencies in query to avoid overweighting repeated words
-    q_terms = {}
-    for t in query_terms:
-        q_terms[t] = q_terms.get(t, 0) + 1
+    generation: int
+    readers: List[segments.SegmentReader]
+    bases: np.ndarray
+    vocab: Vocabulary
+    n_docs: int
+    total_len: int
+    avgdl: float
 
-    for term, qf in q_terms.items():
-        if term not in term_freq:
-            continue
 
-        f = term_freq[term]
-        # Classic BM25, IDF skipped for simplicity (in practice still works very well).
-        # You can add proper IDF if you maintain DF stats.
-        numerator = f * (k1 + 1)
-        denominator = f + k1 * (1.0 - b + b * (doc_len / avgdl))
-        score += (numerator / denominator)
+def _query_terms(query: str) -> List[str]:
+    """Unique query terms in first-seen order (repeats count once)."""
+    return list(dict.fromkeys(tokenizer.tokenize_query(query)))
+
+
+def _query_phrases(query: str) -> List[Tuple[List[str], np.ndarray]]:
+    """
+    Quoted phrases of `query` as (terms, offsets relative to the first
+    term); single-term phrases are plain terms and are left out.
+    """
+    phrases = []
+    for text in _PHRASE_RE.findall(query):
+        terms, positions = tokenizer.tokenize_with_positions(text)
+        if len(terms) > 1:
+            phrases.append((terms, np.asarray(positions, dtype=np.int64) - positions[0]))
+    return phrases
+
+
+def _min_distances(reader, slot_a: int, slot_b: int, doc_ids: np.ndarray) -> np.ndarray:
+    """Smallest token distance between two terms in each of `doc_ids`."""
+    docs_a = reader.postings_at(slot_a)[0]
+    docs_b = reader.postings_at(slot_b)[0]
+    out = np.empty(len(doc_ids), dtype=np.int64)
+    for n, (i, j) in enumerate(zip(np.searchsorted(docs_a, doc_ids), np.searchsorted(docs_b, doc_ids))):
+        a = reader.positions(slot_a, int(i))
+        b = reader.positions(slot_b, int(j))
+        idx = np.searchsorted(b, a)
+        after = np.abs(b[np.minimum(idx, len(b) - 1)] - a)
+        before = np.abs(a - b[np.maximum(idx - 1, 0)])
+        out[n] = min(after.min(), before.min())
+    return out
+
+
+def _avgdl(n_docs: int, total_len: int) -> float:
+    return total_len / n_docs if n_docs else 0.0
+
+
+def _bm25_term_weight(f, doc_len, avgdl: float, k1: float = BM25_K1, b: float = BM25_B):
+    """
+    BM25 term-frequency part for a term with frequency `f` in a document of
+    length `doc_len`. Works on plain numbers and on NumPy arrays alike.
+    """
+    numerator = f * (k1 + 1)
+    denominator = f + k1 * (1.0 - b + b * (doc_len / avgdl))
+    return numerator / denominator
+
+
+def _bm25f_weight(ftf, k1: float = BM25_K1):
+    """
+    BM25F saturation of a pseudo-frequency whose field weights and length
+    normalisation were applied at index time (config.BM25F_FIELDS).
+    """
+    return ftf * (k1 + 1) / (ftf + k1)
+
+
+def _tf_weights(reader, doc_ids: np.ndarray, tfs: np.ndarray, ftfs: Optional[np.ndarray], avgdl: float) -> np.ndarray:
+    """Term weights of postings: BM25F for fielded docs, plain BM25 for the rest."""
+    weights = _bm25_term_weight(tfs, reader.doc_lengths[doc_ids], avgdl)
+    if ftfs is not None:
+        weights = np.where(reader.fielded[doc_ids], _bm25f_weight(np.asarray(ftfs, dtype=np.float64)), weights)
+    return weights
+
+
+def _idf(df: int, n_docs: int, scoring: str) -> float:
+    """
+    BM25 IDF (Lucene's non-negative variant) for a term in `df` of `n_docs`
+    documents. "bm25_noidf" is the original scoring without IDF, kept for
+    A/B comparison.
+    """
+    if scoring == "bm25_noidf":
+        return 1.0
+    if scoring != "bm25":
+        raise ValueError(f"unknown BM25 scoring {scoring!r}")
+    return math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def _top_k(scores: np.ndarray, k: int, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Global ids of the k best `scores` (restricted to sorted `candidates`),
+    best first, ties going to the lower doc id. np.argpartition-style
+    selection: O(n) instead of a full argsort.
+    """
+    ids = np.arange(len(scores)) if candidates is None else candidates
+    vals = scores if candidates is None else scores[candidates]
+    if k <= 0:
+        return ids[:0]
+    if k < len(ids):
+        kth = np.partition(vals, len(vals) - k)[len(vals) - k]
+        above = np.flatnonzero(vals > kth)
+        ties = np.flatnonzero(vals == kth)[: k - len(above)]
+        keep = np.concatenate([above, ties])
+        ids, vals = ids[keep], vals[keep]
+    order = np.lexsort((ids, -vals))
+    return ids[order]
+
+
+def _wand_top_k(seg_postings, bases: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Document-at-a-time top-k over postings with WAND dynamic pruning.
+
+    seg_postings holds, per segment, (term index, upper bound, doc ids,
+    weights) for each query term. Cursors are kept sorted by current doc;
+    the pivot is the first cursor at which the summed upper bounds reach
+    the current k-th best score, and cursors before it jump straight to the
+    pivot doc, skipping docs that cannot enter the top-k. One heap is shared
+    across segments, so later segments start with a tight threshold.
+    Returns (global doc ids, scores) best first; only docs containing at
+    least one query term are returned.
+    """
+    heap: List[Tuple[float, int]] = []  # (score, -global id); min-heap
+    for base, entries in zip(bases, seg_postings):
+        # cursor: [current doc, position, term index, bound, doc ids, weights]
+        cursors = [
+            [doc_ids[0], 0, t_idx, bound, doc_ids, weights]
+            for t_idx, bound, doc_ids, weights in (
+                (t, ub, d.tolist(), w.tolist()) for t, ub, d, w in entries
+            )
+        ]
+        while cursors:
+            cursors.sort(key=itemgetter(0))
+            threshold = heap[0][0] if len(heap) >= k else -1.0
+
+            pivot = -1
+            upper = 0.0
+            for i, cursor in enumerate(cursors):
+                upper += cursor[3]
+                if upper >= threshold:
+                    pivot = i
+                    break
+            if pivot < 0:
+                break  # no remaining doc can reach the top-k
+
+            pivot_doc = cursors[pivot][0]
+            if cursors[0][0] == pivot_doc:
+                # Fully evaluate the pivot doc; sum in query-term order so
+                # scores match the dense path bit for bit
+                parts = sorted((c[2], c[5][c[1]]) for c in cursors if c[0] == pivot_doc)
+                score = 0.0
+                for _, w in parts:
+                    score += w
+                entry = (score, -int(base + pivot_doc))
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                for cursor in cursors:
+                    if cursor[0] == pivot_doc:
+                        cursor[1] += 1
+            else:
+                # Skip the lagging cursors forward to the pivot doc
+                for cursor in cursors[:pivot]:
+                    if cursor[0] < pivot_doc:
+                        cursor[1] = bisect.bisect_left(cursor[4], pivot_doc, cursor[1])
+
+            alive = []
+            for cursor in cursors:
+                if cursor[1] < len(cursor[4]):
+                    cursor[0] = cursor[4][cursor[1]]
+                    alive.append(cursor)
+            cursors = alive
+
+    best = sorted(heap, reverse=True)
+    return (
+        np.asarray([-gid for _, gid in best], dtype=np.int64),
+        np.asarray([score for score, _ in best], dtype=np.float64),
+    )
+
+
+def _tokenize_docs(
+    texts: List[str], fields: Optional[DocFields] = None
+) -> Tuple[List[List[str]], Optional[List[List[int]]], Optional[List[Optional[List[int]]]]]:
+    """
+    Tokens per doc, plus token positions when positional postings are on,
+    plus the field index of every token of the docs that have field spans
+    (None for the others; None overall when no doc has them).
+    """
+    if fields is None or all(spans is None for spans in fields):
+        if not BM25_POSITIONS:
+            return [tokenizer.tokenize(t) for t in texts], None, None
+        pairs = [tokenizer.tokenize_with_positions(t) for t in texts]
+        return [terms for terms, _ in pairs], [positions for _, positions in pairs], None
+
+    tokenized, token_positions, token_fields = [], [], []
+    for text, spans in zip(texts, fields):
+        if spans is None:
+            terms, positions = tokenizer.tokenize_with_positions(text)
+            field_ids = None
+        else:
+            parts, part_fields = pieces(text, spans)
+            terms, positions, part_ids = tokenizer.tokenize_pieces(parts)
+            field_ids = [part_fields[i] for i in part_ids]
+        tokenized.append(terms)
+        token_positions.append(positions)
+        token_fields.append(field_ids)
+    return tokenized, token_positions if BM25_POSITIONS else None, token_fields
+
 
-    return score
+def _field_tfs(
+    tokenized: List[List[str]],
+    token_fields: List[Optional[List[int]]],
+    field_stats: Dict[str, Any],
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    BM25F contribution of every token, in _build_postings row order:
+    weight_f / (1 - b_f + b_f * len_f / avg len_f) for tokens of fielded
+    docs, 1.0 for the others. The average field lengths are running ones
+    over the fielded docs indexed so far, this batch included; returns the
+    contributions with the updated `field_stats`.
+    """
+    weights, bs = field_params()
+    lengths = np.zeros((len(tokenized), len(FIELD_NAMES)))
+    for d, field_ids in enumerate(token_fields):
+        if field_ids is not None:
+            lengths[d] = np.bincount(np.asarray(field_ids, dtype=np.int64), minlength=len(FIELD_NAMES))
+    totals = field_stats.get("lengths", {})
+    stats = {
+        "docs": field_stats.get("docs", 0) + sum(ids is not None for ids in token_fields),
+        "lengths": {
+            name: totals.get(name, 0) + int(lengths[:, i].sum()) for i, name in enumerate(FIELD_NAMES)
+        },
+    }
+    avg = np.asarray([stats["lengths"][name] for name in FIELD_NAMES], dtype=np.float64) / max(stats["docs"], 1)
+    # Fields a doc lacks contribute no tokens; keep their norm at 1
+    norms = np.where(lengths > 0, 1.0 - bs + bs * lengths / np.where(avg > 0, avg, 1.0), 1.0)
+    per_field = weights / norms
+    parts = [
+        np.ones(len(terms)) if field_ids is None else per_field[d][np.asarray(field_ids, dtype=np.int64)]
+        for d, (terms, field_ids) in enumerate(zip(tokenized, token_fields))
+    ]
+    return (np.concatenate(parts) if parts else np.zeros(0)), stats
+
+
+def _build_postings(
+    tokenized: List[List[str]],
+    vocab: Vocabulary,
+    token_positions: Optional[List[List[int]]] = None,
+    token_ftfs: Optional[np.ndarray] = None,
+) -> Tuple[segments.Postings, Optional[segments.Positions], Optional[np.ndarray]]:
+    """
+    Inverted index over already-tokenized docs, with terms interned into
+    `vocab`; doc ids are positions in `tokenized`. Positional postings are
+    built too when `token_positions` is given, and per-posting BM25F
+    pseudo-frequencies when `token_ftfs` (see _field_tfs) is.
+    """
+    count = sum(len(terms) for terms in tokenized)
+    term_col = np.fromiter(
+        (vocab.intern(t) for terms in tokenized for t in terms), dtype=np.int64, count=count
+    )
+    doc_col = np.repeat(np.arange(len(tokenized)), [len(terms) for terms in tokenized])
+    positions = None
+    if token_positions is not None:
+        pos_col = np.fromiter(
+            (p for doc_positions in token_positions for p in doc_positions), dtype=np.int64, count=count
+        )
+        positions = segments.build_positions(term_col, doc_col, pos_col)
+    ftfs = None
+    if token_ftfs is not None:
+        ftfs = segments.posting_sums(term_col, doc_col, token_ftfs)
+    return segments.build_postings(term_col, doc_col), positions, ftfs
 
 
 class TfidfIndex:
     """
     BM25-based index (name kept for backward compatibility with earlier TF-IDF version).
-    Stores:
-      - documents: list of raw text
-      - metadatas: list of dicts
-      - doc_lengths: word counts
-      - avgdl: average document length
-    All persisted to disk so ingestion and search can run in different processes.
-    """
-
-    def __init__(self):
-        base_dir = Path(__file__).resolve().parent.parent
-        store_dir = base_dir / "tfidf_store"
-        store_dir.mkdir(exist_ok=True)
-
-        self._docs_path = store_dir / "documents.pkl"
-        self._meta_path = store_dir / "metadatas.pkl"
-        self._lens_path = store_dir / "doc_lengths.pkl"
-
-        self.documents: List[str] = []
-        self.metadatas: List[Dict[str, Any]] = []
-        self.doc_lengths: List[int] = []
+    Persisted as append-only, memory-mapped segments (see segments.py); each
+    segment holds its own term table, postings (term id -> doc id + tf),
+    doc lengths and doc/metadata store. Term ids come from one store-wide
+    interned vocabulary (vocabulary.py) and text goes through the tokenizer
+    pipeline (tokenizer.py). Global doc ids are assigned in segment order.
+    Kept in memory:
+      - n_docs / total_len: running corpus statistics
+      - avgdl: average document length (total_len / n_docs)
+    Docs added with field spans (emails, see fields.py) are scored with
+    BM25F: their per-posting pseudo-frequencies are computed at write time
+    from running average field lengths, kept in the manifest.
+    Each add_documents call writes one new segment and commits it through the
+    manifest; small segments are compacted by a background merge. Deleted
+    docs are tombstoned (a per-segment bitmap that search masks out) and
+    physically dropped when their segment is merged or compacted. Ingestion
+    and search can run in different processes.
+    """
+
+    def __init__(self, store_dir: Optional[Path] = None, compress: Optional[bool] = None):
+        self._store_dir = Path(store_dir) if store_dir is not None else TFIDF_STORE_DIR
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        # Layout of the segments this instance writes (config.BM25_COMPRESS)
+        self._compress = BM25_COMPRESS if compress is None else compress
+
+        # Pre-segment layout, converted into a first segment on load
+        self._docs_path = self._store_dir / "documents.pkl"
+        self._meta_path = self._store_dir / "metadatas.pkl"
+        self._lens_path = self._store_dir / "doc_lengths.pkl"
+        self._postings_path = self._store_dir / "postings.pkl"
+
+        self.n_docs: int = 0
+        self.total_len: int = 0
         self.avgdl: float = 0.0
 
+        # Committed state: manifest entries and their readers, in doc-id order.
+        # Both lists are replaced, never mutated; searches read them through
+        # _snapshot, swapped as a whole on every commit or reload.
+        self._segments: List[Dict[str, Any]] = []
+        self._readers: List[segments.SegmentReader] = []
+        self._vocab = Vocabulary(self._store_dir)
+        self._generation: int = 0
+        self._next_segment: int = 1
+        # Running BM25F field statistics: {"docs": n, "lengths": {field: tokens}}
+        self._field_stats: Dict[str, Any] = {}
+        self._snapshot = _Snapshot(0, [], np.zeros(1, dtype=np.int64), self._vocab, 0, 0, 0.0)
+        # stat() of the manifest last loaded or committed here (see refresh)
+        self._manifest_stat: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+
         self._load()
 
     # ----------------- public API -----------------
 
-    def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    def add_documents(
+        self, texts: List[str], metadatas: List[Dict[str, Any]], fields: Optional[DocFields] = None
+    ) -> None:
         """
-        Add a batch of documents (chunks) to the index and recompute statistics.
+        Add a batch of documents (chunks) to the index as one new segment.
+        Only the new texts are tokenized; n_docs / total_len / avgdl are
+        updated incrementally. fields: optional field spans per text
+        (fields.compose), scored with BM25F.
         """
         if not texts:
             return
+        self._update(texts, metadatas, [], fields)
 
-        if len(texts) != len(metadatas):
-            raise ValueError("texts and metadatas must have the same length")
+    def delete_by_source(self, source: str) -> int:
+        """
+        Tombstone every doc whose metadata "source" equals `source` (ingest
+        stores resolved paths). Returns the number of docs deleted.
+        """
+        return self._update([], [], [source])
+
+    def upsert_source(
+        self,
+        source: str,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        fields: Optional[DocFields] = None,
+    ) -> int:
+        """
+        Replace all docs of `source` with `texts` in one commit, so a search
+        never sees both versions or neither. Returns the number of docs
+        replaced.
+        """
+        return self._update(texts, metadatas, [source], fields)
 
-        self.documents.extend(texts)
-        self.metadatas.extend(metadatas)
+    def upsert_sources(
+        self,
+        sources: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        fields: Optional[DocFields] = None,
+    ) -> int:
+        """upsert_source for a batch of sources (e.g. a folder of .msg files)."""
+        return self._update(texts, metadatas, sources, fields)
 
-        # Recompute lengths and avgdl
-        self.doc_lengths = [len(_tokenize(t)) for t in self.documents]
-        if self.doc_lengths:
-            self.avgdl = float(np.mean(self.doc_lengths))
-        else:
-            self.avgdl = 0.0
+    def compact(self, min_deleted_ratio: float = 0.0) -> int:
+        """
+        Reclaim the space of deleted docs: every segment whose deleted
+        fraction is above `min_deleted_ratio` is rewritten with its live docs
+        only (or dropped when none are left). Runs in the calling thread,
+        after any background merge. Returns the number of docs reclaimed.
+        """
+        self.wait_for_merge()
+        with self._lock:
+            names = self._compactable(min_deleted_ratio)
+        return sum(self._merge_segments([name]) for name in names)
 
-        self._save()
+    def wait_for_merge(self) -> None:
+        """Block until a running background merge (if any) has committed."""
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
 
     def is_empty(self) -> bool:
-        return not self.documents
+        return self.n_docs == 0
+
+    @property
+    def generation(self) -> int:
+        """Generation of the committed manifest this instance serves."""
+        return self._snapshot.generation
+
+    def term_stats(self, terms: List[str]) -> Stats:
+        """This index's corpus statistics for `terms` (see Stats)."""
+        snap = self._snapshot
+        term_ids = np.asarray([snap.vocab.lookup(t) for t in terms], dtype=np.int64)
+        return snap.n_docs, snap.total_len, dict(zip(terms, self._doc_freqs(term_ids, snap.readers)))
 
-    def search(self, query: str, kind: str = "all", k: int = 5):
+    def refresh(self) -> bool:
+        """
+        Pick up generations committed by another process (scripts/ingest.py
+        writing while the API serves). Costs one stat() of the manifest when
+        nothing changed; otherwise only new or changed segments are opened
+        and the new snapshot is swapped in, while searches already running
+        finish on the one they started with. Returns True if it reloaded.
+        """
+        stat_key = _stat_key(self._store_dir)
+        if stat_key is None or stat_key == self._manifest_stat:
+            return False
+
+        with self._lock:
+            manifest = segments.read_manifest(self._store_dir)
+            if (
+                manifest is None
+                or int(manifest["generation"]) <= self._generation
+                or _needs_conversion(manifest)
+            ):
+                self._manifest_stat = stat_key
+                return False
+            current = {entry["name"]: (entry, reader) for entry, reader in zip(self._segments, self._readers)}
+            try:
+                readers = []
+                for entry in manifest["segments"]:
+                    old_entry, reader = current.get(entry["name"], (None, None))
+                    if reader is None:
+                        reader = self._open_reader(entry)
+                    elif old_entry != entry:
+                        # Same segment, new tombstones
+                        reader = reader.with_live(segments.read_live(self._store_dir, entry))
+                    readers.append(reader)
+                vocab = self._vocab
+                if manifest.get("vocab") != vocab.name:
+                    vocab = Vocabulary(self._store_dir, manifest.get("vocab"))
+            except FileNotFoundError:
+                # The writer committed again and removed files of this
+                # generation meanwhile; the next call loads the newer one
+                return False
+            self._manifest_stat = stat_key
+            self._generation = int(manifest["generation"])
+            self._next_segment = int(manifest["next_segment"])
+            self._segments = list(manifest["segments"])
+            self._field_stats = manifest.get("field_stats", {})
+            self._vocab = vocab
+            self._set_readers(readers)
+        return True
+
+    def search(
+        self,
+        query: str,
+        kind: str = "all",
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        strategy: Optional[str] = None,
+        scoring: Optional[str] = None,
+        stats: Optional[Stats] = None,
+    ):
         """
         BM25 search.
-        kind: "all" | "pdf" | "email"
+        query: free text; "quoted phrases" must match exactly when the index
+               stores positions (BM25_POSITIONS), otherwise they count as
+               plain terms. With positions, consecutive query terms found
+               close together also get a proximity boost.
+        kind: "all" | "pdf" | "email" (any source_type works)
+        filters: optional metadata filter dict, see filters.py
+        strategy: top-k path, "dense" | "wand" | "auto" (default from config)
+        scoring: "bm25" | "bm25_noidf" (default from config; for A/B runs)
+        stats: corpus statistics to score with instead of this index's own
+               (see term_stats; used by sharded search)
         Returns list of dicts:
         {
           "rank": int,
@@ -111,84 +547,834 @@ class TfidfIndex:
           "distance": float,   # derived (lower is better; kept for compatibility)
         }
         """
-        if self.is_empty() or not query.strip():
+        clauses = parse_filters(filters)
+        snap = self._snapshot
+        if snap.n_docs == 0 or not query.strip():
             return []
 
-        query_terms = _tokenize(query)
+        readers, bases, vocab = snap.readers, snap.bases, snap.vocab
+        # Per-segment eligibility masks (None = no filter); ineligible and
+        # deleted docs are never scored
+        masks = self._segment_masks(readers, kind, clauses)
+
+        # Query terms resolved to vocabulary ids once (-1 = never indexed)
+        q_terms = _query_terms(query)
+        q_ids = np.asarray([vocab.lookup(t) for t in q_terms], dtype=np.int64)
+        idfs = self._query_idfs(q_terms, q_ids, readers, snap.n_docs, scoring or BM25_SCORING, stats)
+        avgdl = snap.avgdl if stats is None else _avgdl(stats[0], stats[1])
+
+        # Quoted phrases narrow the eligible docs like a filter does
+        phrases = [
+            (np.asarray([vocab.lookup(t) for t in terms], dtype=np.int64), offsets)
+            for terms, offsets in _query_phrases(query)
+        ]
+        if phrases:
+            for i, reader in enumerate(readers):
+                if reader.has_positions:
+                    phrase_mask = self._phrase_mask(reader, phrases)
+                    masks[i] = phrase_mask if masks[i] is None else (masks[i] & phrase_mask)
+
+        # Per segment: [(term index, upper bound, doc ids, weights)] for the
+        # query terms present there, restricted to eligible docs. Only these
+        # postings are touched.
+        seg_postings = []
+        total_postings = 0
+        for reader, mask in zip(readers, masks):
+            entries = []
+            if avgdl != 0:
+                slots = reader.slots(q_ids)
+                for t_idx, slot in enumerate(slots):
+                    if slot < 0:
+                        continue
+                    doc_ids, f = reader.postings_at(slot)
+                    ftfs = reader.ftfs_at(slot)
+                    if mask is not None:
+                        keep = mask[doc_ids]
+                        doc_ids, f = doc_ids[keep], f[keep]
+                        if ftfs is not None:
+                            ftfs = ftfs[keep]
+                    if not len(doc_ids):
+                        continue
+                    idf = idfs[t_idx]
+                    max_tf, min_len = reader.term_bound(slot)
+                    bound = idf * _bm25_term_weight(max_tf, min_len, avgdl)
+                    if reader.has_fields:
+                        bound = max(bound, idf * _bm25f_weight(reader.ftf_bound(slot)))
+                    weights = idf * _tf_weights(reader, doc_ids, f, ftfs, avgdl)
+                    entries.append((t_idx, bound, doc_ids, weights))
+                    total_postings += len(doc_ids)
+                if reader.has_positions and BM25_PROXIMITY_WEIGHT > 0:
+                    for entry in self._proximity_entries(reader, slots, idfs, mask):
+                        entries.append(entry)
+                        total_postings += len(entry[2])
+            seg_postings.append(entries)
+
+        strategy = strategy or BM25_TOPK_STRATEGY
+        if strategy == "auto":
+            strategy = "wand" if total_postings * _WAND_POSTINGS_RATIO < snap.n_docs else "dense"
+
+        if strategy == "wand":
+            top_ids, top_scores = _wand_top_k(seg_postings, bases, k)
+        elif strategy == "dense":
+            # Documents that contain none of the query terms keep 0.0
+            scores = np.zeros(int(bases[-1]), dtype=np.float64)
+            for base, entries in zip(bases, seg_postings):
+                for _, _, doc_ids, weights in entries:
+                    scores[base + doc_ids] += weights
+            candidates = None
+            if any(m is not None for m in masks):
+                candidates = self._eligible_ids(readers, bases, masks)
+            top_ids = _top_k(scores, k, candidates)
+            top_scores = scores[top_ids]
+        else:
+            raise ValueError(f"unknown top-k strategy {strategy!r}")
+
+        if len(top_ids) < k:
+            # Fewer matches than k: pad with zero-score eligible docs, lowest
+            # doc id first (same order the dense path produces)
+            top_ids, top_scores = self._pad_hits(top_ids, top_scores, k, readers, bases, masks)
+
+        return self._format_hits(top_ids, top_scores, readers, bases)
 
-        scores = []
-        for idx, text in enumerate(self.documents):
-            terms = _tokenize(text)
-            term_freq: Dict[str, int] = {}
-            for t in terms:
-                term_freq[t] = term_freq.get(t, 0) + 1
+    def search_many(
+        self,
+        queries: List[str],
+        kind: str = "all",
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        scoring: Optional[str] = None,
+        stats: Optional[Stats] = None,
+    ):
+        """
+        Batch BM25 search for offline evaluation / report jobs. Bag of words
+        only: quotes are ignored and there is no proximity boost.
+
+        Each segment's postings already form a CSC doc-term matrix; it is
+        turned into a CSR matrix of BM25 term weights, so a chunk of queries
+        is scored with one sparse product per segment instead of one postings
+        walk per query. Returns one hit list per query, in the same shape as
+        `search` (scores match up to floating-point rounding). stats: as
+        for `search`, covering every query term.
+        """
+        clauses = parse_filters(filters)
+        results: List[List[Hit]] = [[] for _ in queries]
+        snap = self._snapshot
+        if snap.n_docs == 0:
+            return results
+
+        readers, bases, vocab = snap.readers, snap.bases, snap.vocab
+        masks = self._segment_masks(readers, kind, clauses)
+        candidates = None
+        if any(m is not None for m in masks):
+            candidates = self._eligible_ids(readers, bases, masks)
+        avgdl = snap.avgdl if stats is None else _avgdl(stats[0], stats[1])
+        doc_terms = [self._doc_term_matrix(r, avgdl) for r in readers]
+
+        for start in range(0, len(queries), _SEARCH_MANY_CHUNK):
+            chunk = queries[start:start + _SEARCH_MANY_CHUNK]
+            chunk_terms = [_query_terms(q) for q in chunk]
+            # Every distinct term of the chunk gets a column index u; each
+            # query is a list of those indexes
+            unique_terms = list({t: None for terms in chunk_terms for t in terms})
+            u_of = {t: u for u, t in enumerate(unique_terms)}
+            chunk_us = [[u_of[t] for t in terms] for terms in chunk_terms]
+            u_ids = np.asarray([vocab.lookup(t) for t in unique_terms], dtype=np.int64)
+            idfs = self._query_idfs(unique_terms, u_ids, readers, snap.n_docs, scoring or BM25_SCORING, stats)
+
+            # Dense (docs x queries) score block, filled segment by segment
+            scores = np.zeros((int(bases[-1]), len(chunk)), dtype=np.float64)
+            for reader, base, doc_term in zip(readers, bases, doc_terms):
+                # Query-term matrix (queries x segment terms) holding each
+                # term's IDF; repeated query terms count once.
+                slots = reader.slots(u_ids)
+                rows, cols, vals = [], [], []
+                for qi, us in enumerate(chunk_us):
+                    for u in us:
+                        if slots[u] >= 0:
+                            rows.append(qi)
+                            cols.append(slots[u])
+                            vals.append(idfs[u])
+                query_term = sparse.csr_matrix(
+                    (np.asarray(vals, dtype=np.float64), (rows, cols)),
+                    shape=(len(chunk), doc_term.shape[1]),
+                )
+                scores[base:base + reader.n_docs] = (doc_term @ query_term.T).toarray()
 
-            doc_len = self.doc_lengths[idx] if idx < len(self.doc_lengths) else len(terms)
-            s = _bm25_score(query_terms, terms, term_freq, doc_len, self.avgdl)
-            scores.append(s)
+            for qi, query in enumerate(chunk):
+                if query.strip():
+                    top_ids = _top_k(scores[:, qi], k, candidates)
+                    results[start + qi] = self._format_hits(
+                        top_ids, scores[top_ids, qi], readers, bases
+                    )
 
-        scores = np.array(scores)
-        indices = scores.argsort()[::-1]  # highest score first
+        return results
+
+    # ----------------- ranking helpers -----------------
+
+    def _segment_masks(
+        self, readers: List[segments.SegmentReader], kind: str, clauses
+    ) -> List[Optional[np.ndarray]]:
+        """Per-segment eligibility masks: kind/filters AND not deleted (None = all docs)."""
+        masks = []
+        for reader in readers:
+            mask = evaluate(reader, kind, clauses)
+            if reader.live is not None:
+                mask = reader.live if mask is None else (mask & reader.live)
+            masks.append(mask)
+        return masks
 
-        results = []
-        for idx in indices:
-            meta = self.metadatas[idx]
+    def _query_idfs(
+        self,
+        terms: List[str],
+        term_ids: np.ndarray,
+        readers: List[segments.SegmentReader],
+        n_docs: int,
+        scoring: str,
+        stats: Optional[Stats] = None,
+    ) -> List[float]:
+        """IDF per query term, from `stats` when given (sharded search)."""
+        if stats is not None:
+            n_docs, _, dfs_by_term = stats
+            return [_idf(dfs_by_term.get(t, 0), n_docs, scoring) for t in terms]
+        return [_idf(df, n_docs, scoring) for df in self._doc_freqs(term_ids, readers)]
+
+    def _doc_freqs(self, term_ids: np.ndarray, readers: List[segments.SegmentReader]) -> List[int]:
+        """
+        Live df per term. Document frequencies live in the segments (one
+        postings list per term, so df is its length) and are summed over the
+        live segments: adding or merging a segment updates them with no
+        global rebuild. In segments with deletes only live postings count.
+        """
+        dfs = [0] * len(term_ids)
+        for reader in readers:
+            for i, slot in enumerate(reader.slots(term_ids)):
+                if slot < 0:
+                    continue
+                if reader.live is None:
+                    dfs[i] += reader.doc_freq(slot)
+                else:
+                    dfs[i] += int(reader.live[reader.postings_at(slot)[0]].sum())
+        return dfs
 
-            if kind == "pdf" and meta.get("source_type") != "pdf":
+    def _phrase_mask(
+        self, reader: segments.SegmentReader, phrases: List[Tuple[np.ndarray, np.ndarray]]
+    ) -> np.ndarray:
+        """
+        Docs of `reader` that contain every phrase, each given as (term ids,
+        offsets relative to the first term). Candidates are the docs in all
+        of a phrase's postings; their positions are then aligned.
+        """
+        mask = np.ones(reader.n_docs, dtype=bool)
+        for term_ids, offsets in phrases:
+            slots = reader.slots(term_ids)
+            hit = np.zeros(reader.n_docs, dtype=bool)
+            if (slots >= 0).all():
+                postings = [reader.postings_at(slot)[0] for slot in slots]
+                candidates = postings[0]
+                for doc_ids in postings[1:]:
+                    candidates = np.intersect1d(candidates, doc_ids, assume_unique=True)
+                for doc in candidates:
+                    # Start positions consistent with every term seen so far
+                    starts = None
+                    for slot, doc_ids, offset in zip(slots, postings, offsets):
+                        pos = reader.positions(slot, int(np.searchsorted(doc_ids, doc))) - offset
+                        starts = pos if starts is None else np.intersect1d(starts, pos, assume_unique=True)
+                        if not len(starts):
+                            break
+                    hit[doc] = len(starts) > 0
+            mask &= hit
+        return mask
+
+    def _proximity_entries(
+        self,
+        reader: segments.SegmentReader,
+        slots: np.ndarray,
+        idfs: List[float],
+        mask: Optional[np.ndarray],
+    ) -> List[Tuple[int, float, np.ndarray, np.ndarray]]:
+        """
+        Proximity boost as extra postings-like entries (one per pair of
+        consecutive query terms), so both top-k paths score it unchanged:
+        docs where the pair occurs within BM25_PROXIMITY_WINDOW tokens get
+        BM25_PROXIMITY_WEIGHT * min(idf) / distance. Distances are >= 1,
+        which gives the WAND upper bound.
+        """
+        entries = []
+        for i in range(len(slots) - 1):
+            slot_a, slot_b = slots[i], slots[i + 1]
+            if slot_a < 0 or slot_b < 0:
+                continue
+            doc_ids = np.intersect1d(
+                reader.postings_at(slot_a)[0], reader.postings_at(slot_b)[0], assume_unique=True
+            )
+            if mask is not None:
+                doc_ids = doc_ids[mask[doc_ids]]
+            if not len(doc_ids):
                 continue
-            if kind == "email" and meta.get("source_type") != "email":
+            distances = _min_distances(reader, slot_a, slot_b, doc_ids)
+            near = distances <= BM25_PROXIMITY_WINDOW
+            if not near.any():
                 continue
+            weight = BM25_PROXIMITY_WEIGHT * min(idfs[i], idfs[i + 1])
+            entries.append((len(slots) + i, weight, doc_ids[near], weight / distances[near]))
+        return entries
 
-            score = float(scores[idx])
+    def _eligible_ids(
+        self,
+        readers: List[segments.SegmentReader],
+        bases: np.ndarray,
+        masks: List[Optional[np.ndarray]],
+    ) -> np.ndarray:
+        """Sorted global ids of the docs that pass the per-segment masks."""
+        return np.concatenate([
+            base + (np.arange(r.n_docs) if m is None else np.flatnonzero(m))
+            for r, base, m in zip(readers, bases, masks)
+        ])
+
+    def _pad_hits(
+        self,
+        top_ids: np.ndarray,
+        top_scores: np.ndarray,
+        k: int,
+        readers: List[segments.SegmentReader],
+        bases: np.ndarray,
+        masks: List[Optional[np.ndarray]],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        taken = set(top_ids.tolist())
+        extra: List[int] = []
+        need = k - len(top_ids)
+        for reader, base, mask in zip(readers, bases, masks):
+            local = range(reader.n_docs) if mask is None else np.flatnonzero(mask)
+            for local_id in local:
+                gid = int(base + local_id)
+                if gid not in taken:
+                    extra.append(gid)
+                    if len(extra) >= need:
+                        break
+            if len(extra) >= need:
+                break
+        return (
+            np.concatenate([top_ids, np.asarray(extra, dtype=np.int64)]),
+            np.concatenate([top_scores, np.zeros(len(extra))]),
+        )
+
+    def _format_hits(
+        self,
+        top_ids: np.ndarray,
+        top_scores: np.ndarray,
+        readers: List[segments.SegmentReader],
+        bases: np.ndarray,
+    ) -> List[Hit]:
+        results: List[Hit] = []
+        for idx, score in zip(top_ids, top_scores):
+            seg = int(np.searchsorted(bases, idx, side="right")) - 1
+            reader, local_id = readers[seg], int(idx - bases[seg])
+            score = float(score)
 
             # distance: lower is better; we map BM25 score to (0,1] via 1/(1+score)
             distance = float(1.0 / (1.0 + max(score, 0.0)))
 
-            results.append(
-                {
-                    "rank": len(results) + 1,
-                    "text": self.documents[idx],
-                    "meta": meta,
-                    "score": score,
-                    "distance": distance,
-                }
+            # text / meta are read from the segment when first accessed
+            results.append(Hit(len(results) + 1, score, distance, reader, local_id))
+
+        return results
+
+    def _doc_term_matrix(self, reader: segments.SegmentReader, avgdl: float) -> sparse.csr_matrix:
+        """CSR matrix (segment docs x segment term slots) of BM25 tf weights (IDF is applied on the query side)."""
+        tfs, doc_ids, offsets = reader.csc_arrays()
+        if avgdl != 0:
+            weights = _tf_weights(reader, doc_ids, np.asarray(tfs, dtype=np.int64), reader.all_ftfs(), avgdl)
+        else:
+            weights = np.zeros(len(tfs), dtype=np.float64)
+        csc = sparse.csc_matrix(
+            (weights, np.asarray(doc_ids), np.asarray(offsets)),
+            shape=(reader.n_docs, len(offsets) - 1),
+        )
+        return csc.tocsr()
+
+    # ----------------- segment helpers -----------------
+
+    def _set_readers(self, readers: List[segments.SegmentReader]) -> None:
+        """
+        Swap in a new reader list and recompute doc-id bases and statistics
+        from the committed manifest entries, then publish them as the
+        snapshot searches use (caller holds the lock).
+        """
+        bases = np.zeros(len(readers) + 1, dtype=np.int64)
+        if readers:
+            bases[1:] = np.cumsum([r.n_docs for r in readers])
+        self._readers = readers
+
+        self.n_docs = _live_docs(self._segments)
+        self.total_len = _live_len(self._segments)
+        self.avgdl = _avgdl(self.n_docs, self.total_len)
+        self._snapshot = _Snapshot(
+            self._generation, readers, bases, self._vocab, self.n_docs, self.total_len, self.avgdl
+        )
+
+    def _open_reader(self, entry: Dict[str, Any]) -> segments.SegmentReader:
+        return segments.SegmentReader(self._store_dir, entry["name"], entry)
+
+    def _allocate_segment_name(self) -> str:
+        name = segments.segment_name(self._next_segment)
+        self._next_segment += 1
+        return name
+
+    def _commit(self, new_segments: List[Dict[str, Any]]) -> None:
+        """
+        Publish `new_segments` as the next generation (caller holds the lock).
+        Terms interned since the last commit are saved as a new vocabulary
+        directory first; the previous one is dropped once the manifest
+        points at the new one.
+        """
+        generation = self._generation + 1
+        old_vocab = self._vocab.name
+        if self._vocab.dirty:
+            self._vocab = self._vocab.save(self._store_dir, _vocab_name(generation))
+        manifest = _manifest(generation, self._next_segment, new_segments, self._vocab, self._field_stats)
+        segments.commit_manifest(self._store_dir, manifest)
+        self._manifest_stat = _stat_key(self._store_dir)
+        self._generation = generation
+        self._segments = new_segments
+        if old_vocab is not None and old_vocab != self._vocab.name:
+            segments.remove_segment(self._store_dir, old_vocab)
+
+    def _update(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        sources: List[str],
+        fields: Optional[DocFields] = None,
+    ) -> int:
+        """
+        Tombstone the docs of `sources` and add `texts` as a new segment, all
+        in one manifest commit. Returns the number of docs deleted.
+        """
+        if len(texts) != len(metadatas):
+            raise ValueError("texts and metadatas must have the same length")
+        if fields is not None and len(fields) != len(texts):
+            raise ValueError("texts and fields must have the same length")
+
+        if texts:
+            tokenized, token_positions, token_fields = _tokenize_docs(texts, fields)
+            doc_lengths = [len(terms) for terms in tokenized]
+
+        with self._lock:
+            new_segments, readers, stale, n_deleted = self._tombstone(sources)
+            if texts:
+                token_ftfs = field_data = None
+                if token_fields is not None:
+                    token_ftfs, self._field_stats = _field_tfs(tokenized, token_fields, self._field_stats)
+                postings, positions, ftfs = _build_postings(tokenized, self._vocab, token_positions, token_ftfs)
+                if ftfs is not None:
+                    field_data = (fields, ftfs)
+                name = self._allocate_segment_name()
+                entry = segments.write_segment(
+                    self._store_dir, name, texts, metadatas, doc_lengths, postings, positions,
+                    compress=self._compress, fields=field_data,
+                )
+                new_segments.append(entry)
+                readers.append(self._open_reader(entry))
+            if texts or n_deleted:
+                self._commit(new_segments)
+                self._set_readers(readers)
+
+        for path in stale:
+            path.unlink(missing_ok=True)
+        self._maybe_merge()
+        return n_deleted
+
+    def _tombstone(
+        self, sources: List[str]
+    ) -> Tuple[List[Dict[str, Any]], List[segments.SegmentReader], List[Path], int]:
+        """
+        Write new tombstone bitmaps for the segments holding live docs of
+        `sources`, named for the next generation (caller holds the lock and
+        commits). Returns (segment entries, readers, replaced bitmap files,
+        number of docs deleted).
+        """
+        new_segments = list(self._segments)
+        readers = list(self._readers)
+        stale: List[Path] = []
+        n_deleted = 0
+        wanted = set(sources)
+        if not wanted:
+            return new_segments, readers, stale, n_deleted
+
+        generation = self._generation + 1
+        for i, (entry, reader) in enumerate(zip(self._segments, self._readers)):
+            hit = reader.isin_mask("source", list(wanted))
+            if reader.live is not None:
+                hit &= reader.live
+            if not hit.any():
+                continue
+            live = ~hit if reader.live is None else (reader.live & ~hit)
+            deleted = ~live
+            new_segments[i] = dict(
+                entry,
+                deletes=segments.write_deletes(self._store_dir, entry["name"], generation, deleted),
+                n_deleted=int(deleted.sum()),
+                deleted_len=int(np.asarray(reader.doc_lengths)[deleted].sum()),
             )
-            if len(results) >= k:
+            readers[i] = reader.with_live(live)
+            if entry.get("deletes"):
+                stale.append(self._store_dir / entry["name"] / entry["deletes"])
+            n_deleted += int(hit.sum())
+        return new_segments, readers, stale, n_deleted
+
+    # ----------------- background merge -----------------
+
+    def _small_segment_run(self) -> List[str]:
+        """Longest trailing run of consecutive small segments."""
+        run: List[str] = []
+        for entry in reversed(self._segments):
+            if entry["n_docs"] >= SEGMENT_MERGE_MAX_DOCS:
                 break
+            run.append(entry["name"])
+        run.reverse()
+        return run
 
-        return results
+    def _compactable(self, min_deleted_ratio: float) -> List[str]:
+        """Segments whose fraction of deleted docs is above `min_deleted_ratio`."""
+        return [
+            entry["name"] for entry in self._segments
+            if entry.get("n_deleted", 0) > min_deleted_ratio * entry["n_docs"]
+        ]
 
-    # ----------------- persistence helpers -----------------
+    def _maybe_merge(self) -> None:
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+
+        with self._lock:
+            run = self._small_segment_run()
+            if len(run) <= SEGMENT_MERGE_FACTOR:
+                # Nothing to merge; compact the first segment with too many
+                # deleted docs instead
+                run = self._compactable(SEGMENT_COMPACT_DELETED_RATIO)[:1]
+        if not run:
+            return
+
+        # Non-daemon: an ingest script exits only after the merge committed
+        self._merge_thread = threading.Thread(
+            target=self._merge_segments, args=(run,), name="bm25-segment-merge"
+        )
+        self._merge_thread.start()
+
+    def _merge_segments(self, names: List[str]) -> int:
+        """
+        Rewrite consecutive segments as one holding only their live docs
+        (a single segment is thus compacted). Doc order is preserved; global
+        doc ids shift only by the docs dropped. Returns the number of docs
+        reclaimed, 0 if the segments changed underneath and the result was
+        dropped.
+        """
+        with self._lock:
+            by_name = {r.name: r for r in self._readers}
+            snapshot = [s for s in self._segments if s["name"] in names]
+        documents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        doc_lengths: List[np.ndarray] = []
+        term_cols: List[np.ndarray] = []
+        doc_cols: List[np.ndarray] = []
+        tf_cols: List[np.ndarray] = []
+        pos_cols: List[np.ndarray] = []
+        spans: DocFields = []
+        ftf_cols: List[np.ndarray] = []
+        with_positions = all(by_name[name].has_positions for name in names)
+        # BM25F pseudo-frequencies are carried over as computed at write time
+        with_fields = any(by_name[name].has_fields for name in names)
+        offset = 0
+        reclaimed = 0
+        for name in names:
+            reader = by_name[name]
+            keep = np.arange(reader.n_docs) if reader.live is None else np.flatnonzero(reader.live)
+            documents.extend(reader.document(i) for i in keep)
+            metadatas.extend(reader.metadata(i) for i in keep)
+            doc_lengths.append(np.asarray(reader.doc_lengths)[keep])
+            # Old local id -> merged id, -1 for deleted docs
+            new_ids = np.full(reader.n_docs, -1, dtype=np.int64)
+            new_ids[keep] = offset + np.arange(len(keep))
+            term_ids, offsets, doc_ids, tfs = reader.postings_arrays()
+            rows = new_ids[doc_ids] >= 0
+            term_cols.append(np.repeat(term_ids, np.diff(offsets))[rows])
+            doc_cols.append(new_ids[doc_ids][rows])
+            tf_cols.append(np.asarray(tfs)[rows])
+            if with_fields:
+                spans.extend(reader.field_spans(i) for i in keep)
+                ftfs = reader.all_ftfs()
+                ftf_cols.append((np.asarray(tfs, dtype=np.float32) if ftfs is None else np.asarray(ftfs))[rows])
+            if with_positions:
+                occurrences = np.repeat(rows, tfs)
+                pos_cols.append(segments.decode_positions(reader.positions_arrays())[occurrences])
+            offset += len(keep)
+            reclaimed += reader.n_docs - len(keep)
+
+        term_col, doc_col, tf_col = (
+            np.concatenate(term_cols), np.concatenate(doc_cols), np.concatenate(tf_cols)
+        )
+        field_data = None
+        if with_fields:
+            field_data = (spans, segments.posting_sums(term_col, doc_col, np.concatenate(ftf_cols)))
+        positions = None
+        if with_positions:
+            # Positional postings are rebuilt from one row per occurrence
+            term_col, doc_col = np.repeat(term_col, tf_col), np.repeat(doc_col, tf_col)
+            positions = segments.build_positions(term_col, doc_col, np.concatenate(pos_cols))
+            tf_col = None
+        postings = segments.build_postings(term_col, doc_col, tf_col)
 
-    def _save(self) -> None:
-        with open(self._docs_path, "wb") as f:
-            pickle.dump(self.documents, f)
-        with open(self._meta_path, "wb") as f:
-            pickle.dump(self.metadatas, f)
-        with open(self._lens_path, "wb") as f:
-            pickle.dump({"doc_lengths": self.doc_lengths, "avgdl": self.avgdl}, f)
+        merged: List[Dict[str, Any]] = []
+        if offset:
+            with self._lock:
+                merged_name = self._allocate_segment_name()
+            merged.append(segments.write_segment(
+                self._store_dir, merged_name, documents, metadatas,
+                np.concatenate(doc_lengths), postings, positions, compress=self._compress,
+                fields=field_data,
+            ))
+
+        with self._lock:
+            current = [s["name"] for s in self._segments]
+            start = current.index(names[0]) if names[0] in current else -1
+            end = start + len(names)
+            if start < 0 or self._segments[start:end] != snapshot:
+                # Segments changed underneath us (merged, or docs deleted);
+                # drop the merge result
+                for entry in merged:
+                    segments.remove_segment(self._store_dir, entry["name"])
+                return 0
+            self._commit(self._segments[:start] + merged + self._segments[end:])
+            self._set_readers(
+                self._readers[:start]
+                + [self._open_reader(entry) for entry in merged]
+                + self._readers[end:]
+            )
+
+        for name in names:
+            segments.remove_segment(self._store_dir, name)
+        return reclaimed
+
+    # ----------------- persistence helpers -----------------
 
     def _load(self) -> None:
-        if not (self._docs_path.exists() and self._meta_path.exists() and self._lens_path.exists()):
-            # No existing index; start empty
-            return
+        if (self._store_dir / SHARD_LAYOUT_NAME).exists():
+            # Store was sharded before BM25_SHARDS went back to 1
+            from .sharded_index import unshard_store
+
+            unshard_store(self._store_dir)
+        manifest = segments.read_manifest(self._store_dir)
+        if manifest is None:
+            if self._docs_path.exists() and self._meta_path.exists() and self._lens_path.exists():
+                convert_store(self._store_dir)
+                manifest = segments.read_manifest(self._store_dir)
+            else:
+                # No existing index; start empty
+                return
+        elif _needs_conversion(manifest):
+            convert_store(self._store_dir)
+            manifest = segments.read_manifest(self._store_dir)
+
+        self._manifest_stat = _stat_key(self._store_dir)
+        self._generation = int(manifest["generation"])
+        self._next_segment = int(manifest["next_segment"])
+        self._segments = list(manifest["segments"])
+        self._field_stats = manifest.get("field_stats", {})
+        self._vocab = Vocabulary(self._store_dir, manifest.get("vocab"))
+        self._set_readers([self._open_reader(s) for s in self._segments])
+
+
+def _stat_key(store_dir: Path) -> Optional[Tuple[int, int]]:
+    """(mtime, inode) of the manifest: changes with every commit (os.replace)."""
+    try:
+        st = (store_dir / segments.MANIFEST_NAME).stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_ino
+
+
+def _live_docs(entries: List[Dict[str, Any]]) -> int:
+    return sum(s["n_docs"] - s.get("n_deleted", 0) for s in entries)
+
+
+def _live_len(entries: List[Dict[str, Any]]) -> int:
+    return sum(s["total_len"] - s.get("deleted_len", 0) for s in entries)
+
+
+def _vocab_name(generation: int) -> str:
+    return f"vocab_{generation:06d}"
+
+
+def _manifest(
+    generation: int,
+    next_segment: int,
+    entries: List[Dict[str, Any]],
+    vocab: Vocabulary,
+    field_stats: Dict[str, Any],
+) -> Dict[str, Any]:
+    return {
+        "format": segments.SEGMENT_FORMAT,
+        "tokenizer": tokenizer.signature(),
+        "positions": BM25_POSITIONS,
+        "bm25f": BM25F_FIELDS,
+        "field_stats": field_stats,
+        "generation": generation,
+        "next_segment": next_segment,
+        "n_docs": _live_docs(entries),
+        "total_len": _live_len(entries),
+        "vocab": vocab.name,
+        "vocab_size": len(vocab),
+        "segments": entries,
+    }
+
+
+def _needs_conversion(manifest: Dict[str, Any]) -> bool:
+    return (
+        manifest.get("format") not in segments.READABLE_FORMATS
+        or manifest.get("tokenizer") != tokenizer.signature()
+        or bool(manifest.get("positions")) != BM25_POSITIONS
+        # Field weights are baked into the postings of fielded docs
+        or (manifest.get("field_stats", {}).get("docs", 0) > 0 and manifest.get("bm25f") != BM25F_FIELDS)
+    )
+
+
+def convert_store(store_dir: Path) -> int:
+    """
+    Re-index a store into the current segment format, in place. Terms are
+    re-derived from the stored documents, so this covers:
+      - the original three-pickle layout (documents.pkl, metadatas.pkl,
+        doc_lengths.pkl [+ postings.pkl]), which becomes one segment;
+      - pickle or string-keyed memory-mapped segments of older formats;
+      - stores built with different tokenizer, BM25_POSITIONS or
+        BM25F_FIELDS settings.
+    Segment and doc order is kept; tombstoned docs are dropped. The old
+    files are removed only after the new manifest is committed.
+    Returns the number of documents converted (0 if nothing to do).
+    """
+    store_dir = Path(store_dir)
+    manifest = segments.read_manifest(store_dir)
+    if manifest is not None and not _needs_conversion(manifest):
+        return 0
+
+    if manifest is None:
+        legacy = [store_dir / n for n in ("documents.pkl", "metadatas.pkl", "doc_lengths.pkl")]
+        if not all(p.exists() for p in legacy):
+            return 0
+        old_entries: List[Optional[Dict[str, Any]]] = [None]
+        stale = legacy + [store_dir / "postings.pkl"]
+        next_segment = 1
+    else:
+        old_entries = list(manifest["segments"])
+        stale = [store_dir / entry["name"] for entry in old_entries]
+        if manifest.get("vocab"):
+            stale.append(store_dir / manifest["vocab"])
+        next_segment = int(manifest["next_segment"])
+
+    generation = int(manifest["generation"]) + 1 if manifest else 1
+
+    def batches():
+        for old_entry in old_entries:
+            if old_entry is None:
+                with open(legacy[0], "rb") as f:
+                    documents = pickle.load(f)
+                with open(legacy[1], "rb") as f:
+                    metadatas = pickle.load(f)
+                yield documents, metadatas, [None] * len(documents)
+            else:
+                yield stored_documents(store_dir, old_entry)
+
+    new_entries = write_store(store_dir, batches(), generation, next_segment)
+
+    for path in stale:
+        if path.is_dir():
+            segments.remove_segment(store_dir, path.name)
+        elif path.exists():
+            path.unlink()
+
+    return sum(s["n_docs"] for s in new_entries)
+
+
+def stored_documents(
+    store_dir: Path, entry: Dict[str, Any]
+) -> Tuple[List[str], List[Dict[str, Any]], DocFields]:
+    """Live texts, metadata and field spans of one segment, in any readable or older format."""
+    documents, metadatas, fields = segments.read_documents(store_dir, entry["name"])
+    live = segments.read_live(store_dir, entry)
+    if live is not None:
+        documents = [d for d, keep in zip(documents, live) if keep]
+        metadatas = [m for m, keep in zip(metadatas, live) if keep]
+        fields = [f for f, keep in zip(fields, live) if keep]
+    return documents, metadatas, fields
+
+
+def write_store(
+    store_dir: Path,
+    batches: Iterable[Tuple[List[str], List[Dict[str, Any]], DocFields]],
+    generation: int = 1,
+    next_segment: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Index `batches` of (texts, metadatas, field spans) as consecutive
+    segments of `store_dir` with a fresh vocabulary and field statistics,
+    and commit them as `generation`. Returns the new manifest entries
+    (empty batches are skipped).
+    """
+    vocab = Vocabulary(store_dir)
+    field_stats: Dict[str, Any] = {}
+    new_entries: List[Dict[str, Any]] = []
+    for documents, metadatas, fields in batches:
+        if not documents:
+            continue
+        tokenized, token_positions, token_fields = _tokenize_docs(documents, fields)
+        token_ftfs = field_data = None
+        if token_fields is not None:
+            token_ftfs, field_stats = _field_tfs(tokenized, token_fields, field_stats)
+        postings, positions, ftfs = _build_postings(tokenized, vocab, token_positions, token_ftfs)
+        if ftfs is not None:
+            field_data = (fields, ftfs)
+        name = segments.segment_name(next_segment)
+        next_segment += 1
+        new_entries.append(segments.write_segment(
+            store_dir, name, documents, metadatas,
+            [len(terms) for terms in tokenized], postings, positions, compress=BM25_COMPRESS,
+            fields=field_data,
+        ))
+
+    vocab = vocab.save(store_dir, _vocab_name(generation))
+    segments.commit_manifest(store_dir, _manifest(generation, next_segment, new_entries, vocab, field_stats))
+    return new_entries
+
+
+def open_index(store_dir: Optional[Path] = None):
+    """
+    The index configured in config.py over `store_dir`: a ShardedIndex when
+    BM25_SHARDS > 1 (sharded_index.py), otherwise a TfidfIndex. Either one
+    converts the store to its layout on open.
+    """
+    if BM25_SHARDS > 1:
+        from .sharded_index import ShardedIndex
+
+        return ShardedIndex(store_dir)
+    return TfidfIndex(store_dir)
+
+
+# Global singleton index over config.TFIDF_STORE_DIR, opened on first
+# use: importing this module (scripts working on another store, pool
+# workers) must not load or convert the default store
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The default-store index (open_index()), opened on first call."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = open_index()
+    return _index
+
 
-        try:
-            with open(self._docs_path, "rb") as f:
-                self.documents = pickle.load(f)
-            with open(self._meta_path, "rb") as f:
-                self.metadatas = pickle.load(f)
-            with open(self._lens_path, "rb") as f:
-                stats = pickle.load(f)
-                self.doc_lengths = stats.get("doc_lengths", [])
-                self.avgdl = float(stats.get("avgdl", 0.0))
-        except Exception:
-            # If anything goes wrong, start clean (POC-friendly)
-            self.documents = []
-            self.metadatas = []
-            self.doc_lengths = []
-            self.avgdl = 0.0
-
-
-# Global singleton index
-index = TfidfIndex()
+def __getattr__(name: str):
+    # `from .tfidf_index import index` keeps working, and opens it lazily
+    if name == "index":
+        return get_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
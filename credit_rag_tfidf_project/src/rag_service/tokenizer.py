@@ -0,0 +1,130 @@
+"""
+Tokenizer pipeline shared by indexing and search.
+
+Steps (configured in config.py):
+  1. Unicode NFKC normalisation + casefold
+  2. one precompiled regex pulls out word tokens, so "policy," and "policy"
+     are the same term; inner punctuation is kept ("50,000", "e-mail", "u.s")
+  3. optional stopword removal
+  4. optional light (plural / possessive) stemming
+
+Token positions (for phrase / proximity matching) count every regex match,
+stopwords included, so a removed stopword still leaves a gap.
+
+The pipeline's settings are summarised by `signature()`; the index records
+it so a store built with different settings gets re-indexed.
+"""
+from functools import lru_cache
+from typing import List, Tuple
+import re
+import unicodedata
+
+from .config import TOKEN_PATTERN, TOKENIZER_STOPWORDS, TOKENIZER_STEMMER
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be been but by for from has have if in into is it its
+    of on or that the their there these this to was were will with
+    """.split()
+)
+
+
+def _light_stem(token: str) -> str:
+    """Very small English plural/possessive stripper (no dictionary)."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("'s") or token.endswith("’s"):
+        return token[:-2]
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("sses"):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+class Tokenizer:
+    def __init__(
+        self,
+        pattern: str = TOKEN_PATTERN,
+        stopwords: bool = TOKENIZER_STOPWORDS,
+        stemmer: str = TOKENIZER_STEMMER,
+    ):
+        if stemmer not in ("none", "light"):
+            raise ValueError(f"unknown stemmer {stemmer!r}")
+        self._pattern = pattern
+        self._regex = re.compile(pattern)
+        self._stopwords = STOPWORDS if stopwords else frozenset()
+        self._stemmer = stemmer
+
+    def signature(self) -> str:
+        return f"re={self._pattern}|stop={bool(self._stopwords)}|stem={self._stemmer}"
+
+    def tokenize(self, text: str) -> List[str]:
+        text = unicodedata.normalize("NFKC", text).casefold()
+        tokens = self._regex.findall(text)
+        if self._stopwords:
+            tokens = [t for t in tokens if t not in self._stopwords]
+        if self._stemmer == "light":
+            tokens = [_light_stem(t) for t in tokens]
+        return tokens
+
+    def tokenize_with_positions(self, text: str) -> Tuple[List[str], List[int]]:
+        """Tokens plus their position in the unfiltered token stream."""
+        text = unicodedata.normalize("NFKC", text).casefold()
+        tokens: List[str] = []
+        positions: List[int] = []
+        for pos, token in enumerate(self._regex.findall(text)):
+            if token in self._stopwords:
+                continue
+            tokens.append(_light_stem(token) if self._stemmer == "light" else token)
+            positions.append(pos)
+        return tokens, positions
+
+    def tokenize_with_offsets(self, text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """
+        Tokens plus their (start, end) character offsets in `text` itself
+        (snippets.py). Each match is normalized on its own, so offsets stay
+        valid where NFKC would change the text length.
+        """
+        tokens: List[str] = []
+        offsets: List[Tuple[int, int]] = []
+        # ASCII text only needs lowercasing, which keeps every offset
+        ascii_text = text.isascii()
+        for match in self._regex.finditer(text.lower() if ascii_text else text):
+            token = match.group() if ascii_text else unicodedata.normalize("NFKC", match.group()).casefold()
+            if token in self._stopwords:
+                continue
+            tokens.append(_light_stem(token) if self._stemmer == "light" else token)
+            offsets.append(match.span())
+        return tokens, offsets
+
+    def tokenize_pieces(self, pieces: List[str]) -> Tuple[List[str], List[int], List[int]]:
+        """
+        tokenize_with_positions over consecutive pieces of one text (fields,
+        see fields.py): positions run on across pieces. Also returns the
+        piece index of every token.
+        """
+        tokens: List[str] = []
+        positions: List[int] = []
+        piece_ids: List[int] = []
+        offset = 0
+        for i, piece in enumerate(pieces):
+            raw = self._regex.findall(unicodedata.normalize("NFKC", piece).casefold())
+            for pos, token in enumerate(raw):
+                if token in self._stopwords:
+                    continue
+                tokens.append(_light_stem(token) if self._stemmer == "light" else token)
+                positions.append(offset + pos)
+                piece_ids.append(i)
+            offset += len(raw)
+        return tokens, positions, piece_ids
+
+    @lru_cache(maxsize=4096)
+    def tokenize_query(self, query: str) -> Tuple[str, ...]:
+        """Cached tokenization for queries, which repeat a lot."""
+        return tuple(self.tokenize(query))
+
+
+tokenizer = Tokenizer()
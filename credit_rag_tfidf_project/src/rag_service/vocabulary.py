@@ -0,0 +1,124 @@
+"""
+Interned term vocabulary for the BM25 index: term string <-> int id.
+
+Ids are assigned in first-seen order and never change, so segments store
+postings by term id and queries are resolved to ids once. On disk a
+vocabulary is a directory of memory-mapped arrays, rewritten per commit
+that adds terms and referenced from the manifest:
+  - terms.npy / offsets.npy : utf-8 terms in id order
+  - sorted_ids.npy          : ids ordered by term, for binary-search lookup
+
+Readers never build a dict (lookup is a bisect over the mapped arrays);
+the ingest process builds one on its first `intern` call, and reuses it
+across commits.
+"""
+from typing import Dict, List, Optional
+from pathlib import Path
+import bisect
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from .segments import open_array, pack_strings, save_array
+
+
+class _SortedTerms:
+    """Sequence of terms in sorted order, read through sorted_ids."""
+
+    def __init__(self, vocab: "Vocabulary"):
+        self._vocab = vocab
+
+    def __len__(self) -> int:
+        return len(self._vocab._sorted_ids)
+
+    def __getitem__(self, i: int) -> str:
+        return self._vocab._committed_term(int(self._vocab._sorted_ids[i]))
+
+
+class Vocabulary:
+    def __init__(self, store_dir: Path, name: Optional[str] = None):
+        self.name = name
+        if name is not None:
+            vocab_dir = store_dir / name
+            self._terms = open_array(vocab_dir / "terms.npy")
+            self._offsets = open_array(vocab_dir / "offsets.npy")
+            self._sorted_ids = open_array(vocab_dir / "sorted_ids.npy")
+        else:
+            self._terms = np.zeros(0, dtype=np.uint8)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            self._sorted_ids = np.zeros(0, dtype=np.int32)
+        self._n_committed = len(self._offsets) - 1
+
+        # Writer side: terms interned since the last save, and the full
+        # term -> id dict (built on first intern)
+        self._new_terms: List[str] = []
+        self._index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self._n_committed + len(self._new_terms)
+
+    def _committed_term(self, term_id: int) -> str:
+        return bytes(self._terms[self._offsets[term_id]:self._offsets[term_id + 1]]).decode("utf-8")
+
+    def term(self, term_id: int) -> str:
+        if term_id < self._n_committed:
+            return self._committed_term(term_id)
+        return self._new_terms[term_id - self._n_committed]
+
+    def lookup(self, term: str) -> int:
+        """Id of `term`, or -1 if it was never indexed."""
+        if self._index is not None:
+            return self._index.get(term, -1)
+        sorted_terms = _SortedTerms(self)
+        i = bisect.bisect_left(sorted_terms, term)
+        if i < len(sorted_terms) and sorted_terms[i] == term:
+            return int(self._sorted_ids[i])
+        return -1
+
+    def intern(self, term: str) -> int:
+        """Id of `term`, assigning the next free id if it is new."""
+        if self._index is None:
+            self._index = {sys.intern(self._committed_term(i)): i for i in range(self._n_committed)}
+        term_id = self._index.get(term)
+        if term_id is None:
+            term_id = len(self)
+            term = sys.intern(term)
+            self._index[term] = term_id
+            self._new_terms.append(term)
+        return term_id
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._new_terms)
+
+    def save(self, store_dir: Path, name: str) -> "Vocabulary":
+        """
+        Write the full vocabulary (committed + newly interned terms) as a
+        new directory and return it opened as a committed vocabulary.
+        Nothing references the directory until the manifest is committed.
+        """
+        if self._index is not None:
+            all_terms = list(self._index)  # insertion order is id order
+        else:
+            all_terms = [self.term(i) for i in range(len(self))]
+        data, offsets = pack_strings(all_terms)
+        sorted_ids = np.asarray(
+            sorted(range(len(all_terms)), key=all_terms.__getitem__), dtype=np.int32
+        )
+
+        final_dir = store_dir / name
+        tmp_dir = store_dir / (name + ".tmp")
+        for d in (tmp_dir, final_dir):
+            if d.exists():
+                shutil.rmtree(d)
+        tmp_dir.mkdir()
+        save_array(tmp_dir / "terms.npy", data)
+        save_array(tmp_dir / "offsets.npy", offsets)
+        save_array(tmp_dir / "sorted_ids.npy", sorted_ids)
+        os.replace(tmp_dir, final_dir)
+
+        saved = Vocabulary(store_dir, name)
+        saved._index = self._index
+        return saved
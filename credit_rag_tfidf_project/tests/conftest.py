@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The package lives under src/ (not installed); the scripts run with src/ on PYTHONPATH
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,201 @@
+import math
+import random
+
+import pytest
+
+from rag_service import tfidf_index
+from rag_service.sharded_index import ShardedIndex
+from rag_service.tfidf_index import BM25_B, BM25_K1, TfidfIndex, _query_terms
+from rag_service.tokenizer import tokenizer
+
+_WORDS = [
+    "credit", "loan", "rate", "risk", "bank", "fund", "bond", "yield", "cash",
+    "debt", "equity", "audit", "policy", "market", "asset", "capital", "margin",
+]
+_QUERIES = ["credit risk", "loan rate policy", "audit", "bond yield market capital", "equity margin cash debt"]
+
+
+def _corpus(n_docs=120, seed=7):
+    # Skewed word choice so some terms are common and some rare; varying
+    # lengths so length normalization matters
+    rng = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(_WORDS))]
+    texts = [" ".join(rng.choices(_WORDS, weights, k=rng.randint(3, 40))) for _ in range(n_docs)]
+    metas = [
+        {"source_type": "pdf" if i % 3 else "email", "source": f"doc{i // 4}", "i": i}
+        for i in range(n_docs)
+    ]
+    return texts, metas
+
+
+def _fill(index, texts, metas, batch=25):
+    # Several commits, so searches run over several segments
+    for start in range(0, len(texts), batch):
+        index.add_documents(texts[start:start + batch], metas[start:start + batch])
+    index.wait_for_merge()
+    return index
+
+
+def _scores(hits):
+    """{doc number: score} of the hits that match at least one term."""
+    return {h["meta"]["i"]: h["score"] for h in hits if h["score"] > 0}
+
+
+def _reference_bm25(texts, query):
+    """Textbook BM25 with Lucene's IDF, straight from the token lists."""
+    docs = [tokenizer.tokenize(t) for t in texts]
+    n_docs = len(docs)
+    avgdl = sum(len(d) for d in docs) / n_docs
+    scores = {}
+    for i, doc in enumerate(docs):
+        score = 0.0
+        for term in _query_terms(query):
+            f = doc.count(term)
+            if not f:
+                continue
+            df = sum(term in d for d in docs)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            score += idf * f * (BM25_K1 + 1) / (f + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avgdl))
+        if score > 0:
+            scores[i] = score
+    return scores
+
+
+@pytest.fixture
+def corpus():
+    return _corpus()
+
+
+@pytest.fixture
+def index(tmp_path, corpus):
+    return _fill(TfidfIndex(tmp_path / "store"), *corpus)
+
+
+@pytest.mark.parametrize("query", _QUERIES)
+def test_scores_match_reference_bm25(index, corpus, query):
+    texts, _ = corpus
+    hits = index.search(query, k=len(texts), strategy="dense")
+    expected = _reference_bm25(texts, query)
+    got = _scores(hits)
+    assert got.keys() == expected.keys()
+    for i, score in expected.items():
+        assert got[i] == pytest.approx(score, rel=1e-9)
+
+
+@pytest.mark.parametrize("query", _QUERIES)
+@pytest.mark.parametrize("k", [1, 5, 20])
+@pytest.mark.parametrize("kind", ["all", "email"])
+def test_wand_top_k_matches_dense(index, query, k, kind):
+    # Tombstones too: WAND must skip deleted docs the way the dense path does
+    index.delete_by_source("doc3")
+    dense = index.search(query, kind=kind, k=k, strategy="dense")
+    wand = index.search(query, kind=kind, k=k, strategy="wand")
+    assert [h["meta"]["i"] for h in wand] == [h["meta"]["i"] for h in dense]
+    assert [h["score"] for h in wand] == pytest.approx([h["score"] for h in dense], rel=1e-12)
+
+
+def test_delete_compact_and_reload(tmp_path, index, corpus):
+    texts, metas = corpus
+    assert index.delete_by_source("doc2") == 4
+    assert index.delete_by_source("doc2") == 0
+    live = [i for i, m in enumerate(metas) if m["source"] != "doc2"]
+
+    expected = {q: _reference_bm25([texts[i] for i in live], q) for q in _QUERIES}
+
+    def check(idx):
+        assert idx.n_docs == len(live)
+        for q in _QUERIES:
+            hits = idx.search(q, k=len(texts), strategy="dense")
+            assert all(h["meta"]["source"] != "doc2" for h in hits)
+            got = _scores(hits)
+            # Reference numbers are positions in `live`
+            assert got == pytest.approx({live[j]: s for j, s in expected[q].items()}, rel=1e-9)
+
+    check(index)
+    assert index.compact() == 4
+    check(index)
+    check(TfidfIndex(tmp_path / "store"))
+
+
+def test_upsert_replaces_source(index, corpus):
+    texts, _ = corpus
+    n_docs = index.n_docs
+    assert index.upsert_source("doc0", ["zeppelin hangar"], [{"source_type": "pdf", "source": "doc0", "i": -1}]) == 4
+    assert index.n_docs == n_docs - 3
+    hits = index.search("zeppelin", k=1)
+    assert hits[0]["meta"]["i"] == -1 and hits[0]["score"] > 0
+    assert all(h["meta"]["source"] != "doc0" or h["meta"]["i"] == -1 for h in index.search("credit", k=len(texts)))
+
+
+def test_refresh_picks_up_another_writer(tmp_path, index):
+    reader = TfidfIndex(tmp_path / "store")
+    assert reader.refresh() is False
+
+    index.add_documents(["zeppelin hangar"], [{"source_type": "pdf", "source": "new", "i": -1}])
+    assert reader.generation < index.generation
+    assert _scores(reader.search("zeppelin", k=1)) == {}
+
+    assert reader.refresh() is True
+    assert reader.generation == index.generation
+    assert reader.n_docs == index.n_docs
+    assert list(_scores(reader.search("zeppelin", k=1))) == [-1]
+    assert reader.refresh() is False
+
+
+@pytest.mark.parametrize("kind", ["all", "pdf"])
+def test_sharded_matches_unsharded(tmp_path, index, corpus, kind):
+    texts, metas = corpus
+    sharded = _fill(ShardedIndex(tmp_path / "sharded", n_shards=3, workers=0), texts, metas)
+    for idx in (index, sharded):
+        idx.delete_by_source("doc5")
+
+    for q in _QUERIES:
+        # Global statistics: every doc gets the score one index would give
+        full = sharded.search(q, kind=kind, k=len(texts))
+        assert _scores(full) == pytest.approx(_scores(index.search(q, kind=kind, k=len(texts))), rel=1e-9)
+        top = sharded.search(q, kind=kind, k=5)
+        assert [h["score"] for h in top] == pytest.approx(
+            [h["score"] for h in index.search(q, kind=kind, k=5)], rel=1e-9
+        )
+
+
+@pytest.fixture
+def positions(monkeypatch):
+    monkeypatch.setattr(tfidf_index, "BM25_POSITIONS", True)
+
+
+_PHRASE_DOCS = [
+    "quick brown fox alpha beta gamma",
+    "brown quick fox alpha beta gamma",
+    "quick alpha beta gamma brown fox",
+]
+
+
+def _phrase_index(path):
+    return _fill(
+        TfidfIndex(path),
+        _PHRASE_DOCS,
+        [{"source_type": "pdf", "source": f"p{i}", "i": i} for i in range(len(_PHRASE_DOCS))],
+    )
+
+
+def test_phrase_matches_exact_order(tmp_path, positions):
+    index = _phrase_index(tmp_path / "store")
+    for strategy in ("dense", "wand"):
+        assert [h["meta"]["i"] for h in index.search('"quick brown"', k=5, strategy=strategy)] == [0]
+        assert [h["meta"]["i"] for h in index.search('"brown quick" fox', k=5, strategy=strategy)] == [1]
+        assert [h["meta"]["i"] for h in index.search('"gamma brown"', k=5, strategy=strategy)] == [2]
+        assert index.search('"fox quick"', k=5, strategy=strategy) == []
+
+
+def test_phrase_without_positions_is_plain_terms(tmp_path):
+    index = _phrase_index(tmp_path / "store")
+    assert sorted(_scores(index.search('"quick brown"', k=5))) == [0, 1, 2]
+
+
+def test_proximity_boost(tmp_path, positions):
+    # Same terms and lengths: only the distance between "quick" and "fox" differs
+    index = _phrase_index(tmp_path / "store")
+    scores = _scores(index.search("quick fox", k=5, strategy="dense"))
+    assert scores[0] > scores[2] and scores[1] > scores[2]
+    assert [h["meta"]["i"] for h in index.search("quick fox", k=3, strategy="wand")][-1] == 2